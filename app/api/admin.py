@@ -0,0 +1,47 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import PlainTextResponse
+from typing import List, Optional
+from app.api.endpoints import query_log, search
+from app.core.profiling import folded, profile_store
+from app.core.security import verify_admin_key
+from app.core.warmup import start_warmup, warmup_state
+
+router = APIRouter(dependencies=[Depends(verify_admin_key)])
+
+@router.get("/profiles")
+async def list_profiles() -> List[dict]:
+    """
+    List stored request profiles, newest first
+    """
+    return profile_store.list()
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(
+    profile_id: str,
+    format: str = Query(default="json", regex="^(json|folded)$"),
+    kind: str = Query(default="wall", regex="^(wall|cpu)$")
+):
+    """
+    Get a request profile as JSON, or as folded stacks for flame graph tools
+    """
+    profile = profile_store.get(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail=f"Profile not found: {profile_id}")
+    if format == "folded":
+        return PlainTextResponse(folded(profile[kind]))
+    return profile
+
+@router.post("/warmup")
+async def warmup(top_n: Optional[int] = Query(default=None, ge=1, le=10000)) -> dict:
+    """
+    Replay the most frequent logged queries to warm caches, e.g. after a reload
+    """
+    started = start_warmup(search, query_log, top_n)
+    return dict(warmup_state.snapshot(), started=started)
+
+@router.get("/warmup")
+async def warmup_status() -> dict:
+    """
+    Progress of the latest warm-up
+    """
+    return warmup_state.snapshot()
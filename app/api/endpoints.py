@@ -1,19 +1,56 @@
-from fastapi import APIRouter, HTTPException, Depends, Query, UploadFile, File
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, UploadFile, File
+from fastapi.responses import Response
 from typing import List, Optional
 from pydantic import BaseModel, validator
 from app.core.search import HybridSearch
 from app.core.config import get_settings
-import openai
+from app.core.catalog import VALID_CATEGORIES
+from app.core.providers import get_chat_client
+from app.core.metrics import record_upstream_error, time_stage
+from app.core.tracing import record_usage, set_attributes, span
+from app.core.profiling import run_in_thread
+from app.core.upstream import UpstreamUnavailable, estimate_request_tokens, governor
+from app.core.serialization import encode_products
+from app.core.conditional import catalog_version, make_etag, match_if_none_match
+from app.core.query_log import QueryLog
+from app.core.resilience import track_fallbacks
 import base64
+import re
 from PIL import Image
 import io
 
 router = APIRouter()
 search = HybridSearch()
+chat_client = get_chat_client()
 settings = get_settings()
+query_log = QueryLog(
+    settings.QUERY_LOG_PATH,
+    max_entries=settings.QUERY_LOG_MAX_ENTRIES,
+    flush_interval=settings.QUERY_LOG_FLUSH_S
+)
 
-# Valid product categories
-VALID_CATEGORIES = ["laptops", "smartphones", "tablets", "audio"]
+FIELD_NAME = re.compile(r"^[A-Za-z0-9_]+$")
+
+def parse_fields(fields: Optional[List[str]]) -> Optional[tuple]:
+    """
+    Normalize a metadata projection, accepting comma-separated names
+
+    Returns:
+        De-duplicated field names in request order, or None for all fields
+    """
+    if not fields:
+        return None
+    names = []
+    for value in fields:
+        for name in value.split(","):
+            name = name.strip()
+            if not name:
+                continue
+            if not FIELD_NAME.match(name):
+                raise ValueError(f"Invalid field name: {name}")
+            if name not in names:
+                names.append(name)
+    return tuple(names) or None
 
 class SearchRequest(BaseModel):
     query: str
@@ -21,6 +58,12 @@ class SearchRequest(BaseModel):
     min_price: Optional[float] = None
     max_price: Optional[float] = None
     top_k: Optional[int] = 5
+    fields: Optional[List[str]] = None
+    infer_filters: Optional[bool] = None
+
+    @validator('fields')
+    def validate_fields(cls, v):
+        return parse_fields(v)
 
     @validator('category')
     def validate_category(cls, v):
@@ -62,6 +105,11 @@ class ImageSearchRequest(BaseModel):
     image: str  # Base64 encoded image
     category: Optional[str] = None
     top_k: Optional[int] = 3
+    fields: Optional[List[str]] = None
+
+    @validator('fields')
+    def validate_fields(cls, v):
+        return parse_fields(v)
 
     @validator('category')
     def validate_category(cls, v):
@@ -72,14 +120,72 @@ class ImageSearchRequest(BaseModel):
             return v_lower
         return v
 
+def chat_completion(**kwargs):
+    """Call the chat completions API, counting upstream failures"""
+    with span("openai.chat.completions.create", **{"gen_ai.request.model": kwargs.get("model")}) as current:
+        try:
+            response = governor.call(
+                kwargs["model"],
+                lambda: chat_client.chat.completions.create(**kwargs),
+                estimate_request_tokens(kwargs)
+            )
+        except Exception:
+            record_upstream_error("openai", "chat.completions")
+            raise
+        record_usage(current, response)
+        return response
+
+def product_response(
+    results: List[dict],
+    fields: Optional[tuple] = None,
+    etag: Optional[str] = None,
+    version: Optional[str] = None,
+    degraded: bool = False
+) -> Response:
+    """
+    Encode product results directly to JSON bytes
+
+    Results come from our own index, so they skip per-request validation
+    against ProductResponse, which only documents the response shape.
+    `version` is the catalog version read before searching, which keys the
+    cached metadata fragments. Degraded results, served from a vector index
+    fallback, are neither tagged nor cached.
+    """
+    if degraded:
+        set_attributes(degraded=True)
+        etag = version = None
+    with time_stage("serialize"):
+        response = Response(content=encode_products(results, fields=fields, version=version), media_type="application/json")
+    if etag is not None:
+        response.headers.update(cache_headers(etag))
+    return response
+
+def cache_headers(etag: str) -> dict:
+    return {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={settings.HTTP_CACHE_MAX_AGE_S}",
+        "Vary": "Accept-Encoding"
+    }
+
+def not_modified(if_none_match: Optional[str], etag: Optional[str]) -> Optional[Response]:
+    """A 304 when the client already holds the current representation, otherwise None"""
+    matched = match_if_none_match(if_none_match, etag)
+    if matched is None:
+        return None
+    set_attributes(not_modified=True)
+    return Response(status_code=304, headers=cache_headers(matched))
+
 @router.post("/agent/qa", response_model=AgentResponse)
 async def agent_qa(request: AgentRequest):
     """
     Handle conversational queries about products using GPT
     """
     try:
+        set_attributes(history_turns=len(request.conversation_history or []))
+        
         # Get relevant products based on the query
-        products = search.search(
+        products = await run_in_thread(
+            search.search,
             query=request.query,
             top_k=5
         )
@@ -118,7 +224,8 @@ async def agent_qa(request: AgentRequest):
         """
         
         # Get response from GPT using new API format
-        response = openai.chat.completions.create(
+        response = await run_in_thread(
+            chat_completion,
             model="gpt-3.5-turbo",
             messages=[
                 {"role": "system", "content": system_message},
@@ -131,7 +238,8 @@ async def agent_qa(request: AgentRequest):
         assistant_response = response.choices[0].message.content
         
         # Generate follow-up questions using new API format
-        follow_up = openai.chat.completions.create(
+        follow_up = await run_in_thread(
+            chat_completion,
             model="gpt-3.5-turbo",
             messages=[
                 {"role": "system", "content": "Generate 2-3 relevant follow-up questions based on the conversation."},
@@ -148,6 +256,8 @@ async def agent_qa(request: AgentRequest):
             follow_up_questions=follow_up_questions
         )
         
+    except UpstreamUnavailable:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -156,7 +266,48 @@ async def search_products(request: SearchRequest):
     """
     Search for products using hybrid search (semantic + exact matching)
     """
+    return await run_search(request)
+
+@router.get("/search", response_model=List[ProductResponse])
+async def search_products_get(
+    query: str,
+    category: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    top_k: int = Query(default=5, ge=1, le=50),
+    fields: Optional[List[str]] = Query(default=None),
+    infer_filters: Optional[bool] = None,
+    if_none_match: Optional[str] = Header(default=None)
+):
+    """
+    Cacheable form of POST /search
+
+    Responses carry an ETag derived from the catalog version, the ranking
+    settings and the parameters; a matching If-None-Match gets 304 without
+    searching.
+    """
     try:
+        request = SearchRequest(
+            query=query,
+            category=category,
+            min_price=min_price,
+            max_price=max_price,
+            top_k=top_k,
+            fields=fields,
+            infer_filters=infer_filters
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    etag = make_etag("search", request.dict())
+    cached = not_modified(if_none_match, etag)
+    if cached is not None:
+        return cached
+    return await run_search(request, etag)
+
+async def run_search(request: SearchRequest, etag: Optional[str] = None) -> Response:
+    try:
+        set_attributes(top_k=request.top_k, category=request.category)
+        
         # Validate category if provided
         if request.category and request.category not in VALID_CATEGORIES:
             raise HTTPException(
@@ -172,25 +323,34 @@ async def search_products(request: SearchRequest):
                     detail="min_price cannot be greater than max_price"
                 )
             
-        results = search.search(
-            query=request.query,
-            category=request.category,
-            min_price=request.min_price,
-            max_price=request.max_price,
-            top_k=request.top_k or 5
-        )
+        version = catalog_version()
+        with track_fallbacks() as fallbacks:
+            results = await run_in_thread(
+                search.search,
+                query=request.query,
+                category=request.category,
+                min_price=request.min_price,
+                max_price=request.max_price,
+                top_k=request.top_k or 5,
+                fields=request.fields,
+                infer_filters=request.infer_filters
+            )
         
         if not results:
             raise HTTPException(
                 status_code=404,
                 detail="No products found matching the criteria"
             )
+        
+        # Frequent queries are replayed to warm caches after a deploy
+        if settings.QUERY_LOG_ENABLED:
+            query_log.record(request.query, request.category)
             
-        return results
+        return product_response(results, request.fields, etag, version, degraded=bool(fallbacks))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        if isinstance(e, HTTPException):
+        if isinstance(e, (HTTPException, UpstreamUnavailable)):
             raise e
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -198,12 +358,24 @@ async def search_products(request: SearchRequest):
 async def recommend_similar(
     product_id: str,
     category: Optional[str] = None,
-    top_k: int = Query(default=3, ge=1, le=10)
+    top_k: int = Query(default=3, ge=1, le=10),
+    fields: Optional[List[str]] = Query(default=None),
+    if_none_match: Optional[str] = Header(default=None)
 ):
     """
     Get similar product recommendations
+
+    `fields` limits the returned metadata, e.g. ?fields=name,price.
+    Responses carry an ETag; a matching If-None-Match gets 304.
     """
     try:
+        set_attributes(top_k=top_k, category=category)
+        fields = parse_fields(fields)
+        etag = make_etag("similar", product_id, category, top_k, fields)
+        cached = not_modified(if_none_match, etag)
+        if cached is not None:
+            return cached
+        
         # Validate category if provided
         if category and category not in VALID_CATEGORIES:
             raise HTTPException(
@@ -212,18 +384,22 @@ async def recommend_similar(
             )
             
         # First check if the product exists
-        product = search.get_product(product_id)
-        if not product:
-            raise HTTPException(
-                status_code=404,
-                detail=f"Product not found: {product_id}"
+        version = catalog_version()
+        with track_fallbacks() as fallbacks:
+            product = await run_in_thread(search.get_product, product_id)
+            if not product:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"Product not found: {product_id}"
+                )
+                
+            results = await run_in_thread(
+                search.recommend_similar,
+                product_id=product_id,
+                category=category,
+                top_k=top_k,
+                fields=fields
             )
-            
-        results = search.recommend_similar(
-            product_id=product_id,
-            category=category,
-            top_k=top_k
-        )
         
         if not results:
             raise HTTPException(
@@ -231,11 +407,11 @@ async def recommend_similar(
                 detail=f"No similar products found for {product_id}"
             )
             
-        return results
+        return product_response(results, fields, etag, version, degraded=bool(fallbacks))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        if isinstance(e, HTTPException):
+        if isinstance(e, (HTTPException, UpstreamUnavailable)):
             raise e
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -245,6 +421,8 @@ async def image_search(request: ImageSearchRequest):
     Search for products using an image
     """
     try:
+        set_attributes(top_k=request.top_k, category=request.category)
+        
         # Handle base64 padding
         padding = len(request.image) % 4
         if padding:
@@ -258,7 +436,8 @@ async def image_search(request: ImageSearchRequest):
             raise HTTPException(status_code=400, detail=f"Invalid image data: {str(e)}")
         
         # Get image description using GPT-4 Vision
-        response = openai.chat.completions.create(
+        response = await run_in_thread(
+            chat_completion,
             model="gpt-4-vision-preview",
             messages=[
                 {
@@ -284,13 +463,19 @@ async def image_search(request: ImageSearchRequest):
         image_description = response.choices[0].message.content
         
         # Use description to search for similar products
-        results = search.search(
-            query=image_description,
-            category=request.category,
-            top_k=request.top_k or 3
-        )
+        version = catalog_version()
+        with track_fallbacks() as fallbacks:
+            results = await run_in_thread(
+                search.search,
+                query=image_description,
+                category=request.category,
+                top_k=request.top_k or 3,
+                fields=request.fields
+            )
         
-        return results
+        return product_response(results, request.fields, version=version, degraded=bool(fallbacks))
         
+    except UpstreamUnavailable:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
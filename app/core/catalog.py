@@ -0,0 +1,152 @@
+from typing import Dict, Iterator, List, Optional, Sequence
+from pydantic import BaseModel, ValidationError, validator
+import csv
+import json
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Valid product categories
+VALID_CATEGORIES = ["laptops", "smartphones", "tablets", "audio"]
+
+
+def shard_namespace(category: str, base: str = "products") -> str:
+    """Namespace holding one category's products when the index is sharded by category"""
+    return f"{base}-{category}"
+
+
+class Product(BaseModel):
+    """Schema every catalog record must satisfy before it is indexed"""
+    id: str
+    name: str
+    description: str
+    brand: str
+    category: str
+    price: float
+    features: List[str]
+    use_case: Optional[str] = None
+
+    class Config:
+        extra = "allow"
+
+    @validator('id', 'name', 'brand')
+    def validate_not_empty(cls, v):
+        if not v.strip():
+            raise ValueError("must not be empty")
+        return v.strip()
+
+    @validator('category')
+    def validate_category(cls, v):
+        v_lower = v.strip().lower()
+        if v_lower not in VALID_CATEGORIES:
+            raise ValueError(f"Invalid category: {v}. Valid categories are: {', '.join(VALID_CATEGORIES)}")
+        return v_lower
+
+    @validator('price')
+    def validate_price(cls, v):
+        if v < 0:
+            raise ValueError("Price cannot be negative")
+        return v
+
+    @validator('features', pre=True)
+    def parse_features(cls, v):
+        # CSV exports carry lists as JSON arrays or pipe-separated strings
+        if isinstance(v, str):
+            v = v.strip()
+            if v.startswith("["):
+                return json.loads(v)
+            return [feature.strip() for feature in v.split("|") if feature.strip()]
+        return v
+
+
+def project_metadata(metadata: Dict, fields: Optional[Sequence[str]] = None) -> Dict:
+    """
+    Keep only the requested metadata fields
+
+    Args:
+        metadata: Product metadata
+        fields: Field names to keep; None or empty keeps everything
+
+    Returns:
+        A new dict with the requested fields that the product has
+    """
+    if not fields:
+        return metadata
+    return {field: metadata[field] for field in fields if field in metadata}
+
+
+class CatalogLoader:
+    """
+    Stream products from a JSONL, CSV or Parquet catalog export
+
+    Records are read and validated in chunks of chunk_size, so memory stays
+    bounded by the chunk rather than the file. Invalid records are logged,
+    counted and skipped.
+    """
+
+    FORMATS = {".jsonl": "jsonl", ".ndjson": "jsonl", ".csv": "csv", ".parquet": "parquet"}
+
+    def __init__(self, path: str, chunk_size: int = 1000, file_format: Optional[str] = None):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.file_format = file_format or self.FORMATS.get(os.path.splitext(path)[1].lower())
+        if self.file_format not in self.FORMATS.values():
+            raise ValueError(f"Unsupported catalog format for {path}. Use JSONL, CSV or Parquet")
+        self.loaded = 0
+        self.invalid = 0
+
+    def _read_jsonl(self) -> Iterator[Dict]:
+        with open(self.path, encoding="utf-8") as f:
+            for line_number, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    self.invalid += 1
+                    logger.warning(f"Skipping malformed JSON on line {line_number}: {str(e)}")
+
+    def _read_csv(self) -> Iterator[Dict]:
+        with open(self.path, encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                yield {key: value for key, value in row.items() if value not in (None, "")}
+
+    def _read_parquet(self) -> Iterator[Dict]:
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Reading Parquet catalogs requires pyarrow: pip install pyarrow")
+        parquet_file = pq.ParquetFile(self.path)
+        for batch in parquet_file.iter_batches(batch_size=self.chunk_size):
+            for row in batch.to_pylist():
+                yield {key: value for key, value in row.items() if value is not None}
+
+    def _records(self) -> Iterator[Dict]:
+        readers = {"jsonl": self._read_jsonl, "csv": self._read_csv, "parquet": self._read_parquet}
+        return readers[self.file_format]()
+
+    def chunks(self) -> Iterator[List[Dict]]:
+        """Yield lists of at most chunk_size validated product dicts"""
+        chunk = []
+        for record in self._records():
+            try:
+                product = Product(**record)
+            except (ValidationError, TypeError) as e:
+                self.invalid += 1
+                logger.warning(f"Skipping invalid product {record.get('id', '<no id>')}: {str(e)}")
+                continue
+            # Pinecone metadata cannot hold nulls
+            chunk.append(product.dict(exclude_none=True))
+            if len(chunk) >= self.chunk_size:
+                self.loaded += len(chunk)
+                yield chunk
+                chunk = []
+        if chunk:
+            self.loaded += len(chunk)
+            yield chunk
+
+    def __iter__(self) -> Iterator[Dict]:
+        for chunk in self.chunks():
+            yield from chunk
@@ -0,0 +1,168 @@
+from typing import Dict, List, Optional, Tuple
+import gzip
+import logging
+from .config import settings
+from .metrics import registry
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Negotiated response compression. Responses are buffered, so only complete
+# bodies of at least COMPRESSION_MIN_BYTES with a text-like content type are
+# compressed; streamed bodies pass through untouched. A strong ETag names one
+# exact representation, so compressed responses get the encoding appended to
+# their ETag ("abc" becomes "abc-gzip") and strip_encoding_suffix undoes that
+# when If-None-Match comes back.
+
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+RESPONSES_COMPRESSED = registry.counter(
+    "http_responses_compressed_total",
+    "Responses compressed by content encoding",
+    ["encoding"]
+)
+COMPRESSION_SAVED_BYTES = registry.counter(
+    "http_compression_saved_bytes_total",
+    "Bytes saved by response compression",
+    ["encoding"]
+)
+
+
+def _accepted_encodings(header: str) -> Dict[str, float]:
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+
+def negotiate_encoding(accept_encoding: str, available: Optional[List[str]] = None) -> Optional[str]:
+    """
+    Pick a content encoding the client accepts
+
+    Args:
+        accept_encoding: The request's Accept-Encoding header
+        available: Encodings in server preference order; br (when installed) then gzip
+
+    Returns:
+        The chosen encoding, or None to send the body as is
+    """
+    if available is None:
+        available = (["br"] if brotli is not None else []) + ["gzip"]
+    accepted = _accepted_encodings(accept_encoding)
+    best, best_quality = None, 0.0
+    for encoding in available:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=settings.COMPRESSION_GZIP_LEVEL)
+
+
+def strip_encoding_suffix(etag: str) -> str:
+    """Map an ETag of a compressed representation back to the identity one"""
+    for encoding in ("br", "gzip"):
+        suffix = f'-{encoding}"'
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)] + '"'
+    return etag
+
+
+def _with_encoding(etag: str, encoding: str) -> str:
+    if etag.startswith('"') and etag.endswith('"'):
+        return f'{etag[:-1]}-{encoding}"'
+    return etag
+
+
+def _is_compressible(headers: List[Tuple[bytes, bytes]]) -> bool:
+    content_type = b""
+    for name, value in headers:
+        if name == b"content-encoding":
+            return False
+        if name == b"content-type":
+            content_type = value
+    return content_type.decode("latin-1").startswith(COMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses with gzip or brotli"""
+
+    def __init__(self, app, minimum_size: Optional[int] = None, enabled: Optional[bool] = None):
+        self.app = app
+        self.minimum_size = settings.COMPRESSION_MIN_BYTES if minimum_size is None else minimum_size
+        self.enabled = settings.COMPRESSION_ENABLED if enabled is None else enabled
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+        encoding = negotiate_encoding(accept_encoding)
+        start_message = None
+
+        async def send_wrapper(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if start_message is None:
+                await send(message)
+                return
+
+            start, start_message = start_message, None
+            headers = list(start.get("headers", []))
+            body = message.get("body", b"")
+            if message.get("more_body", False) or not _is_compressible(headers):
+                await send(start)
+                await send(message)
+                return
+
+            if not any(name == b"vary" and b"accept-encoding" in value.lower() for name, value in headers):
+                headers.append((b"vary", b"Accept-Encoding"))
+            if encoding is None or len(body) < self.minimum_size:
+                await send(dict(start, headers=headers))
+                await send(message)
+                return
+
+            compressed = compress(body, encoding)
+            headers = [
+                (name, value) for name, value in headers
+                if name not in (b"content-length", b"etag")
+            ] + [
+                (b"content-encoding", encoding.encode("latin-1")),
+                (b"content-length", str(len(compressed)).encode("latin-1")),
+            ]
+            for name, value in start.get("headers", []):
+                if name == b"etag":
+                    headers.append((b"etag", _with_encoding(value.decode("latin-1"), encoding).encode("latin-1")))
+            if registry.enabled:
+                RESPONSES_COMPRESSED.labels(encoding).inc()
+                COMPRESSION_SAVED_BYTES.labels(encoding).inc(len(body) - len(compressed))
+            await send(dict(start, headers=headers))
+            await send(dict(message, body=compressed))
+
+        await self.app(scope, receive, send_wrapper)
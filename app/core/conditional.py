@@ -0,0 +1,87 @@
+from typing import List, Optional
+import hashlib
+import json
+import logging
+from .compression import strip_encoding_suffix
+from .config import settings
+from .local_index import current_version
+
+logger = logging.getLogger(__name__)
+
+# ETags for deterministic endpoints. A tag is derived from the catalog
+# version, the settings that affect ranking and the request parameters, so
+# a matching If-None-Match can be answered with 304 before any search work
+# is done. The version comes from CATALOG_VERSION or the local index; without
+# one no ETags are emitted, since nothing would invalidate them. Responses
+# served from a vector index fallback carry no ETag either (see
+# track_fallbacks), so degraded results are never cached as current.
+
+# Settings that change which products are returned or their order
+RANKING_SETTINGS = (
+    "HYBRID_FUSION_METHOD",
+    "HYBRID_TEXT_WEIGHT",
+    "HYBRID_IMAGE_WEIGHT",
+    "RRF_K",
+    "LEXICAL_WEIGHT",
+    "QUERY_PARSING_ENABLED",
+    "IMAGE_SEARCH_ENABLED",
+)
+
+
+def catalog_version() -> Optional[str]:
+    """
+    Version of the catalog being served
+
+    CATALOG_VERSION when set (e.g. by the deploy that ran ingestion), or
+    the live version of the local index.
+
+    Returns:
+        The version, or None when it can't be determined
+    """
+    if settings.CATALOG_VERSION:
+        return settings.CATALOG_VERSION
+    if settings.VECTOR_STORE == "local":
+        return current_version(settings.LOCAL_INDEX_PATH)
+    return None
+
+
+def ranking_fingerprint() -> List:
+    """Current values of the settings that affect ranking"""
+    return [getattr(settings, name) for name in RANKING_SETTINGS]
+
+
+def make_etag(*parts) -> Optional[str]:
+    """
+    Strong ETag for a response determined by the catalog, the ranking
+    settings and the given parts
+
+    Returns:
+        A quoted ETag, or None without a catalog version
+    """
+    version = catalog_version()
+    if version is None:
+        return None
+    payload = json.dumps([version, ranking_fingerprint(), *parts], sort_keys=True, default=str, separators=(",", ":"))
+    return '"' + hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def match_if_none_match(if_none_match: Optional[str], etag: Optional[str]) -> Optional[str]:
+    """
+    Compare If-None-Match against the current ETag
+
+    Uses the weak comparison RFC 9110 requires for If-None-Match, and
+    accepts the tags of compressed representations.
+
+    Returns:
+        The client's matching tag, to echo in the 304, or None
+    """
+    if not if_none_match or etag is None:
+        return None
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return etag
+        tag = candidate[2:] if candidate.startswith("W/") else candidate
+        if strip_encoding_suffix(tag) == etag:
+            return candidate
+    return None
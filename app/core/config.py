@@ -13,16 +13,92 @@ class Settings(BaseModel):
     
     # Security
     API_KEY: str = os.getenv("API_KEY", "your-api-key-here")
+    ADMIN_API_KEY: str = os.getenv("ADMIN_API_KEY", "")  # empty disables admin endpoints
     
     # AI Models
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY")
     GPT_MODEL: str = "gpt-4"
     EMBEDDING_MODEL: str = "text-embedding-ada-002"
     
+    # Upstream Providers ("openai"/"pinecone", or the local stand-ins for benchmarks)
+    EMBEDDING_PROVIDER: str = os.getenv("EMBEDDING_PROVIDER", "openai")  # "openai" or "offline"
+    CHAT_PROVIDER: str = os.getenv("CHAT_PROVIDER", "openai")  # "openai" or "offline"
+    VECTOR_STORE: str = os.getenv("VECTOR_STORE", "pinecone")  # "pinecone", "local" or "memory"
+    EMBEDDING_DIMENSIONS: int = int(os.getenv("EMBEDDING_DIMENSIONS", "0"))  # shortened text-embedding-3 size; 0 = full
+    OFFLINE_EMBEDDING_DIMENSIONS: int = int(os.getenv("OFFLINE_EMBEDDING_DIMENSIONS", "1536"))
+    OFFLINE_EMBEDDING_LATENCY_MS: float = float(os.getenv("OFFLINE_EMBEDDING_LATENCY_MS", "0"))
+    OFFLINE_CHAT_LATENCY_MS: float = float(os.getenv("OFFLINE_CHAT_LATENCY_MS", "0"))
+    OFFLINE_INDEX_LATENCY_MS: float = float(os.getenv("OFFLINE_INDEX_LATENCY_MS", "0"))
+    OFFLINE_CATALOG_PATH: str = os.getenv("OFFLINE_CATALOG_PATH", "")
+    
     # Vector Database
     PINECONE_API_KEY: str = os.getenv("PINECONE_API_KEY")
     PINECONE_ENV: str = os.getenv("PINECONE_ENV")
     PINECONE_INDEX_NAME: str = os.getenv("PINECONE_INDEX_NAME", "commerce-agent")
+    PINECONE_IMAGE_INDEX_NAME: str = os.getenv("PINECONE_IMAGE_INDEX_NAME", "commerce-agent-images")
+    IMAGE_SEARCH_ENABLED: bool = os.getenv("IMAGE_SEARCH_ENABLED", "false").lower() == "true"  # image index loaded by scripts/index_images.py
+    
+    # Pre-fork Server (python -m app.prefork)
+    PREFORK_WORKERS: int = int(os.getenv("PREFORK_WORKERS", str(os.cpu_count() or 1)))
+    PREFORK_PRELOAD: str = os.getenv("PREFORK_PRELOAD", "")  # extra modules imported before forking
+    
+    # Local Vector Index (memory-mapped files shared by all workers)
+    LOCAL_INDEX_PATH: str = os.getenv("LOCAL_INDEX_PATH", "data/local_index")
+    LOCAL_INDEX_DTYPE: str = os.getenv("LOCAL_INDEX_DTYPE", "float32")  # "float32" or "float16"
+    LOCAL_INDEX_REFRESH_S: float = float(os.getenv("LOCAL_INDEX_REFRESH_S", "5"))
+    LOCAL_INDEX_KEEP_VERSIONS: int = int(os.getenv("LOCAL_INDEX_KEEP_VERSIONS", "3"))
+    LOCAL_INDEX_QUANTIZATION: str = os.getenv("LOCAL_INDEX_QUANTIZATION", "none")  # "none", "int8" or "pq"
+    LOCAL_INDEX_PQ_SUBSPACES: int = int(os.getenv("LOCAL_INDEX_PQ_SUBSPACES", "0"))  # 0 = dimensions / 4
+    LOCAL_INDEX_RESCORE_FACTOR: int = int(os.getenv("LOCAL_INDEX_RESCORE_FACTOR", "8"))
+    
+    # Vector Index Resilience (hedged query/fetch and circuit breaker)
+    VECTOR_RESILIENCE_ENABLED: bool = os.getenv("VECTOR_RESILIENCE_ENABLED", "true").lower() == "true"
+    VECTOR_FALLBACK_STORE: str = os.getenv("VECTOR_FALLBACK_STORE", "")  # "local" serves the local index during outages
+    VECTOR_HEDGE_DELAY_MS: float = float(os.getenv("VECTOR_HEDGE_DELAY_MS", "100"))  # until p95 is known
+    VECTOR_HEDGE_PERCENTILE: float = float(os.getenv("VECTOR_HEDGE_PERCENTILE", "95"))
+    VECTOR_HEDGE_BUDGET: float = float(os.getenv("VECTOR_HEDGE_BUDGET", "0.05"))  # max extra load from hedges
+    VECTOR_RESULT_CACHE_SIZE: int = int(os.getenv("VECTOR_RESULT_CACHE_SIZE", "1024"))
+    VECTOR_INDEX_WORKERS: int = int(os.getenv("VECTOR_INDEX_WORKERS", "16"))
+    VECTOR_BREAKER_ERROR_RATE: float = float(os.getenv("VECTOR_BREAKER_ERROR_RATE", "0.5"))
+    VECTOR_BREAKER_SLOW_MS: float = float(os.getenv("VECTOR_BREAKER_SLOW_MS", "2000"))
+    VECTOR_BREAKER_SLOW_RATE: float = float(os.getenv("VECTOR_BREAKER_SLOW_RATE", "0.8"))
+    VECTOR_BREAKER_OPEN_S: float = float(os.getenv("VECTOR_BREAKER_OPEN_S", "30"))
+    
+    # Hybrid Retrieval
+    HYBRID_FUSION_METHOD: str = os.getenv("HYBRID_FUSION_METHOD", "rrf")  # "rrf" or "weighted"
+    HYBRID_TEXT_WEIGHT: float = float(os.getenv("HYBRID_TEXT_WEIGHT", "1.0"))
+    HYBRID_IMAGE_WEIGHT: float = float(os.getenv("HYBRID_IMAGE_WEIGHT", "1.0"))
+    RRF_K: int = int(os.getenv("RRF_K", "60"))
+    
+    # Lexical Search
+    LEXICAL_INDEX_PATH: str = os.getenv("LEXICAL_INDEX_PATH", "data/lexical_index")
+    LEXICAL_WEIGHT: float = float(os.getenv("LEXICAL_WEIGHT", "0.3"))
+    SEARCH_WORKERS: int = int(os.getenv("SEARCH_WORKERS", "4"))
+    
+    # Category Sharding
+    CATEGORY_SHARDING: bool = os.getenv("CATEGORY_SHARDING", "false").lower() == "true"  # one namespace per category
+    
+    # Query Understanding
+    QUERY_PARSING_ENABLED: bool = os.getenv("QUERY_PARSING_ENABLED", "false").lower() == "true"  # infer filters from query text
+    
+    # Cache Warm-up
+    EMBEDDING_CACHE_SIZE: int = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))  # query embeddings kept in memory
+    QUERY_LOG_ENABLED: bool = os.getenv("QUERY_LOG_ENABLED", "false").lower() == "true"  # count anonymized queries
+    QUERY_LOG_PATH: str = os.getenv("QUERY_LOG_PATH", "data/query_log.json")
+    QUERY_LOG_MAX_ENTRIES: int = int(os.getenv("QUERY_LOG_MAX_ENTRIES", "10000"))
+    QUERY_LOG_FLUSH_S: float = float(os.getenv("QUERY_LOG_FLUSH_S", "30"))
+    WARMUP_ON_STARTUP: bool = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"  # replay top queries before /ready
+    WARMUP_TOP_N: int = int(os.getenv("WARMUP_TOP_N", "200"))
+    WARMUP_CONCURRENCY: int = int(os.getenv("WARMUP_CONCURRENCY", "4"))
+    WARMUP_TIMEOUT_S: float = float(os.getenv("WARMUP_TIMEOUT_S", "120"))
+    
+    # Request Recorder (scripts/replay.py)
+    RECORDER_ENABLED: bool = os.getenv("RECORDER_ENABLED", "false").lower() == "true"  # capture requests for scripts/replay.py
+    RECORDER_DIR: str = os.getenv("RECORDER_DIR", "data/recordings")
+    RECORDER_SAMPLE_RATE: float = float(os.getenv("RECORDER_SAMPLE_RATE", "1.0"))
+    RECORDER_MAX_BODY_BYTES: int = int(os.getenv("RECORDER_MAX_BODY_BYTES", "4096"))
+    RECORDER_MAX_BYTES: int = int(os.getenv("RECORDER_MAX_BYTES", str(50 * 1024 * 1024)))  # per file before rotating
+    RECORDER_BACKUPS: int = int(os.getenv("RECORDER_BACKUPS", "5"))
     
     # AWS Settings
     AWS_ACCESS_KEY_ID: str = os.getenv("AWS_ACCESS_KEY_ID")
@@ -30,11 +106,63 @@ class Settings(BaseModel):
     AWS_REGION: str = os.getenv("AWS_REGION", "us-east-1")
     S3_BUCKET: str = os.getenv("S3_BUCKET")
     
+    # Catalog Ingestion
+    INGEST_BATCH_TOKENS: int = int(os.getenv("INGEST_BATCH_TOKENS", "50000"))
+    INGEST_BATCH_SIZE: int = int(os.getenv("INGEST_BATCH_SIZE", "512"))
+    INGEST_UPSERT_BATCH_SIZE: int = int(os.getenv("INGEST_UPSERT_BATCH_SIZE", "100"))
+    INGEST_EMBED_WORKERS: int = int(os.getenv("INGEST_EMBED_WORKERS", "4"))
+    INGEST_UPSERT_WORKERS: int = int(os.getenv("INGEST_UPSERT_WORKERS", "4"))
+    INGEST_CHECKPOINT_PATH: str = os.getenv("INGEST_CHECKPOINT_PATH", "data/ingest_checkpoint.db")
+    INGEST_LEXICAL_CHUNK_SIZE: int = int(os.getenv("INGEST_LEXICAL_CHUNK_SIZE", "50000"))  # products buffered per lexical index spill
+    
+    # Response Serialization
+    FRAGMENT_CACHE_SIZE: int = int(os.getenv("FRAGMENT_CACHE_SIZE", "10000"))  # 0 disables
+    FRAGMENT_CACHE_TTL_S: float = float(os.getenv("FRAGMENT_CACHE_TTL_S", "300"))
+    COMPRESSION_ENABLED: bool = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+    COMPRESSION_MIN_BYTES: int = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+    COMPRESSION_GZIP_LEVEL: int = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+    COMPRESSION_BROTLI_QUALITY: int = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+    
+    # HTTP Caching (ETags for deterministic endpoints)
+    CATALOG_VERSION: str = os.getenv("CATALOG_VERSION", "")  # required for ETags unless VECTOR_STORE=local
+    HTTP_CACHE_MAX_AGE_S: int = int(os.getenv("HTTP_CACHE_MAX_AGE_S", "60"))
+    
+    # Observability
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    PROFILE_SAMPLE_RATE: float = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # fraction of requests profiled
+    PROFILE_INTERVAL_MS: float = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+    PROFILE_STORE_SIZE: int = int(os.getenv("PROFILE_STORE_SIZE", "50"))
+    TRACING_ENABLED: bool = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+    TRACING_EXPORTER: str = os.getenv("TRACING_EXPORTER", "otlp")  # "otlp", "file" or "console"
+    TRACING_FILE_PATH: str = os.getenv("TRACING_FILE_PATH", "data/traces.jsonl")
+    TRACING_SERVICE_NAME: str = os.getenv("TRACING_SERVICE_NAME", "ai-commerce-agent")
+    TRACING_SAMPLE_RATIO: float = float(os.getenv("TRACING_SAMPLE_RATIO", "1.0"))
+    
+    # Upstream Governor (OpenAI calls made while serving requests)
+    REQUEST_TIMEOUT_S: float = float(os.getenv("REQUEST_TIMEOUT_S", "30"))  # 0 disables deadlines
+    UPSTREAM_INITIAL_CONCURRENCY: int = int(os.getenv("UPSTREAM_INITIAL_CONCURRENCY", "8"))
+    UPSTREAM_MIN_CONCURRENCY: int = int(os.getenv("UPSTREAM_MIN_CONCURRENCY", "1"))
+    UPSTREAM_MAX_CONCURRENCY: int = int(os.getenv("UPSTREAM_MAX_CONCURRENCY", "64"))
+    UPSTREAM_LATENCY_TARGET_MS: float = float(os.getenv("UPSTREAM_LATENCY_TARGET_MS", "10000"))
+    UPSTREAM_TPM_LIMITS: str = os.getenv("UPSTREAM_TPM_LIMITS", "")  # e.g. "gpt-3.5-turbo=160000,text-embedding-3-small=1000000"
+    UPSTREAM_MAX_RETRIES: int = int(os.getenv("UPSTREAM_MAX_RETRIES", "3"))
+    UPSTREAM_RETRY_BASE_DELAY_S: float = float(os.getenv("UPSTREAM_RETRY_BASE_DELAY_S", "0.25"))
+    UPSTREAM_RETRY_MAX_DELAY_S: float = float(os.getenv("UPSTREAM_RETRY_MAX_DELAY_S", "8"))
+    
     # Memory Settings
     CONVERSATION_MEMORY_K: int = 5
     
     # Rate Limiting
-    RATE_LIMIT_PER_MINUTE: int = 60
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    RATE_LIMIT_PER_MINUTE: int = int(os.getenv("RATE_LIMIT_PER_MINUTE", "60"))
+    RATE_LIMIT_BURST: int = int(os.getenv("RATE_LIMIT_BURST", "20"))
+    ADMIN_RATE_LIMIT_PER_MINUTE: int = int(os.getenv("ADMIN_RATE_LIMIT_PER_MINUTE", "10"))  # per IP, for /admin
+    ADMIN_RATE_LIMIT_BURST: int = int(os.getenv("ADMIN_RATE_LIMIT_BURST", "5"))
+    
+    # Admission Control (caps concurrent requests that call the chat models)
+    ADMISSION_MAX_IN_FLIGHT: int = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "16"))
+    ADMISSION_PATHS: str = os.getenv("ADMISSION_PATHS", "/api/agent/qa,/api/search/image")
+    ADMISSION_RETRY_AFTER_S: float = float(os.getenv("ADMISSION_RETRY_AFTER_S", "1"))
     
     model_config = {
         "env_file": ".env",
@@ -0,0 +1,47 @@
+from typing import Dict, List, Optional
+import numpy as np
+import openai
+
+# Embedding request helpers shared by ingestion and query embedding, which
+# must agree on the vector size and on which OpenAI errors are retried.
+
+# OpenAI errors worth retrying with backoff; anything else is a real failure
+RETRYABLE_OPENAI_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for English text (about four characters per token)"""
+    return len(text) // 4 + 1
+
+
+def embedding_options(dimensions: Optional[int]) -> Dict:
+    """
+    Extra embeddings.create arguments requesting shortened vectors
+
+    text-embedding-3 models return the leading `dimensions` components,
+    renormalized. The pinned openai client predates the `dimensions`
+    argument, so it goes in the request body.
+    """
+    return {"extra_body": {"dimensions": dimensions}} if dimensions else {}
+
+
+def shorten_embedding(embedding: List[float], dimensions: Optional[int]) -> List[float]:
+    """
+    Truncate an embedding to `dimensions` components and rescale it to unit length
+
+    Matches what the API does for text-embedding-3 models, so vectors from
+    clients that ignore the `dimensions` argument (such as the offline
+    client) are shortened consistently. Shorter vectors pass through.
+    """
+    if not dimensions or len(embedding) <= dimensions:
+        return embedding
+    vector = np.asarray(embedding[:dimensions], dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    return vector.tolist()
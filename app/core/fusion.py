@@ -0,0 +1,94 @@
+from typing import Dict, List, Optional, Sequence
+
+# Rank-fusion helpers shared by the retrievers. Each ranked list is a list of
+# {"id", "score", "metadata"} dicts ordered best-first, the same shape that
+# HybridSearch returns.
+
+DEFAULT_RRF_K = 60
+
+
+def _resolve_weights(ranked_lists: Sequence[Sequence[Dict]], weights: Optional[Sequence[float]]) -> List[float]:
+    if weights is None:
+        return [1.0] * len(ranked_lists)
+    if len(weights) != len(ranked_lists):
+        raise ValueError("weights must have one entry per ranked list")
+    return list(weights)
+
+
+def reciprocal_rank_fusion(
+    ranked_lists: Sequence[Sequence[Dict]],
+    weights: Optional[Sequence[float]] = None,
+    k: int = DEFAULT_RRF_K
+) -> List[Dict]:
+    """
+    Fuse ranked lists with weighted reciprocal rank fusion
+
+    Args:
+        ranked_lists: Result lists ordered best-first
+        weights: Per-list weight, defaults to 1.0 for every list
+        k: Rank smoothing constant, larger values flatten the rank curve
+
+    Returns:
+        Fused results ordered by descending fused score
+    """
+    weights = _resolve_weights(ranked_lists, weights)
+    fused: Dict[str, Dict] = {}
+    for results, weight in zip(ranked_lists, weights):
+        for rank, item in enumerate(results, start=1):
+            entry = fused.setdefault(item["id"], {
+                "id": item["id"],
+                "score": 0.0,
+                "metadata": item.get("metadata")
+            })
+            entry["score"] += weight / (k + rank)
+    return sorted(fused.values(), key=lambda x: x["score"], reverse=True)
+
+
+def weighted_score_fusion(
+    ranked_lists: Sequence[Sequence[Dict]],
+    weights: Optional[Sequence[float]] = None
+) -> List[Dict]:
+    """
+    Fuse ranked lists by a weighted sum of min-max normalized scores
+
+    Scores from different retrievers live on different scales, so each list
+    is normalized to [0, 1] before weighting.
+
+    Args:
+        ranked_lists: Result lists ordered best-first
+        weights: Per-list weight, defaults to 1.0 for every list
+
+    Returns:
+        Fused results ordered by descending fused score
+    """
+    weights = _resolve_weights(ranked_lists, weights)
+    fused: Dict[str, Dict] = {}
+    for results, weight in zip(ranked_lists, weights):
+        if not results:
+            continue
+        scores = [item["score"] for item in results]
+        low, high = min(scores), max(scores)
+        spread = high - low
+        for item in results:
+            normalized = (item["score"] - low) / spread if spread else 1.0
+            entry = fused.setdefault(item["id"], {
+                "id": item["id"],
+                "score": 0.0,
+                "metadata": item.get("metadata")
+            })
+            entry["score"] += weight * normalized
+    return sorted(fused.values(), key=lambda x: x["score"], reverse=True)
+
+
+def fuse(
+    ranked_lists: Sequence[Sequence[Dict]],
+    weights: Optional[Sequence[float]] = None,
+    method: str = "rrf",
+    k: int = DEFAULT_RRF_K
+) -> List[Dict]:
+    """Fuse ranked lists with the configured method ("rrf" or "weighted")"""
+    if method == "rrf":
+        return reciprocal_rank_fusion(ranked_lists, weights=weights, k=k)
+    if method == "weighted":
+        return weighted_score_fusion(ranked_lists, weights=weights)
+    raise ValueError(f"Unknown fusion method: {method}")
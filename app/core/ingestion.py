@@ -0,0 +1,441 @@
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import logging
+from .catalog import shard_namespace
+from .embeddings import RETRYABLE_OPENAI_ERRORS, embedding_options, estimate_tokens, shorten_embedding
+
+logger = logging.getLogger(__name__)
+
+def build_product_text(product: Dict) -> str:
+    """
+    Create rich product text for better semantic search
+
+    Volatile fields such as price and stock are left out so they can change
+    without invalidating the embedding; they are filtered on via metadata.
+    """
+    return (
+        f"{product['name']} {product['description']} "
+        f"Brand: {product['brand']} Category: {product['category']} "
+        f"Features: {' '.join(product['features'])} "
+        f"Use case: {product.get('use_case', '')}"
+    )
+
+
+def content_hash(text: str, dimensions: Optional[int] = None) -> str:
+    """
+    Hash of the embedding text; a change means the product must be re-embedded
+
+    A shortened embedding size is part of the hash, so changing it
+    re-embeds every product.
+    """
+    if dimensions:
+        text = f"{dimensions}:{text}"
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def metadata_hash(product: Dict) -> str:
+    """Hash of the full product record; a change alone means a metadata-only update"""
+    encoded = json.dumps(product, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:16]
+
+
+def batch_by_tokens(
+    items: Iterable[Tuple[Dict, str]],
+    max_tokens: int,
+    max_items: int
+) -> Iterator[List[Tuple[Dict, str]]]:
+    """
+    Group (product, text) pairs into embedding batches
+
+    A batch is closed once adding the next text would exceed max_tokens or
+    it already holds max_items inputs. Items are consumed lazily.
+    """
+    batch: List[Tuple[Dict, str]] = []
+    batch_tokens = 0
+    for product, text in items:
+        tokens = estimate_tokens(text)
+        if batch and (batch_tokens + tokens > max_tokens or len(batch) >= max_items):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append((product, text))
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+
+def retry_with_backoff(
+    fn: Callable,
+    retryable: Tuple[type, ...],
+    max_retries: int = 6,
+    base_delay: float = 1.0,
+    max_delay: float = 60.0
+):
+    """Call fn, retrying retryable errors with jittered exponential backoff"""
+    for attempt in range(max_retries + 1):
+        try:
+            return fn()
+        except retryable as e:
+            if attempt == max_retries:
+                raise
+            delay = min(max_delay, base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+            logger.warning(f"Retrying after {type(e).__name__} in {delay:.1f}s (attempt {attempt + 1}/{max_retries})")
+            time.sleep(delay)
+
+
+class Checkpoint:
+    """
+    Content and metadata hashes of products already written to the index,
+    with the namespace each was written to
+
+    Stored in a SQLite file keyed by product ID, so the catalog isn't held
+    in memory and each save commits only the products written since the
+    last one. An interrupted load resumes by skipping products whose hashes
+    are recorded, and a later sync uses the same hashes to skip unchanged
+    products and re-embed only changed text. A JSON checkpoint written by
+    earlier versions is converted in place on first use.
+
+    Args:
+        path: SQLite file; nothing is persisted without one
+        default_namespace: Namespace assumed for entries written before
+            namespaces were recorded
+    """
+
+    def __init__(self, path: Optional[str] = None, default_namespace: str = "products"):
+        self.path = path
+        self.default_namespace = default_namespace
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            if _is_json_checkpoint(path):
+                self._convert_json(path)
+        # Written to from the pipeline's thread and read from its write workers
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        _create_checkpoint_table(self._db)
+        if path:
+            logger.info(f"Loaded checkpoint {path} with {len(self)} products indexed")
+
+    def _convert_json(self, path: str) -> None:
+        with open(path, encoding="utf-8") as f:
+            payload = json.load(f)
+        tmp_path = f"{path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        db = sqlite3.connect(tmp_path)
+        _create_checkpoint_table(db)
+        # Files without hashes predate incremental sync and force a full reload
+        db.executemany(
+            "INSERT OR REPLACE INTO products VALUES (?, ?, ?, ?)",
+            (
+                (product_id,) + (tuple(entry) + (self.default_namespace,))[:3]
+                for product_id, entry in payload.get("products", {}).items()
+                if len(entry) >= 2
+            )
+        )
+        db.commit()
+        db.close()
+        os.replace(tmp_path, path)
+        logger.info(f"Converted JSON checkpoint {path} to SQLite")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+
+    def __contains__(self, product_id: str) -> bool:
+        return self.get(product_id) is not None
+
+    def get(self, product_id: str) -> Optional[Tuple[str, str, str]]:
+        """(text hash, metadata hash, namespace) of an indexed product"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT text_hash, meta_hash, namespace FROM products WHERE id = ?",
+                (product_id,)
+            ).fetchone()
+        return tuple(row) if row is not None else None
+
+    def mark_done(self, records: Iterable[Tuple[str, str, str, str]]) -> None:
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO products VALUES (?, ?, ?, ?)", list(records))
+
+    def save(self) -> None:
+        """Commit the products marked done since the last save"""
+        with self._lock:
+            self._db.commit()
+
+
+def _create_checkpoint_table(db: sqlite3.Connection) -> None:
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS products ("
+        "id TEXT PRIMARY KEY, text_hash TEXT NOT NULL, meta_hash TEXT NOT NULL, namespace TEXT NOT NULL)"
+    )
+    db.commit()
+
+
+def _is_json_checkpoint(path: str) -> bool:
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return False
+    with open(path, "rb") as f:
+        return not f.read(16).startswith(b"SQLite format 3")
+
+
+class IngestionStats:
+    """Counters and throughput for an ingestion run"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.embedded = 0
+        self.upserted = 0
+        self.updated = 0
+        self.skipped = 0
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def products_per_second(self) -> float:
+        processed = self.upserted + self.updated + self.skipped
+        return processed / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.upserted} products embedded and upserted, {self.updated} metadata-only updates, "
+            f"{self.skipped} unchanged in {self.elapsed:.1f}s ({self.products_per_second:.1f} products/sec)"
+        )
+
+
+class IngestionPipeline:
+    """
+    Bulk catalog ingestion into the vector index
+
+    Products are embedded in multi-input batches sized by token count, with
+    a bounded number of embedding and upsert requests in flight. Rate limits
+    and transient errors are retried with backoff, and completed products are
+    checkpointed so an interrupted run resumes where it stopped.
+
+    Each product's embedding text and full record are hashed separately:
+    unchanged products are skipped, products whose text is unchanged get a
+    metadata-only update, and only products with new text are re-embedded.
+
+    With shard_by_category, each product goes to the namespace of its
+    category (see shard_namespace). The checkpoint records the namespace
+    each product was written to, so a product whose namespace changes (a new
+    category, or switching sharding on or off) is upserted into the new one
+    and deleted from the one it was in.
+
+    With dimensions, embeddings are shortened to that many components
+    (see shorten_embedding); queries must use the same size.
+    """
+
+    def __init__(
+        self,
+        openai_client,
+        index,
+        namespace: str = "products",
+        model: str = "text-embedding-3-small",
+        max_batch_tokens: int = 50_000,
+        max_batch_size: int = 512,
+        upsert_batch_size: int = 100,
+        embed_workers: int = 4,
+        upsert_workers: int = 4,
+        max_retries: int = 6,
+        checkpoint_path: Optional[str] = None,
+        checkpoint_every: int = 10,
+        shard_by_category: bool = False,
+        dimensions: Optional[int] = None
+    ):
+        self.openai_client = openai_client
+        self.index = index
+        self.namespace = namespace
+        self.model = model
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.upsert_batch_size = upsert_batch_size
+        self.embed_workers = embed_workers
+        self.upsert_workers = upsert_workers
+        self.max_retries = max_retries
+        self.checkpoint = Checkpoint(checkpoint_path, default_namespace=namespace)
+        self.checkpoint_every = checkpoint_every
+        self.shard_by_category = shard_by_category
+        self.dimensions = dimensions
+
+    def _embed_batch(self, texts: Sequence[str]) -> List[List[float]]:
+        response = retry_with_backoff(
+            lambda: self.openai_client.embeddings.create(
+                model=self.model,
+                input=list(texts),
+                **embedding_options(self.dimensions)
+            ),
+            RETRYABLE_OPENAI_ERRORS,
+            max_retries=self.max_retries
+        )
+        # The API may return items out of order, so sort by input position
+        return [
+            shorten_embedding(item.embedding, self.dimensions)
+            for item in sorted(response.data, key=lambda item: item.index)
+        ]
+
+    def namespace_for(self, product: Dict) -> str:
+        if self.shard_by_category:
+            return shard_namespace(product["category"], self.namespace)
+        return self.namespace
+
+    def _upsert(self, vectors: List[Dict]) -> int:
+        by_namespace: Dict[str, List[Dict]] = {}
+        for vector in vectors:
+            by_namespace.setdefault(self.namespace_for(vector["metadata"]), []).append(vector)
+        for namespace, group in by_namespace.items():
+            # Pinecone client errors vary by version, so any failure is retried
+            retry_with_backoff(
+                lambda: self.index.upsert(vectors=group, namespace=namespace),
+                (Exception,),
+                max_retries=self.max_retries
+            )
+            self._delete_moved(namespace, [v["id"] for v in group])
+        return len(vectors)
+
+    def _delete_moved(self, namespace: str, ids: List[str]) -> None:
+        # Products that moved namespace would otherwise linger in the old one
+        stale: Dict[str, List[str]] = {}
+        for product_id in ids:
+            indexed = self.checkpoint.get(product_id)
+            if indexed is not None and indexed[2] != namespace:
+                stale.setdefault(indexed[2], []).append(product_id)
+        for old_namespace, old_ids in stale.items():
+            retry_with_backoff(
+                lambda: self.index.delete(ids=old_ids, namespace=old_namespace),
+                (Exception,),
+                max_retries=self.max_retries
+            )
+
+    def _update_metadata(self, products: List[Dict]) -> int:
+        # Pinecone has no bulk metadata update, so these go one by one
+        for product in products:
+            retry_with_backoff(
+                lambda: self.index.update(id=product["id"], set_metadata=product, namespace=self.namespace_for(product)),
+                (Exception,),
+                max_retries=self.max_retries
+            )
+        return len(products)
+
+    def run(self, products: Iterable[Dict]) -> IngestionStats:
+        """
+        Embed and upsert new or changed products
+
+        Args:
+            products: Iterable of product dicts, consumed lazily
+
+        Returns:
+            Counters and throughput for the run
+        """
+        stats = IngestionStats()
+        # Bound the number of batches in memory so a large catalog streams through
+        max_embeds_in_flight = self.embed_workers * 2
+        max_writes_in_flight = self.upsert_workers * 2
+        embed_futures: Dict[Future, List[Tuple[Dict, str, str]]] = {}
+        write_futures: Dict[Future, Tuple[str, List[Tuple[str, str, str, str]]]] = {}
+        completed_writes = 0
+
+        def reap_writes(block: bool) -> None:
+            nonlocal completed_writes
+            if not write_futures:
+                return
+            done, _ = wait(write_futures, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+            for future in done:
+                kind, records = write_futures.pop(future)
+                count = future.result()
+                if kind == "upsert":
+                    stats.upserted += count
+                else:
+                    stats.updated += count
+                self.checkpoint.mark_done(records)
+                completed_writes += 1
+                if completed_writes % self.checkpoint_every == 0:
+                    self.checkpoint.save()
+                    logger.info(stats.summary())
+
+        def submit_write(kind: str, fn: Callable, payload: List[Dict], records: List[Tuple[str, str, str, str]]) -> None:
+            while len(write_futures) >= max_writes_in_flight:
+                reap_writes(block=True)
+            write_futures[write_pool.submit(fn, payload)] = (kind, records)
+
+        def reap_embeds(block: bool) -> None:
+            if not embed_futures:
+                return
+            done, _ = wait(embed_futures, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+            for future in done:
+                batch = embed_futures.pop(future)
+                embeddings = future.result()
+                stats.embedded += len(batch)
+                for i in range(0, len(batch), self.upsert_batch_size):
+                    chunk = batch[i:i + self.upsert_batch_size]
+                    vectors = [{
+                        "id": product["id"],
+                        "values": embedding,
+                        "metadata": product
+                    } for (product, _, _), embedding in zip(chunk, embeddings[i:i + self.upsert_batch_size])]
+                    records = [
+                        (product["id"], text_hash, meta_hash, self.namespace_for(product))
+                        for product, text_hash, meta_hash in chunk
+                    ]
+                    submit_write("upsert", self._upsert, vectors, records)
+
+        pending_updates: List[Tuple[Dict, str, str]] = []
+
+        def flush_updates() -> None:
+            if pending_updates:
+                records = [
+                    (product["id"], text_hash, meta_hash, self.namespace_for(product))
+                    for product, text_hash, meta_hash in pending_updates
+                ]
+                submit_write("update", self._update_metadata, [product for product, _, _ in pending_updates], records)
+                pending_updates.clear()
+
+        def products_to_embed() -> Iterator[Tuple[Tuple[Dict, str, str], str]]:
+            for product in products:
+                text = build_product_text(product)
+                text_hash, meta_hash = content_hash(text, self.dimensions), metadata_hash(product)
+                indexed = self.checkpoint.get(product["id"])
+                if indexed == (text_hash, meta_hash, self.namespace_for(product)):
+                    stats.skipped += 1
+                elif indexed is not None and indexed[0] == text_hash and indexed[2] == self.namespace_for(product):
+                    pending_updates.append((product, text_hash, meta_hash))
+                    if len(pending_updates) >= self.upsert_batch_size:
+                        flush_updates()
+                else:
+                    yield (product, text_hash, meta_hash), text
+
+        with ThreadPoolExecutor(max_workers=self.embed_workers) as embed_pool, \
+                ThreadPoolExecutor(max_workers=self.upsert_workers) as write_pool:
+            try:
+                batches = batch_by_tokens(
+                    products_to_embed(),
+                    max_tokens=self.max_batch_tokens,
+                    max_items=self.max_batch_size
+                )
+                for batch in batches:
+                    while len(embed_futures) >= max_embeds_in_flight:
+                        reap_embeds(block=True)
+                    future = embed_pool.submit(self._embed_batch, [text for _, text in batch])
+                    embed_futures[future] = [item for item, _ in batch]
+                    reap_embeds(block=False)
+                    reap_writes(block=False)
+                flush_updates()
+                while embed_futures:
+                    reap_embeds(block=True)
+                while write_futures:
+                    reap_writes(block=True)
+            finally:
+                # Keep whatever finished so a rerun picks up from here
+                self.checkpoint.save()
+
+        logger.info(f"Ingestion complete: {stats.summary()}")
+        return stats
@@ -0,0 +1,371 @@
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+import heapq
+import io
+import itertools
+import json
+import math
+import os
+import re
+import shutil
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Alphanumeric runs, keeping dotted versions like "5.3" together
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)*")
+# Split points between digits and letters, e.g. "5000mah" -> "5000", "mah"
+ALNUM_BOUNDARY = re.compile(r"[0-9]+(?:\.[0-9]+)*|[a-z]+")
+
+# Product fields indexed for lexical matching and their term-frequency weights
+DEFAULT_FIELD_WEIGHTS = {
+    "name": 2.0,
+    "description": 1.0,
+    "features": 1.5
+}
+
+# Fields kept per product for filtering hits; full records stay in the vector index
+FILTER_COLUMNS = ("category", "brand", "price")
+
+# On-disk layout of an index directory:
+#
+#   manifest.json   BM25 parameters, product count and total length
+#   docs.jsonl      [id, length, filter columns] per product
+#   terms.json      term -> [first posting, document frequency]
+#   postings.bin    (doc, tf) pairs grouped by term, memory-mapped when loaded
+#
+# BM25Writer keeps postings for a chunk of products at a time and spills
+# them to a run file sorted by term; the runs are merged into postings.bin
+# when the writer is closed, so building the index takes memory for one
+# chunk and the vocabulary rather than for the catalog.
+MANIFEST_FILE = "manifest.json"
+DOCS_FILE = "docs.jsonl"
+TERMS_FILE = "terms.json"
+POSTINGS_FILE = "postings.bin"
+POSTING_DTYPE = np.dtype([("doc", "<i4"), ("tf", "<f4")])
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Tokenize text for lexical matching
+
+    Mixed tokens such as "5000mAh" or "rtx3070" are kept whole and also split
+    into their numeric and alphabetic parts, so "5000 mAh" and "5000mAh"
+    match each other.
+    """
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        parts = ALNUM_BOUNDARY.findall(token)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+def _field_text(product: Dict, field: str) -> str:
+    value = product.get(field, "")
+    if isinstance(value, (list, tuple)):
+        return " ".join(str(v) for v in value)
+    return str(value)
+
+
+def _document_terms(product: Dict, field_weights: Dict[str, float]) -> Tuple[Dict[str, float], float]:
+    """Weighted term frequencies and length of a product"""
+    terms: Dict[str, float] = {}
+    length = 0.0
+    for field, weight in field_weights.items():
+        for token in tokenize(_field_text(product, field)):
+            terms[token] = terms.get(token, 0.0) + weight
+            length += weight
+    return terms, length
+
+
+class _PostingsBuffer:
+    """Postings of a chunk of products, by term"""
+
+    def __init__(self):
+        self.postings: Dict[str, Tuple[List[int], List[float]]] = {}
+
+    def add(self, doc: int, terms: Dict[str, float]) -> None:
+        for term, tf in terms.items():
+            docs, tfs = self.postings.setdefault(term, ([], []))
+            docs.append(doc)
+            tfs.append(tf)
+
+    def sorted_run(self) -> Iterator[List]:
+        for term in sorted(self.postings):
+            docs, tfs = self.postings[term]
+            yield [term, docs, tfs]
+
+
+def _merge_runs(runs: List[Iterable[List]], out) -> Dict[str, Tuple[int, int]]:
+    """
+    Merge runs sorted by term into consecutive postings written to out
+
+    Runs hold increasing document numbers, so concatenating a term's
+    postings in run order keeps them sorted by document.
+    """
+    terms = {}
+    offset = 0
+    for term, group in itertools.groupby(heapq.merge(*runs, key=lambda entry: entry[0]), key=lambda entry: entry[0]):
+        start = offset
+        for _, docs, tfs in group:
+            block = np.empty(len(docs), dtype=POSTING_DTYPE)
+            block["doc"] = docs
+            block["tf"] = tfs
+            out.write(block.tobytes())
+            offset += len(docs)
+        terms[term] = (start, offset - start)
+    return terms
+
+
+class BM25Index:
+    """
+    Inverted index with Okapi BM25 scoring over product text
+
+    Built at ingest time with BM25Writer and loaded by the API at startup to
+    answer exact-spec queries without an embedding call. Postings are
+    memory-mapped, and only IDs and filter columns (FILTER_COLUMNS) are kept
+    per product: hits carry an ID and score, and callers look up the full
+    record in the vector index.
+    """
+
+    def __init__(
+        self,
+        doc_ids: List[str],
+        doc_lengths: np.ndarray,
+        columns: List[Dict],
+        terms: Dict[str, Tuple[int, int]],
+        postings: np.ndarray,
+        k1: float = 1.2,
+        b: float = 0.75,
+        field_weights: Optional[Dict[str, float]] = None
+    ):
+        self.k1 = k1
+        self.b = b
+        self.field_weights = field_weights or dict(DEFAULT_FIELD_WEIGHTS)
+        self.doc_ids = doc_ids
+        self.doc_lengths = doc_lengths
+        self.columns = columns
+        self.terms = terms
+        self.postings = postings
+        self._avg_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+        # Position of each product, built on the first lookup by ID
+        self._positions: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def values(self, column: str) -> Set:
+        """Distinct values of a filter column, e.g. the catalog's brands"""
+        return {row.get(column) for row in self.columns} - {None}
+
+    def row(self, doc_id: str) -> Optional[Dict]:
+        """Filter columns of a product, or None if it isn't indexed"""
+        if self._positions is None:
+            self._positions = {doc_id: position for position, doc_id in enumerate(self.doc_ids)}
+        position = self._positions.get(doc_id)
+        return self.columns[position] if position is not None else None
+
+    @classmethod
+    def from_products(
+        cls,
+        products: Iterable[Dict],
+        k1: float = 1.2,
+        b: float = 0.75,
+        field_weights: Optional[Dict[str, float]] = None
+    ) -> "BM25Index":
+        """Build an index in memory over an iterable of product dicts"""
+        field_weights = field_weights or dict(DEFAULT_FIELD_WEIGHTS)
+        buffer = _PostingsBuffer()
+        doc_ids, doc_lengths, columns = [], [], []
+        for product in products:
+            terms, length = _document_terms(product, field_weights)
+            buffer.add(len(doc_ids), terms)
+            doc_ids.append(product["id"])
+            doc_lengths.append(length)
+            columns.append({column: product.get(column) for column in FILTER_COLUMNS})
+        out = io.BytesIO()
+        terms = _merge_runs([buffer.sorted_run()], out)
+        postings = np.frombuffer(out.getvalue(), dtype=POSTING_DTYPE)
+        return cls(doc_ids, np.asarray(doc_lengths, dtype=np.float64), columns, terms, postings, k1, b, field_weights)
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 10,
+        predicate: Optional[Callable[[Dict], bool]] = None
+    ) -> List[Dict]:
+        """
+        Score products against a query with BM25
+
+        Args:
+            query: Free-text query
+            top_k: Number of results to return
+            predicate: Optional filter applied to candidates' filter columns
+
+        Returns:
+            List of {"id", "score"} for matching products, best first
+        """
+        n = len(self.doc_ids)
+        if not n:
+            return []
+
+        doc_parts, score_parts = [], []
+        for term in set(tokenize(query)):
+            entry = self.terms.get(term)
+            if entry is None:
+                continue
+            start, df = entry
+            block = self.postings[start:start + df]
+            docs = block["doc"]
+            tf = block["tf"].astype(np.float64)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[docs] / self._avg_length)
+            doc_parts.append(docs)
+            score_parts.append(idf * tf * (self.k1 + 1) / (tf + norm))
+        if not doc_parts:
+            return []
+
+        docs, inverse = np.unique(np.concatenate(doc_parts), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+        results = []
+        for i in np.argsort(-scores, kind="stable"):
+            doc = int(docs[i])
+            if predicate is not None and not predicate(self.columns[doc]):
+                continue
+            results.append({"id": self.doc_ids[doc], "score": float(scores[i])})
+            if len(results) >= top_k:
+                break
+        return results
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        """Load an index directory written by BM25Writer"""
+        if os.path.isfile(path):
+            # Single JSON file written by earlier versions, with full metadata
+            with open(path, encoding="utf-8") as f:
+                payload = json.load(f)
+            logger.warning(f"Lexical index {path} uses the old JSON format; rebuild it with scripts/init_db.py")
+            return cls.from_products(payload["metadata"], k1=payload["k1"], b=payload["b"], field_weights=payload["field_weights"])
+
+        with open(os.path.join(path, MANIFEST_FILE), encoding="utf-8") as f:
+            manifest = json.load(f)
+        with open(os.path.join(path, TERMS_FILE), encoding="utf-8") as f:
+            terms = {term: tuple(entry) for term, entry in json.load(f).items()}
+        doc_ids, doc_lengths, columns = [], [], []
+        with open(os.path.join(path, DOCS_FILE), encoding="utf-8") as f:
+            for line in f:
+                doc_id, length, row = json.loads(line)
+                doc_ids.append(doc_id)
+                doc_lengths.append(length)
+                columns.append(row)
+        postings_path = os.path.join(path, POSTINGS_FILE)
+        if os.path.getsize(postings_path):
+            postings = np.memmap(postings_path, dtype=POSTING_DTYPE, mode="r")
+        else:
+            postings = np.empty(0, dtype=POSTING_DTYPE)
+        index = cls(
+            doc_ids,
+            np.asarray(doc_lengths, dtype=np.float64),
+            columns,
+            terms,
+            postings,
+            k1=manifest["k1"],
+            b=manifest["b"],
+            field_weights=manifest["field_weights"]
+        )
+        logger.info(f"Loaded lexical index with {len(index)} products from {path}")
+        return index
+
+
+class BM25Writer:
+    """
+    Builds a BM25Index directory from a stream of products in bounded memory
+
+    Postings are buffered for chunk_size products, then written to a run
+    file sorted by term. close() merges the runs and replaces any index
+    previously at path; until then the index being built lives in a staging
+    directory next to it.
+
+    Args:
+        path: Index directory
+        chunk_size: Products whose postings are buffered before a spill
+    """
+
+    def __init__(
+        self,
+        path: str,
+        chunk_size: int = 50_000,
+        k1: float = 1.2,
+        b: float = 0.75,
+        field_weights: Optional[Dict[str, float]] = None
+    ):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.k1 = k1
+        self.b = b
+        self.field_weights = field_weights or dict(DEFAULT_FIELD_WEIGHTS)
+        self.count = 0
+        self.staging = f"{path}.tmp"
+        if os.path.exists(self.staging):
+            shutil.rmtree(self.staging)
+        os.makedirs(self.staging)
+        self._docs = open(os.path.join(self.staging, DOCS_FILE), "w", encoding="utf-8")
+        self._buffer = _PostingsBuffer()
+        self._buffered = 0
+        self._runs: List[str] = []
+
+    def add(self, product: Dict) -> None:
+        """Add a single product to the index"""
+        terms, length = _document_terms(product, self.field_weights)
+        self._buffer.add(self.count, terms)
+        row = {column: product.get(column) for column in FILTER_COLUMNS}
+        self._docs.write(json.dumps([product["id"], length, row], separators=(",", ":")) + "\n")
+        self.count += 1
+        self._buffered += 1
+        if self._buffered >= self.chunk_size:
+            self._spill()
+
+    def _spill(self) -> None:
+        if not self._buffered:
+            return
+        run_path = os.path.join(self.staging, f"run-{len(self._runs)}.jsonl")
+        with open(run_path, "w", encoding="utf-8") as f:
+            for entry in self._buffer.sorted_run():
+                f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self._runs.append(run_path)
+        self._buffer = _PostingsBuffer()
+        self._buffered = 0
+
+    def close(self) -> None:
+        """Merge the runs and publish the index at path"""
+        self._spill()
+        self._docs.close()
+        run_files = [open(run_path, encoding="utf-8") for run_path in self._runs]
+        try:
+            with open(os.path.join(self.staging, POSTINGS_FILE), "wb") as out:
+                terms = _merge_runs([(json.loads(line) for line in f) for f in run_files], out)
+        finally:
+            for f in run_files:
+                f.close()
+        for run_path in self._runs:
+            os.remove(run_path)
+
+        with open(os.path.join(self.staging, TERMS_FILE), "w", encoding="utf-8") as f:
+            json.dump(terms, f)
+        with open(os.path.join(self.staging, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump({"k1": self.k1, "b": self.b, "field_weights": self.field_weights, "count": self.count}, f)
+
+        if os.path.isdir(self.path):
+            previous = f"{self.path}.old"
+            if os.path.exists(previous):
+                shutil.rmtree(previous)
+            os.replace(self.path, previous)
+            os.replace(self.staging, self.path)
+            shutil.rmtree(previous)
+        else:
+            if os.path.exists(self.path):
+                # JSON index written by earlier versions
+                os.remove(self.path)
+            os.replace(self.staging, self.path)
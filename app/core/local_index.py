@@ -0,0 +1,418 @@
+from typing import Dict, Iterable, List, Optional, Sequence
+from types import SimpleNamespace
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+import numpy as np
+from .offline import InMemoryIndex, matches_filter
+from .quantization import load_quantizer, train_quantizer
+from .serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+# Read-only vector index served from versioned files that every worker
+# memory-maps. The OS page cache holds one copy of the matrix and metadata
+# however many workers map them. Layout under the index root:
+#
+#   CURRENT                      name of the live version
+#   <version>/manifest.json      namespaces, row counts, dtype, columns
+#   <version>/<ns>.vectors.npy   unit-normalized rows (float32 or float16)
+#   <version>/<ns>.ids.npy       ID per row
+#   <version>/<ns>.metadata.bin  JSON metadata per row, concatenated
+#   <version>/<ns>.offsets.npy   row boundaries in metadata.bin
+#   <version>/<ns>.col.<f>.npy   filterable metadata columns
+#   <version>/<ns>.codes.npy     quantized rows (int8 or pq), when enabled
+#   <version>/<ns>.quantizer.npz quantizer parameters for the codes
+#   <version>/checkpoint.db      ingest checkpoint the version was built with
+#
+# With quantization, queries scan the compact codes, and only the best
+# top_k * rescore_factor candidates are re-scored against the full-precision
+# rows, so most of the vector file never has to be resident in memory.
+#
+# publish_index writes a new version directory, then replaces CURRENT
+# atomically. Workers notice the change within LOCAL_INDEX_REFRESH_S and
+# switch to the new version between queries; a version stays mapped until
+# the queries using it finish.
+
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+CHECKPOINT_FILE = "checkpoint.db"
+# Name of the checkpoint in versions published before it moved to SQLite
+LEGACY_CHECKPOINT_FILE = "checkpoint.json"
+DEFAULT_COLUMNS = ("category", "brand", "price")
+
+# Rows scored per block when the matrix is float16, bounding the float32 copy
+QUERY_BLOCK_ROWS = 8192
+
+
+def current_version(root: str) -> Optional[str]:
+    """Live version under an index root, or None if nothing is published"""
+    try:
+        with open(os.path.join(root, CURRENT_FILE), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _column_values(metadata: Sequence[Dict], field: str) -> Optional[np.ndarray]:
+    values = [m.get(field) for m in metadata]
+    present = [v for v in values if v is not None]
+    if not present:
+        return None
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    if all(isinstance(v, str) for v in present):
+        return np.array(["" if v is None else v for v in values], dtype=str)
+    # Lists and mixed types are filtered row by row from the metadata
+    return None
+
+
+def _fsync_write(path: str, data: bytes) -> None:
+    with open(path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def publish_index(
+    index: InMemoryIndex,
+    root: str,
+    dtype: str = "float32",
+    columns: Iterable[str] = DEFAULT_COLUMNS,
+    keep: int = 3,
+    checkpoint_path: Optional[str] = None,
+    quantization: str = "none",
+    pq_subspaces: int = 0
+) -> str:
+    """
+    Write an in-memory index as a new version and make it current
+
+    Args:
+        index: Index holding the full catalog, e.g. filled by IngestionPipeline
+        root: Index root directory
+        dtype: Matrix dtype, "float32" or "float16"
+        columns: Metadata fields stored as columns for vectorized filtering
+        keep: Versions kept on disk, including the new one
+        checkpoint_path: Ingest checkpoint matching this index, stored with the version
+        quantization: Compressed codes to scan at query time: "none", "int8" or "pq"
+        pq_subspaces: Subspaces for "pq"; 0 picks dimensions / 4
+
+    Returns:
+        The new version name
+    """
+    version = time.strftime("%Y%m%dT%H%M%S", time.gmtime()) + "-" + uuid.uuid4().hex[:8]
+    os.makedirs(root, exist_ok=True)
+    staging = os.path.join(root, f".staging-{version}")
+    os.makedirs(staging)
+
+    manifest = {
+        "version": version,
+        "created_at": time.time(),
+        "dtype": dtype,
+        "quantization": quantization,
+        "namespaces": {}
+    }
+    for i, (name, ns) in enumerate(sorted(index.namespaces.items())):
+        if not ns.ids:
+            continue
+        prefix = f"ns{i}"
+        path = os.path.join(staging, prefix)
+        np.save(f"{path}.vectors.npy", ns.matrix().astype(dtype))
+        np.save(f"{path}.ids.npy", np.array(ns.ids, dtype=str))
+        quantizer = train_quantizer(quantization, ns.matrix(), pq_subspaces)
+        if quantizer is not None:
+            np.save(f"{path}.codes.npy", quantizer.encode(ns.matrix()))
+            quantizer.save(f"{path}.quantizer.npz")
+
+        fragments = [dumps(metadata) for metadata in ns.metadata]
+        offsets = np.zeros(len(fragments) + 1, dtype=np.int64)
+        np.cumsum([len(fragment) for fragment in fragments], out=offsets[1:])
+        _fsync_write(f"{path}.metadata.bin", b"".join(fragments))
+        np.save(f"{path}.offsets.npy", offsets)
+
+        stored_columns = []
+        for field in columns:
+            values = _column_values(ns.metadata, field)
+            if values is not None:
+                np.save(f"{path}.col.{field}.npy", values)
+                stored_columns.append(field)
+
+        manifest["namespaces"][name] = {
+            "prefix": prefix,
+            "count": len(ns.ids),
+            "dimensions": int(ns.matrix().shape[1]),
+            "columns": stored_columns,
+            "quantized": quantizer is not None
+        }
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        shutil.copyfile(checkpoint_path, os.path.join(staging, CHECKPOINT_FILE))
+    _fsync_write(os.path.join(staging, MANIFEST_FILE), json.dumps(manifest, indent=2).encode("utf-8"))
+    os.replace(staging, os.path.join(root, version))
+
+    current_tmp = os.path.join(root, f"{CURRENT_FILE}.tmp")
+    _fsync_write(current_tmp, version.encode("utf-8"))
+    os.replace(current_tmp, os.path.join(root, CURRENT_FILE))
+    logger.info(f"Published local index version {version} to {root}")
+
+    _prune_versions(root, version, keep)
+    return version
+
+
+def _prune_versions(root: str, current: str, keep: int) -> None:
+    # Workers still mapping a removed version keep reading it until they switch
+    versions = sorted(
+        name for name in os.listdir(root)
+        if not name.startswith(".") and name != current
+        and os.path.isfile(os.path.join(root, name, MANIFEST_FILE))
+    )
+    for name in versions[:max(0, len(versions) - (keep - 1))]:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def load_index(root: str) -> InMemoryIndex:
+    """Load the current version into an InMemoryIndex, e.g. to apply incremental changes"""
+    index = InMemoryIndex()
+    if current_version(root) is None:
+        return index
+    snapshot = _Snapshot(root, current_version(root))
+    for name, ns in snapshot.namespaces.items():
+        target = index._namespace(name)
+        for row in range(ns.count):
+            target.upsert(str(ns.ids[row]), np.asarray(ns.matrix[row], dtype=np.float32), ns.metadata(row))
+    return index
+
+
+class _MappedNamespace:
+    def __init__(self, directory: str, info: Dict):
+        path = os.path.join(directory, info["prefix"])
+        self.count = info["count"]
+        self.matrix = np.load(f"{path}.vectors.npy", mmap_mode="r")
+        self.ids = np.load(f"{path}.ids.npy", mmap_mode="r")
+        self.offsets = np.load(f"{path}.offsets.npy", mmap_mode="r")
+        self.blob = np.memmap(f"{path}.metadata.bin", dtype=np.uint8, mode="r") if self.offsets[-1] else None
+        self.columns = {field: np.load(f"{path}.col.{field}.npy", mmap_mode="r") for field in info["columns"]}
+        self.columns["id"] = self.ids
+        self.codes = None
+        self.quantizer = None
+        if info.get("quantized"):
+            self.codes = np.load(f"{path}.codes.npy", mmap_mode="r")
+            self.quantizer = load_quantizer(f"{path}.quantizer.npz")
+        self._positions: Optional[Dict[str, int]] = None
+
+    def metadata(self, row: int) -> Dict:
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return loads(self.blob[start:end].tobytes()) if end > start else {}
+
+    def position(self, vector_id: str) -> Optional[int]:
+        if self._positions is None:
+            self._positions = {str(vector_id): row for row, vector_id in enumerate(self.ids)}
+        return self._positions.get(vector_id)
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        """Scores for every row; approximate when the namespace is quantized"""
+        if self.quantizer is not None:
+            return self.quantizer.scores(self.codes, query)
+        if self.matrix.dtype == np.float32:
+            return self.matrix @ query
+        scores = np.empty(self.count, dtype=np.float32)
+        for start in range(0, self.count, QUERY_BLOCK_ROWS):
+            block = self.matrix[start:start + QUERY_BLOCK_ROWS]
+            scores[start:start + len(block)] = block.astype(np.float32) @ query
+        return scores
+
+    def rescore(self, rows: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Exact scores for the given rows, read from the full-precision matrix"""
+        return np.asarray(self.matrix[rows], dtype=np.float32) @ query
+
+
+def _column_mask(column: np.ndarray, condition) -> Optional[np.ndarray]:
+    """Vectorized condition on a column, or None when it needs row-by-row evaluation"""
+    if not isinstance(condition, dict):
+        condition = {"$eq": condition}
+    numeric = column.dtype.kind == "f"
+
+    def comparable(value) -> bool:
+        if numeric:
+            return isinstance(value, (int, float)) and not isinstance(value, bool)
+        return isinstance(value, str)
+
+    mask = np.ones(len(column), dtype=bool)
+    for op, operand in condition.items():
+        if op in ("$in", "$nin"):
+            if not all(comparable(value) for value in operand):
+                return None
+            matched = np.isin(column, list(operand))
+            mask &= matched if op == "$in" else ~matched
+        elif op in ("$eq", "$ne") and comparable(operand):
+            mask &= (column == operand) if op == "$eq" else (column != operand)
+        elif op in ("$gt", "$gte", "$lt", "$lte") and numeric and comparable(operand):
+            with np.errstate(invalid="ignore"):
+                if op == "$gt":
+                    mask &= column > operand
+                elif op == "$gte":
+                    mask &= column >= operand
+                elif op == "$lt":
+                    mask &= column < operand
+                else:
+                    mask &= column <= operand
+        else:
+            return None
+    return mask
+
+
+class _Snapshot:
+    def __init__(self, root: str, version: str):
+        directory = os.path.join(root, version)
+        with open(os.path.join(directory, MANIFEST_FILE), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.version = version
+        self.namespaces = {
+            name: _MappedNamespace(directory, info)
+            for name, info in self.manifest["namespaces"].items()
+        }
+
+    def filter_mask(self, ns: _MappedNamespace, filter: Dict) -> np.ndarray:
+        mask = np.ones(ns.count, dtype=bool)
+        for key, condition in filter.items():
+            if key == "$and":
+                for clause in condition:
+                    mask &= self.filter_mask(ns, clause)
+            elif key == "$or":
+                any_clause = np.zeros(ns.count, dtype=bool)
+                for clause in condition:
+                    any_clause |= self.filter_mask(ns, clause)
+                mask &= any_clause
+            else:
+                column = ns.columns.get(key)
+                clause_mask = _column_mask(column, condition) if column is not None else None
+                if clause_mask is None:
+                    clause_mask = np.fromiter(
+                        (mask[row] and matches_filter(ns.metadata(row), {key: condition}) for row in range(ns.count)),
+                        dtype=bool,
+                        count=ns.count
+                    )
+                mask &= clause_mask
+        return mask
+
+
+class LocalIndex:
+    """
+    Memory-mapped, read-only index implementing the Pinecone query/fetch surface
+
+    Args:
+        root: Index root written by publish_index
+        refresh_interval: Seconds between checks for a new current version
+        rescore_factor: With quantized codes, top_k times this many candidates
+            are re-scored at full precision
+    """
+
+    def __init__(self, root: str, refresh_interval: float = 5.0, rescore_factor: int = 8):
+        self.root = root
+        self.refresh_interval = refresh_interval
+        self.rescore_factor = rescore_factor
+        self._snapshot: Optional[_Snapshot] = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        if not self.refresh():
+            raise FileNotFoundError(f"No local index published under {root}")
+
+    @property
+    def version(self) -> str:
+        return self._snapshot.version
+
+    def refresh(self) -> bool:
+        """Switch to the current version if it changed; True if one is loaded"""
+        self._checked = time.monotonic()
+        version = current_version(self.root)
+        if version is None:
+            return self._snapshot is not None
+        if self._snapshot is not None and version == self._snapshot.version:
+            return True
+        snapshot = _Snapshot(self.root, version)
+        with self._lock:
+            previous, self._snapshot = self._snapshot, snapshot
+        if previous is not None:
+            logger.info(f"Local index switched from {previous.version} to {version}")
+        return True
+
+    def _current(self) -> _Snapshot:
+        if time.monotonic() - self._checked >= self.refresh_interval:
+            try:
+                self.refresh()
+            except Exception as e:
+                # Keep serving the mapped version if the new one can't be opened
+                logger.error(f"Error loading local index from {self.root}: {str(e)}")
+        return self._snapshot
+
+    def fetch(self, ids: List[str], namespace: str = "", **kwargs) -> SimpleNamespace:
+        snapshot = self._current()
+        ns = snapshot.namespaces.get(namespace)
+        vectors = {}
+        if ns is not None:
+            for vector_id in ids:
+                row = ns.position(vector_id)
+                if row is not None:
+                    vectors[vector_id] = SimpleNamespace(
+                        id=vector_id,
+                        values=np.asarray(ns.matrix[row], dtype=np.float32).tolist(),
+                        metadata=ns.metadata(row)
+                    )
+        return SimpleNamespace(vectors=vectors, namespace=namespace)
+
+    def query(
+        self,
+        vector: List[float],
+        top_k: int = 10,
+        include_metadata: bool = False,
+        include_values: bool = False,
+        namespace: str = "",
+        filter: Optional[Dict] = None,
+        **kwargs
+    ) -> SimpleNamespace:
+        snapshot = self._current()
+        ns = snapshot.namespaces.get(namespace)
+        if ns is None or not ns.count:
+            return SimpleNamespace(matches=[], namespace=namespace)
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        query = query / norm if norm else query
+        scores = ns.scores(query)
+        if filter:
+            scores = np.where(snapshot.filter_mask(ns, filter), scores, -np.inf)
+        rows = None
+        if ns.quantizer is not None:
+            # Keep the best approximate candidates and re-score them exactly
+            candidates = min(ns.count, max(top_k, top_k * self.rescore_factor))
+            rows = np.argpartition(-scores, candidates - 1)[:candidates]
+            # Sorted rows read the mapped matrix front to back
+            rows = np.sort(rows[np.isfinite(scores[rows])])
+            scores = ns.rescore(rows, query)
+        k = min(top_k, len(scores))
+        if not k:
+            return SimpleNamespace(matches=[], namespace=namespace)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        matches = [
+            SimpleNamespace(
+                id=str(ns.ids[row]),
+                score=float(score),
+                values=np.asarray(ns.matrix[row], dtype=np.float32).tolist() if include_values else [],
+                metadata=ns.metadata(row) if include_metadata else None
+            )
+            for row, score in ((i if rows is None else int(rows[i]), scores[i]) for i in top)
+            if np.isfinite(score)
+        ]
+        return SimpleNamespace(matches=matches, namespace=namespace)
+
+    def describe_index_stats(self, **kwargs) -> Dict:
+        snapshot = self._current()
+        namespaces = {name: {"vector_count": ns.count} for name, ns in snapshot.namespaces.items()}
+        return {
+            "namespaces": namespaces,
+            "total_vector_count": sum(ns["vector_count"] for ns in namespaces.values()),
+            "version": snapshot.version
+        }
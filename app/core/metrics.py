@@ -0,0 +1,301 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+from abc import ABC, abstractmethod
+from contextvars import ContextVar
+import bisect
+import threading
+import time
+from .config import settings
+
+# Minimal Prometheus-format metrics. Counters, gauges and histograms are kept
+# in process and rendered in the text exposition format on /metrics. When
+# metrics are disabled, stage timers are a shared no-op object so the search
+# hot path pays only an attribute lookup.
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Stage durations and cache outcomes of the current request, collected only
+# while it is being captured (see app.core.recorder). Worker threads started
+# with a copy of the context add to the same dict.
+request_stats: ContextVar[Optional[Dict]] = ContextVar("request_stats", default=None)
+
+
+def _format_labels(names: Sequence[str], values: Tuple[str, ...], extra: Optional[Dict[str, str]] = None) -> str:
+    pairs = list(zip(names, values)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def _new_child(self):
+        """A child holding the values for one combination of label values"""
+
+    def labels(self, *values: str, **kwargs: str):
+        """Child metric for one combination of label values"""
+        key = tuple(str(v) for v in values) if values else tuple(str(kwargs[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in sorted(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, key))
+        return lines
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def render(self, name, labelnames, key) -> List[str]:
+        return [f"{name}{_format_labels(labelnames, key)} {_format_value(self.value)}"]
+
+
+class _GaugeChild(_CounterChild):
+    def dec(self, amount: float = 1.0) -> None:
+        self.inc(-amount)
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self.value = value
+
+
+class _HistogramChild:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[position] += 1
+            self.sum += value
+
+    def render(self, name, labelnames, key) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(list(self.buckets) + [float("inf")], self.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels(labelnames, key, {'le': _format_value(bound)})} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, key)} {_format_value(self.sum)}")
+        lines.append(f"{name}_count{_format_labels(labelnames, key)} {cumulative}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+
+class MetricsRegistry:
+    """Holds every metric and renders them for /metrics"""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.metrics: List[_Metric] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def _register(self, metric: _Metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry(enabled=settings.METRICS_ENABLED)
+
+SEARCH_STAGE_SECONDS = registry.histogram(
+    "search_stage_duration_seconds",
+    "Time spent in each stage of the search pipeline",
+    ["stage"]
+)
+SEARCH_STAGE_ERRORS = registry.counter(
+    "search_stage_errors_total",
+    "Search pipeline stages that raised",
+    ["stage"]
+)
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route",
+    ["method", "path", "status"]
+)
+HTTP_REQUESTS_IN_FLIGHT = registry.gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being served",
+    ["path"]
+)
+UPSTREAM_ERRORS = registry.counter(
+    "upstream_errors_total",
+    "Failed calls to upstream services",
+    ["service", "operation"]
+)
+CACHE_LOOKUPS = registry.counter(
+    "cache_lookups_total",
+    "In-process cache lookups by cache and outcome",
+    ["cache", "outcome"]
+)
+
+
+class _StageTimer:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        if registry.enabled:
+            SEARCH_STAGE_SECONDS.labels(self.stage).observe(elapsed)
+            if exc_type is not None:
+                SEARCH_STAGE_ERRORS.labels(self.stage).inc()
+        stats = request_stats.get()
+        if stats is not None:
+            stages = stats["stages"]
+            stages[self.stage] = stages.get(self.stage, 0.0) + elapsed * 1000
+        return False
+
+
+class _NoopTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_TIMER = _NoopTimer()
+
+
+def time_stage(stage: str):
+    """Context manager recording the duration of a search pipeline stage"""
+    if not registry.enabled and request_stats.get() is None:
+        return _NOOP_TIMER
+    return _StageTimer(stage)
+
+
+def record_upstream_error(service: str, operation: str) -> None:
+    """Count a failed call to OpenAI, Pinecone or another upstream"""
+    if registry.enabled:
+        UPSTREAM_ERRORS.labels(service, operation).inc()
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    """Count a hit or miss in one of the in-process caches"""
+    outcome = "hit" if hit else "miss"
+    if registry.enabled:
+        CACHE_LOOKUPS.labels(cache, outcome).inc()
+    stats = request_stats.get()
+    if stats is not None:
+        key = f"{cache}.{outcome}"
+        stats["cache"][key] = stats["cache"].get(key, 0) + 1
+
+
+def route_path(scope) -> str:
+    """Route template matching an HTTP scope, e.g. /api/similar/{product_id}"""
+    from starlette.routing import Match
+
+    router = scope.get("app")
+    for route in getattr(router, "routes", []):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", scope["path"])
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording per-route request latency and in-flight requests
+
+    Requests are labelled with the route template (e.g. /api/similar/{product_id})
+    rather than the raw path, to keep label cardinality bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not registry.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        path = route_path(scope)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        in_flight = HTTP_REQUESTS_IN_FLIGHT.labels(path)
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight.dec()
+            HTTP_REQUEST_SECONDS.labels(scope["method"], path, str(status["code"])).observe(time.perf_counter() - start)
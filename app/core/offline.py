@@ -0,0 +1,317 @@
+from typing import Any, Dict, Iterable, List, Optional, Union
+from types import SimpleNamespace
+import re
+import threading
+import time
+import zlib
+import numpy as np
+
+# Local stand-ins for the OpenAI and Pinecone clients. They implement only the
+# surface this service uses, deterministically and without network access, so
+# benchmarks measure our own code paths rather than the internet.
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+class HashingEmbeddings:
+    """
+    Deterministic text embeddings from hashed word and character n-grams
+
+    Texts sharing vocabulary get similar vectors, which is enough to exercise
+    retrieval and ranking end to end with the real dimensionality.
+    """
+
+    def __init__(self, dimensions: int = 1536, ngram: int = 3):
+        self.dimensions = dimensions
+        self.ngram = ngram
+
+    def _features(self, text: str) -> Iterable[str]:
+        words = WORD_PATTERN.findall(text.lower())
+        for word in words:
+            yield word
+            padded = f"#{word}#"
+            for i in range(len(padded) - self.ngram + 1):
+                yield padded[i:i + self.ngram]
+
+    def embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for feature in self._features(text):
+            h = zlib.crc32(feature.encode("utf-8"))
+            vector[h % self.dimensions] += 1.0 if h & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector.tolist()
+
+
+class _OfflineEmbeddingsAPI:
+    def __init__(self, embedder: HashingEmbeddings, latency: float):
+        self.embedder = embedder
+        self.latency = latency
+
+    def create(self, model: str, input: Union[str, List[str]], **kwargs) -> SimpleNamespace:
+        texts = [input] if isinstance(input, str) else list(input)
+        if self.latency:
+            time.sleep(self.latency)
+        data = [
+            SimpleNamespace(index=i, embedding=self.embedder.embed(text), object="embedding")
+            for i, text in enumerate(texts)
+        ]
+        tokens = sum(len(text) // 4 + 1 for text in texts)
+        return SimpleNamespace(
+            data=data,
+            model=model,
+            usage=SimpleNamespace(prompt_tokens=tokens, total_tokens=tokens)
+        )
+
+
+class _OfflineChatCompletionsAPI:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def create(self, model: str, messages: List[Dict], **kwargs) -> SimpleNamespace:
+        if self.latency:
+            time.sleep(self.latency)
+        last = messages[-1]["content"] if messages else ""
+        if isinstance(last, list):
+            # Vision requests carry a list of content parts
+            last = " ".join(part.get("text", "") for part in last if part.get("type") == "text")
+        content = f"Offline response to: {last[:200]}"
+        prompt_tokens = sum(len(str(message.get("content", ""))) // 4 + 1 for message in messages)
+        completion_tokens = len(content) // 4 + 1
+        return SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(index=0, finish_reason="stop", message=SimpleNamespace(role="assistant", content=content))],
+            usage=SimpleNamespace(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=prompt_tokens + completion_tokens
+            )
+        )
+
+
+class OfflineOpenAI:
+    """
+    Drop-in replacement for openai.OpenAI covering embeddings and chat completions
+
+    Args:
+        dimensions: Embedding dimensionality
+        embedding_latency: Seconds to sleep per embeddings request
+        chat_latency: Seconds to sleep per chat completion, to mimic upstream latency
+    """
+
+    def __init__(self, dimensions: int = 1536, embedding_latency: float = 0.0, chat_latency: float = 0.0):
+        self.embeddings = _OfflineEmbeddingsAPI(HashingEmbeddings(dimensions), embedding_latency)
+        self.chat = SimpleNamespace(completions=_OfflineChatCompletionsAPI(chat_latency))
+
+
+def _match_condition(value: Any, condition: Any) -> bool:
+    if not isinstance(condition, dict):
+        return value == condition
+    for op, operand in condition.items():
+        if op == "$eq" and not value == operand:
+            return False
+        if op == "$ne" and not value != operand:
+            return False
+        if op == "$in" and value not in operand:
+            return False
+        if op == "$nin" and value in operand:
+            return False
+        if op in ("$gt", "$gte", "$lt", "$lte"):
+            if value is None:
+                return False
+            if op == "$gt" and not value > operand:
+                return False
+            if op == "$gte" and not value >= operand:
+                return False
+            if op == "$lt" and not value < operand:
+                return False
+            if op == "$lte" and not value <= operand:
+                return False
+    return True
+
+
+def matches_filter(metadata: Dict, filter: Optional[Dict]) -> bool:
+    """Evaluate a Pinecone-style metadata filter against a metadata dict"""
+    if not filter:
+        return True
+    for key, condition in filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, clause) for clause in condition):
+                return False
+        else:
+            value = metadata.get(key)
+            if isinstance(value, list) and isinstance(condition, dict) and "$in" in condition:
+                # List-valued metadata matches $in when any element is listed
+                if not set(value) & set(condition["$in"]):
+                    return False
+                continue
+            if not _match_condition(value, condition):
+                return False
+    return True
+
+
+class _Namespace:
+    def __init__(self):
+        self.ids: List[str] = []
+        self.positions: Dict[str, int] = {}
+        self.vectors: List[np.ndarray] = []
+        self.metadata: List[Dict] = []
+        self._matrix: Optional[np.ndarray] = None
+
+    def upsert(self, vector_id: str, values: List[float], metadata: Optional[Dict]) -> None:
+        vector = np.asarray(values, dtype=np.float32)
+        if vector_id in self.positions:
+            position = self.positions[vector_id]
+            self.vectors[position] = vector
+            self.metadata[position] = dict(metadata or {})
+        else:
+            self.positions[vector_id] = len(self.ids)
+            self.ids.append(vector_id)
+            self.vectors.append(vector)
+            self.metadata.append(dict(metadata or {}))
+        self._matrix = None
+
+    def delete(self, vector_id: str) -> None:
+        position = self.positions.pop(vector_id, None)
+        if position is None:
+            return
+        del self.ids[position]
+        del self.vectors[position]
+        del self.metadata[position]
+        self.positions = {vid: i for i, vid in enumerate(self.ids)}
+        self._matrix = None
+
+    def matrix(self) -> np.ndarray:
+        # Rows are unit-normalized so a dot product gives cosine similarity
+        if self._matrix is None:
+            matrix = np.vstack(self.vectors)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            self._matrix = matrix / norms
+        return self._matrix
+
+
+class InMemoryIndex:
+    """
+    In-memory vector index implementing the Pinecone Index surface we use
+
+    Supports upsert, update, delete, fetch and query with cosine similarity and
+    Pinecone-style metadata filters, per namespace.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.namespaces: Dict[str, _Namespace] = {}
+        self._lock = threading.RLock()
+
+    def _namespace(self, namespace: str) -> _Namespace:
+        if namespace not in self.namespaces:
+            self.namespaces[namespace] = _Namespace()
+        return self.namespaces[namespace]
+
+    def upsert(self, vectors: List[Union[Dict, tuple]], namespace: str = "", **kwargs) -> SimpleNamespace:
+        with self._lock:
+            ns = self._namespace(namespace)
+            for vector in vectors:
+                if isinstance(vector, dict):
+                    ns.upsert(vector["id"], vector["values"], vector.get("metadata"))
+                else:
+                    ns.upsert(vector[0], vector[1], vector[2] if len(vector) > 2 else None)
+        return SimpleNamespace(upserted_count=len(vectors))
+
+    def update(
+        self,
+        id: str,
+        values: Optional[List[float]] = None,
+        set_metadata: Optional[Dict] = None,
+        namespace: str = "",
+        **kwargs
+    ) -> Dict:
+        with self._lock:
+            ns = self._namespace(namespace)
+            if id not in ns.positions:
+                return {}
+            position = ns.positions[id]
+            if values is not None:
+                ns.vectors[position] = np.asarray(values, dtype=np.float32)
+                ns._matrix = None
+            if set_metadata:
+                ns.metadata[position].update(set_metadata)
+        return {}
+
+    def delete(self, ids: List[str], namespace: str = "", **kwargs) -> Dict:
+        with self._lock:
+            ns = self.namespaces.get(namespace)
+            if ns is not None:
+                for vector_id in ids:
+                    ns.delete(vector_id)
+        return {}
+
+    def fetch(self, ids: List[str], namespace: str = "", **kwargs) -> SimpleNamespace:
+        if self.latency:
+            time.sleep(self.latency)
+        vectors = {}
+        with self._lock:
+            ns = self.namespaces.get(namespace)
+            if ns is not None:
+                for vector_id in ids:
+                    if vector_id in ns.positions:
+                        position = ns.positions[vector_id]
+                        vectors[vector_id] = SimpleNamespace(
+                            id=vector_id,
+                            values=ns.vectors[position].tolist(),
+                            metadata=ns.metadata[position]
+                        )
+        return SimpleNamespace(vectors=vectors, namespace=namespace)
+
+    def query(
+        self,
+        vector: List[float],
+        top_k: int = 10,
+        include_metadata: bool = False,
+        include_values: bool = False,
+        namespace: str = "",
+        filter: Optional[Dict] = None,
+        **kwargs
+    ) -> SimpleNamespace:
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            ns = self.namespaces.get(namespace)
+            if ns is None or not ns.ids:
+                return SimpleNamespace(matches=[], namespace=namespace)
+            query = np.asarray(vector, dtype=np.float32)
+            norm = np.linalg.norm(query)
+            scores = ns.matrix() @ (query / norm if norm else query)
+            if filter:
+                allowed = np.fromiter(
+                    (matches_filter(metadata, filter) for metadata in ns.metadata),
+                    dtype=bool,
+                    count=len(ns.metadata)
+                )
+                scores = np.where(allowed, scores, -np.inf)
+            k = min(top_k, len(ns.ids))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            matches = [
+                SimpleNamespace(
+                    id=ns.ids[i],
+                    score=float(scores[i]),
+                    values=ns.vectors[i].tolist() if include_values else [],
+                    metadata=ns.metadata[i] if include_metadata else None
+                )
+                for i in top if np.isfinite(scores[i])
+            ]
+        return SimpleNamespace(matches=matches, namespace=namespace)
+
+    def describe_index_stats(self, **kwargs) -> Dict:
+        with self._lock:
+            namespaces = {name: {"vector_count": len(ns.ids)} for name, ns in self.namespaces.items()}
+        return {
+            "namespaces": namespaces,
+            "total_vector_count": sum(ns["vector_count"] for ns in namespaces.values())
+        }
@@ -0,0 +1,337 @@
+from typing import Callable, Dict, List, Optional
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+from contextvars import ContextVar
+import asyncio
+import contextvars
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from .config import settings
+from .security import is_admin_key
+
+logger = logging.getLogger(__name__)
+
+# On-demand sampling profiler. A background thread snapshots the stacks of the
+# threads working on the request every few milliseconds and aggregates the
+# samples into folded stacks ("outer;inner count"), which flamegraph.pl and
+# speedscope read directly. Wall-clock samples include time blocked on the
+# network; a sample also counts towards the CPU profile when the thread's CPU
+# clock advanced during the interval. Nothing runs unless a request is profiled.
+#
+# The event loop thread is shared with other requests, so it is only sampled
+# while it runs the profiled request's task. Work the request hands to worker
+# threads (run_in_thread, or executors via submit_attached) is sampled in
+# those threads, in parallel with each other, so the upstream time of
+# concurrent calls adds up and can exceed the request's duration.
+
+# Samples with a frame from one of these packages are attributed to that upstream
+UPSTREAM_PACKAGES = ("openai", "pinecone")
+MAX_STACK_DEPTH = 128
+# Fraction of a sampling interval the thread must spend on CPU to count as on-CPU
+ON_CPU_THRESHOLD = 0.5
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    for marker in ("site-packages" + os.sep, "dist-packages" + os.sep):
+        if marker in filename:
+            filename = filename.split(marker, 1)[1]
+            break
+    else:
+        cwd = os.getcwd() + os.sep
+        if filename.startswith(cwd):
+            filename = filename[len(cwd):]
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def _running_task():
+    """The running event loop and task, or (None, None) outside a loop"""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return None, None
+    return loop, asyncio.current_task(loop)
+
+
+def _thread_cpu_clock(thread_id: int) -> Optional[int]:
+    try:
+        return time.pthread_getcpuclockid(thread_id)
+    except (AttributeError, OSError):
+        return None
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of the threads working on one request at a fixed interval
+
+    Blocking work the request hands to a worker thread (see run_in_thread and
+    submit_attached) attaches that thread, and it is sampled alongside the
+    request's own thread until it detaches. Created on an event loop, the
+    loop thread is only sampled while it runs the creating task.
+
+    Args:
+        thread_id: threading.get_ident() of the thread serving the request
+        interval: Seconds between samples
+    """
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = 0.005):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.wall: Counter = Counter()
+        self.cpu: Counter = Counter()
+        self.upstream: Counter = Counter()
+        self.samples = 0
+        self._threads: List[int] = [self.thread_id]
+        self._loop, self._task = _running_task() if thread_id is None else (None, None)
+        self._cpu_clocks: Dict[int, Optional[int]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.wall_seconds = 0.0
+        self.cpu_seconds: Optional[float] = None
+        self.worker_cpu_seconds = 0.0
+        # CPU time of the loop thread while it was running the request's task
+        self._task_cpu_seconds = 0.0
+
+    def attach(self, thread_id: int) -> None:
+        """Sample thread_id until it is detached"""
+        self._threads.append(thread_id)
+
+    def detach(self, thread_id: int, cpu_seconds: float = 0.0) -> None:
+        self._threads.remove(thread_id)
+        self.worker_cpu_seconds += cpu_seconds
+
+    def _cpu_time(self, thread_id: int) -> Optional[float]:
+        if thread_id not in self._cpu_clocks:
+            self._cpu_clocks[thread_id] = _thread_cpu_clock(thread_id)
+        clock = self._cpu_clocks[thread_id]
+        if clock is None:
+            return None
+        try:
+            return time.clock_gettime(clock)
+        except OSError:
+            # The sampled thread has exited
+            return None
+
+    def _sampled_threads(self) -> List[int]:
+        threads = list(self._threads)
+        if self._task is not None and asyncio.current_task(self._loop) is not self._task:
+            # The loop is idle or running another request
+            threads.remove(self.thread_id)
+        return threads
+
+    def _sample(self, thread_id: int, on_cpu: bool) -> None:
+        frame = sys._current_frames().get(thread_id)
+        if frame is None:
+            return
+        stack = []
+        while frame is not None and len(stack) < MAX_STACK_DEPTH:
+            stack.append(frame)
+            frame = frame.f_back
+        folded = ";".join(_frame_label(f) for f in reversed(stack))
+        self.samples += 1
+        self.wall[folded] += 1
+        if on_cpu:
+            self.cpu[folded] += 1
+        filenames = [f.f_code.co_filename for f in stack]
+        for package in UPSTREAM_PACKAGES:
+            marker = os.sep + package + os.sep
+            if any(marker in filename for filename in filenames):
+                self.upstream[package] += 1
+                break
+
+    def _run(self) -> None:
+        last_wall = time.perf_counter()
+        last_cpu: Dict[int, Optional[float]] = {self.thread_id: self._cpu_time(self.thread_id)}
+        while not self._stop.wait(self.interval):
+            now_wall = time.perf_counter()
+            now_cpu = {}
+            for thread_id in self._sampled_threads():
+                now_cpu[thread_id] = cpu = self._cpu_time(thread_id)
+                before = last_cpu.get(thread_id)
+                # CPU use is only known once a thread has been sampled twice in a row
+                used = cpu - before if cpu is not None and before is not None else None
+                on_cpu = used is not None and used >= (now_wall - last_wall) * ON_CPU_THRESHOLD
+                if used is not None and thread_id == self.thread_id:
+                    self._task_cpu_seconds += used
+                self._sample(thread_id, on_cpu)
+            last_wall, last_cpu = now_wall, now_cpu
+
+    def start(self) -> "SamplingProfiler":
+        self._start_wall = time.perf_counter()
+        self._start_cpu = self._cpu_time(self.thread_id)
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> "SamplingProfiler":
+        end_cpu = self._cpu_time(self.thread_id)
+        self.wall_seconds = time.perf_counter() - self._start_wall
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._task is not None:
+            # The loop thread's clock also counts other requests' work
+            self.cpu_seconds = self._task_cpu_seconds + self.worker_cpu_seconds
+        elif end_cpu is not None and self._start_cpu is not None:
+            self.cpu_seconds = end_cpu - self._start_cpu + self.worker_cpu_seconds
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+    def to_dict(self) -> Dict:
+        """Profile summary with wall and CPU folded stacks"""
+        interval_ms = self.interval * 1000
+        return {
+            "duration_ms": self.wall_seconds * 1000,
+            "cpu_ms": self.cpu_seconds * 1000 if self.cpu_seconds is not None else None,
+            "interval_ms": interval_ms,
+            "samples": self.samples,
+            "upstream_ms": {package: count * interval_ms for package, count in self.upstream.items()},
+            "wall": dict(self.wall),
+            "cpu": dict(self.cpu),
+        }
+
+
+def folded(stacks: Dict[str, int]) -> str:
+    """Render stacks in the folded format read by flamegraph.pl and speedscope"""
+    return "\n".join(f"{stack} {count}" for stack, count in sorted(stacks.items())) + "\n"
+
+
+class ProfileStore:
+    """Most recent profiles by request ID, evicting the oldest beyond max_size"""
+
+    def __init__(self, max_size: int = 50):
+        self.max_size = max_size
+        self._profiles: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, profile_id: str, profile: Dict) -> None:
+        with self._lock:
+            self._profiles[profile_id] = profile
+            self._profiles.move_to_end(profile_id)
+            while len(self._profiles) > self.max_size:
+                self._profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[Dict]:
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def list(self) -> List[Dict]:
+        """Profile summaries, newest first, without the stacks"""
+        with self._lock:
+            profiles = list(self._profiles.values())
+        return [
+            {key: value for key, value in profile.items() if key not in ("wall", "cpu")}
+            for profile in reversed(profiles)
+        ]
+
+
+profile_store = ProfileStore(max_size=settings.PROFILE_STORE_SIZE)
+
+_active_profiler: ContextVar[Optional[SamplingProfiler]] = ContextVar("active_profiler", default=None)
+
+
+def _run_attached(fn: Callable, *args, **kwargs):
+    profiler = _active_profiler.get()
+    if profiler is None:
+        return fn(*args, **kwargs)
+    thread_id = threading.get_ident()
+    cpu_start = time.thread_time()
+    profiler.attach(thread_id)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        profiler.detach(thread_id, time.thread_time() - cpu_start)
+
+
+async def run_in_thread(fn: Callable, *args, **kwargs):
+    """
+    Run a blocking call in a worker thread so it doesn't stall the event loop
+
+    If the request is being profiled, the worker thread is sampled while it
+    runs the call.
+    """
+    return await asyncio.to_thread(_run_attached, fn, *args, **kwargs)
+
+
+def submit_attached(executor, fn: Callable, *args, **kwargs) -> Future:
+    """
+    Submit a call to an executor under the caller's context
+
+    Tracing spans and stage timings recorded by the call join the request,
+    and if the request is being profiled the worker thread is sampled while
+    it runs the call.
+    """
+    return executor.submit(contextvars.copy_context().run, _run_attached, fn, *args, **kwargs)
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling selected requests
+
+    A request is profiled when it carries X-Profile: 1 together with a valid
+    X-Admin-Key, or when it is picked at PROFILE_SAMPLE_RATE. The profile is
+    stored under the request's X-Request-ID (or a generated ID), returned in
+    the X-Profile-ID response header and served from /admin/profiles/{id}.
+    """
+
+    def __init__(self, app, sample_rate: Optional[float] = None, interval: Optional[float] = None, store: Optional[ProfileStore] = None):
+        self.app = app
+        self.sample_rate = settings.PROFILE_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.interval = settings.PROFILE_INTERVAL_MS / 1000 if interval is None else interval
+        self.store = store if store is not None else profile_store
+
+    def _requested(self, headers: Dict[bytes, bytes]) -> bool:
+        if headers.get(b"x-profile") not in (b"1", b"true"):
+            return False
+        return is_admin_key(headers.get(b"x-admin-key", b"").decode("latin-1"))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        if not sampled and not self._requested(headers):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = headers.get(b"x-request-id", b"").decode("latin-1") or uuid.uuid4().hex
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode("latin-1"))]
+            await send(message)
+
+        profiler = SamplingProfiler(interval=self.interval).start()
+        token = _active_profiler.set(profiler)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _active_profiler.reset(token)
+            profiler.stop()
+            profile = profiler.to_dict()
+            profile.update({
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status["code"],
+                "trigger": "sample" if sampled else "header",
+                "started_at": time.time() - profiler.wall_seconds,
+            })
+            self.store.add(profile_id, profile)
+            logger.info(f"Profiled {scope['method']} {scope['path']} as {profile_id}: {profiler.samples} samples in {profile['duration_ms']:.1f}ms")
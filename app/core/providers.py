@@ -0,0 +1,125 @@
+from functools import lru_cache
+import os
+import logging
+import openai
+import pinecone
+from .config import settings
+from .local_index import LocalIndex
+from .offline import InMemoryIndex, OfflineOpenAI
+from .resilience import CircuitBreaker, ResilientIndex
+
+logger = logging.getLogger(__name__)
+
+# Upstream clients selected by Settings. "offline" and "memory" swap in the
+# local stand-ins from app.core.offline for reproducible benchmarks.
+
+
+def _openai_client() -> openai.OpenAI:
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+    if not openai_api_key:
+        raise ValueError("OPENAI_API_KEY not found in environment variables")
+    # Retries are handled by app.core.upstream (serving) and the ingestion
+    # pipeline, so the client's own hidden retries are turned off
+    return openai.OpenAI(api_key=openai_api_key, max_retries=0)
+
+
+def _offline_client() -> OfflineOpenAI:
+    return OfflineOpenAI(
+        dimensions=settings.OFFLINE_EMBEDDING_DIMENSIONS,
+        embedding_latency=settings.OFFLINE_EMBEDDING_LATENCY_MS / 1000,
+        chat_latency=settings.OFFLINE_CHAT_LATENCY_MS / 1000
+    )
+
+
+@lru_cache()
+def get_embedding_client():
+    """Client used for embeddings.create calls"""
+    if settings.EMBEDDING_PROVIDER == "offline":
+        logger.info("Using offline hashed n-gram embeddings")
+        return _offline_client()
+    return _openai_client()
+
+
+@lru_cache()
+def get_chat_client():
+    """Client used for chat.completions.create calls"""
+    if settings.CHAT_PROVIDER == "offline":
+        logger.info(f"Using offline chat completions with {settings.OFFLINE_CHAT_LATENCY_MS}ms latency")
+        return _offline_client()
+    return _openai_client()
+
+
+@lru_cache()
+def get_vector_index():
+    """Vector index exposing the Pinecone query/fetch/upsert surface"""
+    index = _primary_vector_index()
+    if not settings.VECTOR_RESILIENCE_ENABLED:
+        return index
+    return ResilientIndex(
+        index,
+        fallback_index=_fallback_vector_index(),
+        hedge_delay=settings.VECTOR_HEDGE_DELAY_MS / 1000,
+        hedge_budget=settings.VECTOR_HEDGE_BUDGET,
+        hedge_percentile=settings.VECTOR_HEDGE_PERCENTILE,
+        cache_size=settings.VECTOR_RESULT_CACHE_SIZE,
+        workers=settings.VECTOR_INDEX_WORKERS,
+        breaker=CircuitBreaker(
+            error_rate=settings.VECTOR_BREAKER_ERROR_RATE,
+            slow_call=settings.VECTOR_BREAKER_SLOW_MS / 1000,
+            slow_rate=settings.VECTOR_BREAKER_SLOW_RATE,
+            open_seconds=settings.VECTOR_BREAKER_OPEN_S
+        )
+    )
+
+
+def _local_index() -> LocalIndex:
+    logger.info(f"Using local vector index at {settings.LOCAL_INDEX_PATH}")
+    return LocalIndex(
+        settings.LOCAL_INDEX_PATH,
+        refresh_interval=settings.LOCAL_INDEX_REFRESH_S,
+        rescore_factor=settings.LOCAL_INDEX_RESCORE_FACTOR
+    )
+
+
+def _fallback_vector_index():
+    if settings.VECTOR_FALLBACK_STORE != "local" or settings.VECTOR_STORE == "local":
+        return None
+    try:
+        return _local_index()
+    except FileNotFoundError as e:
+        logger.warning(f"No vector index fallback: {str(e)}")
+        return None
+
+
+def _primary_vector_index():
+    if settings.VECTOR_STORE == "local":
+        return _local_index()
+
+    if settings.VECTOR_STORE == "memory":
+        logger.info("Using in-memory vector index")
+        index = InMemoryIndex(latency=settings.OFFLINE_INDEX_LATENCY_MS / 1000)
+        if settings.OFFLINE_CATALOG_PATH:
+            seed_index(index, settings.OFFLINE_CATALOG_PATH)
+        return index
+
+    api_key = os.getenv("PINECONE_API_KEY")
+    if not api_key:
+        raise ValueError("PINECONE_API_KEY not found in environment variables")
+    index_name = os.getenv("PINECONE_INDEX_NAME", "commerce-agent")
+    logger.info(f"Initializing Pinecone with index: {index_name}")
+    pc = pinecone.Pinecone(api_key=api_key)
+    return pc.Index(index_name)
+
+
+def seed_index(index, catalog_path: str) -> None:
+    """Load a catalog export into an index using the configured embedding client"""
+    from .catalog import CatalogLoader
+    from .ingestion import IngestionPipeline
+
+    stats = IngestionPipeline(
+        get_embedding_client(),
+        index,
+        namespace="products",
+        shard_by_category=settings.CATEGORY_SHARDING
+    ).run(CatalogLoader(catalog_path))
+    logger.info(f"Seeded index from {catalog_path}: {stats.summary()}")
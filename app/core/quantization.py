@@ -0,0 +1,210 @@
+import numpy as np
+
+# Compressed vector codes for the local index. Queries are scored against the
+# codes without decompressing them (asymmetric distance computation: the
+# query stays float32, only the catalog side is quantized), and the best
+# candidates are then re-scored against the full-precision rows on disk.
+#
+#   int8  one signed byte per component, scaled per dimension (4x smaller
+#         than float32)
+#   pq    product quantization: the vector is split into subspaces and each
+#         is replaced by the index of its nearest of 256 centroids, one byte
+#         per subspace (4 * dims / subspaces times smaller)
+
+QUANTIZATION_KINDS = ("none", "int8", "pq")
+
+# Size of the float32 temporaries per block of rows while scoring or
+# encoding; blocks that stay in cache score codes about as fast as a
+# float32 matrix product
+SCORE_BLOCK_BYTES = 1 << 20
+
+# Rows sampled to train product quantization centroids
+PQ_TRAINING_SAMPLE = 25_000
+PQ_CENTROIDS = 256
+
+
+def _block_rows(row_floats: int) -> int:
+    return max(256, SCORE_BLOCK_BYTES // (4 * row_floats))
+
+
+class ScalarQuantizer:
+    """
+    Per-dimension int8 quantization
+
+    Each component is mapped linearly from its [min, max] range over the
+    catalog onto [-128, 127].
+
+    Args:
+        offset: Per-dimension value that code -128 decodes to
+        scale: Per-dimension step between consecutive codes
+    """
+
+    kind = "int8"
+
+    def __init__(self, offset: np.ndarray, scale: np.ndarray):
+        self.offset = np.asarray(offset, dtype=np.float32)
+        self.scale = np.asarray(scale, dtype=np.float32)
+
+    @classmethod
+    def fit(cls, matrix: np.ndarray) -> "ScalarQuantizer":
+        low = matrix.min(axis=0).astype(np.float32)
+        high = matrix.max(axis=0).astype(np.float32)
+        scale = (high - low) / 255
+        scale[scale == 0] = 1.0
+        return cls(low, scale)
+
+    def encode(self, matrix: np.ndarray) -> np.ndarray:
+        codes = np.rint((np.asarray(matrix, dtype=np.float32) - self.offset) / self.scale) - 128
+        return np.clip(codes, -128, 127).astype(np.int8)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return (codes.astype(np.float32) + 128) * self.scale + self.offset
+
+    def scores(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        # q . decode(c) = (q * scale) . c + q . (128 * scale + offset)
+        weights = query * self.scale
+        bias = float(query @ (128 * self.scale + self.offset))
+        scores = np.empty(len(codes), dtype=np.float32)
+        step = _block_rows(len(weights))
+        for start in range(0, len(codes), step):
+            block = codes[start:start + step]
+            scores[start:start + len(block)] = block.astype(np.float32) @ weights + bias
+        return scores
+
+    def save(self, path: str) -> None:
+        np.savez(path, kind=self.kind, offset=self.offset, scale=self.scale)
+
+
+class ProductQuantizer:
+    """
+    Product quantization with 256 centroids per subspace
+
+    Args:
+        centroids: Array of shape (subspaces, centroids, dims / subspaces)
+    """
+
+    kind = "pq"
+
+    def __init__(self, centroids: np.ndarray):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.subspaces, _, self.width = self.centroids.shape
+
+    @classmethod
+    def fit(cls, matrix: np.ndarray, subspaces: int, iterations: int = 10, seed: int = 0) -> "ProductQuantizer":
+        """
+        Train centroids with k-means in each subspace
+
+        Args:
+            matrix: Rows to quantize; a sample of them is used for training
+            subspaces: Number of subspaces; must divide the dimensionality
+            iterations: k-means iterations per subspace
+            seed: Seed for sampling and centroid initialization
+        """
+        rows, dims = matrix.shape
+        if dims % subspaces:
+            raise ValueError(f"{subspaces} subspaces do not divide {dims} dimensions")
+        rng = np.random.default_rng(seed)
+        sample = np.asarray(matrix, dtype=np.float32)
+        if rows > PQ_TRAINING_SAMPLE:
+            sample = sample[np.sort(rng.choice(rows, PQ_TRAINING_SAMPLE, replace=False))]
+        k = min(PQ_CENTROIDS, len(sample))
+        width = dims // subspaces
+
+        centroids = np.zeros((subspaces, PQ_CENTROIDS, width), dtype=np.float32)
+        for s in range(subspaces):
+            part = sample[:, s * width:(s + 1) * width]
+            centers = part[rng.choice(len(part), k, replace=False)].copy()
+            for _ in range(iterations):
+                assignment = _nearest(part, centers)
+                counts = np.bincount(assignment, minlength=k)
+                sums = np.stack(
+                    [np.bincount(assignment, weights=part[:, j], minlength=k) for j in range(width)],
+                    axis=1
+                )
+                filled = counts > 0
+                centers[filled] = sums[filled] / counts[filled, None]
+            centroids[s, :k] = centers
+            # Unused slots repeat the first centroid so no code decodes to zeros
+            centroids[s, k:] = centers[0]
+        return cls(centroids)
+
+    def encode(self, matrix: np.ndarray) -> np.ndarray:
+        matrix = np.asarray(matrix, dtype=np.float32)
+        codes = np.empty((len(matrix), self.subspaces), dtype=np.uint8)
+        # Distances to every centroid take PQ_CENTROIDS floats per row
+        step = _block_rows(PQ_CENTROIDS)
+        for start in range(0, len(matrix), step):
+            block = matrix[start:start + step]
+            for s in range(self.subspaces):
+                codes[start:start + len(block), s] = _nearest(block[:, s * self.width:(s + 1) * self.width], self.centroids[s])
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        parts = [self.centroids[s][codes[:, s]] for s in range(self.subspaces)]
+        return np.concatenate(parts, axis=1)
+
+    def scores(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        # Inner products of each query subvector with every centroid, looked
+        # up by code and summed over subspaces
+        table = np.einsum("skw,sw->sk", self.centroids, query.reshape(self.subspaces, self.width))
+        flat = table.ravel()
+        base = np.arange(self.subspaces, dtype=np.intp) * PQ_CENTROIDS
+        scores = np.empty(len(codes), dtype=np.float32)
+        step = _block_rows(self.subspaces)
+        for start in range(0, len(codes), step):
+            block = codes[start:start + step]
+            scores[start:start + len(block)] = flat[block.astype(np.intp) + base].sum(axis=1)
+        return scores
+
+    def save(self, path: str) -> None:
+        np.savez(path, kind=self.kind, centroids=self.centroids)
+
+
+def _nearest(points: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    """Index of the nearest center (squared Euclidean) for each point"""
+    distances = (centers * centers).sum(axis=1) - 2 * points @ centers.T
+    return distances.argmin(axis=1)
+
+
+def pq_subspaces(dims: int, requested: int = 0) -> int:
+    """
+    Subspace count for product quantization
+
+    Args:
+        dims: Vector dimensionality
+        requested: Desired count; 0 picks dims / 4 (16x smaller than float32)
+
+    Returns:
+        The largest count not above the request that divides dims
+    """
+    subspaces = min(dims, requested or max(1, dims // 4))
+    while dims % subspaces:
+        subspaces -= 1
+    return subspaces
+
+
+def train_quantizer(kind: str, matrix: np.ndarray, subspaces: int = 0):
+    """
+    Fit a quantizer of the given kind to unit-normalized rows
+
+    Returns:
+        The quantizer, or None for "none"
+    """
+    if kind not in QUANTIZATION_KINDS:
+        raise ValueError(f"Unknown quantization {kind!r}; expected one of {', '.join(QUANTIZATION_KINDS)}")
+    if kind == "int8":
+        return ScalarQuantizer.fit(matrix)
+    if kind == "pq":
+        return ProductQuantizer.fit(matrix, pq_subspaces(matrix.shape[1], subspaces))
+    return None
+
+
+def load_quantizer(path: str):
+    """Load a quantizer written by save()"""
+    with np.load(path) as data:
+        kind = str(data["kind"])
+        if kind == "int8":
+            return ScalarQuantizer(data["offset"], data["scale"])
+        if kind == "pq":
+            return ProductQuantizer(data["centroids"])
+    raise ValueError(f"Unknown quantizer kind {kind!r} in {path}")
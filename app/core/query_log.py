@@ -0,0 +1,135 @@
+from typing import List, Optional, Tuple
+from collections import Counter
+import fcntl
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Frequency counts of normalized search queries, used to warm caches after
+# a deploy. Only the query text and category are kept, never client
+# details, and queries that look like they carry personal data (emails,
+# long digit runs such as phone or order numbers) are not recorded at all.
+#
+# Each worker counts in memory and periodically adds its counts to a shared
+# JSON file under an exclusive lock, so several workers can share one log.
+
+EMAIL_PATTERN = re.compile(r"[^\s@]+@[^\s@]+\.[a-z]{2,}")
+LONG_NUMBER_PATTERN = re.compile(r"\d[\d\s-]{5,}\d")
+MAX_QUERY_LENGTH = 200
+
+
+def normalize_query(text: str) -> str:
+    """Lowercase and collapse whitespace, so trivially different queries share counts and cache entries"""
+    return " ".join(text.lower().split())
+
+
+def anonymize_query(text: str) -> Optional[str]:
+    """
+    Normalized query safe to store, or None when it shouldn't be recorded
+
+    Queries with email addresses or long digit runs, and very long ones
+    (often pasted text), are dropped rather than redacted.
+    """
+    query = normalize_query(text)
+    if not query or len(query) > MAX_QUERY_LENGTH:
+        return None
+    if EMAIL_PATTERN.search(query) or LONG_NUMBER_PATTERN.search(query):
+        return None
+    return query
+
+
+class QueryLog:
+    """
+    Counts of anonymized search queries, persisted to a shared file
+
+    Args:
+        path: JSON file holding the counts
+        max_entries: Distinct queries kept; the least frequent are dropped
+        flush_interval: Seconds between writes of pending counts
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000, flush_interval: float = 30.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self._pending: Counter = Counter()
+        self._lock = threading.Lock()
+        self._flushed = time.monotonic()
+
+    @staticmethod
+    def _key(query: str, category: Optional[str]) -> str:
+        return json.dumps([query, category], separators=(",", ":"))
+
+    def record(self, query: str, category: Optional[str] = None) -> bool:
+        """
+        Count a search
+
+        Returns:
+            Whether the query was recorded
+        """
+        normalized = anonymize_query(query)
+        if normalized is None:
+            return False
+        with self._lock:
+            self._pending[self._key(normalized, category)] += 1
+            due = time.monotonic() - self._flushed >= self.flush_interval
+            if due:
+                self._flushed = time.monotonic()
+        if due:
+            # Off the request path; record may be called from the event loop
+            threading.Thread(target=self.flush, name="query-log-flush", daemon=True).start()
+        return True
+
+    def _read(self) -> Counter:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return Counter(json.load(f).get("queries", {}))
+        except FileNotFoundError:
+            return Counter()
+        except (OSError, ValueError) as e:
+            logger.error(f"Error reading query log {self.path}: {str(e)}")
+            return Counter()
+
+    def flush(self) -> None:
+        """Add pending counts to the file"""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._flushed = time.monotonic()
+        if not pending:
+            return
+        try:
+            directory = os.path.dirname(self.path) or "."
+            os.makedirs(directory, exist_ok=True)
+            with open(f"{self.path}.lock", "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                counts = self._read()
+                counts.update(pending)
+                if len(counts) > self.max_entries:
+                    counts = Counter(dict(counts.most_common(self.max_entries)))
+                tmp = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump({"updated_at": time.time(), "queries": counts}, f, separators=(",", ":"))
+                os.replace(tmp, self.path)
+        except OSError as e:
+            logger.error(f"Error writing query log {self.path}: {str(e)}")
+
+    def top(self, n: int) -> List[Tuple[str, Optional[str], int]]:
+        """
+        Most frequent queries, including counts not yet flushed
+
+        Returns:
+            (query, category, count) tuples, most frequent first
+        """
+        counts = self._read()
+        with self._lock:
+            counts.update(self._pending)
+        top = []
+        for key, count in counts.most_common(n):
+            query, category = json.loads(key)
+            top.append((query, category, count))
+        return top
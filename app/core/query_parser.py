@@ -0,0 +1,170 @@
+from typing import Dict, Iterable, List, Optional, Set
+import re
+from .catalog import VALID_CATEGORIES
+
+# Rule- and lexicon-based query understanding. Category, price bounds and
+# brand are read from the query text with precompiled regular expressions,
+# so parsing costs microseconds and needs no model call. Filters the client
+# sets explicitly always take precedence over inferred ones.
+
+# Product nouns naming a category outright
+CATEGORY_TERMS = {
+    "laptops": ["laptop", "laptops", "notebook", "notebooks", "ultrabook", "ultrabooks", "macbook", "chromebook"],
+    "smartphones": ["smartphone", "smartphones", "phone", "phones", "iphone", "cellphone", "mobile phone"],
+    "tablets": ["tablet", "tablets", "ipad", "ipads"],
+    "audio": ["headphones", "headphone", "earbuds", "earphones", "headset", "headsets", "airpods", "speaker", "speakers"],
+}
+
+# Amounts like $1,500, 1500, 1.5k or 2k. A trailing unit other than a
+# currency (8 hours, 16gb, 2kg, 6.5 inches) means the number is not a price.
+_UNITS = r"hours?|hrs?|h|gb|tb|mb|kg|g|lbs?|oz|mah|hz|inch(?:es)?|in|mp|w|mm|cm|x|%|\"|'"
+_AMOUNT = (
+    r"\$?\s?(\d{1,3}(?:,\d{3})+|\d+(?:\.\d+)?)(k)?(?:\s?(?:dollars|usd|bucks))?"
+    r"(?![\w.])(?!\s?(?:" + _UNITS + r")(?![a-z]))"
+)
+_MAX_WORDS = r"under|below|less than|cheaper than|up to|at most|max(?:imum)?|no more than|within|<=?"
+_MIN_WORDS = r"over|above|more than|at least|min(?:imum)?|starting at|>=?"
+_AROUND_WORDS = r"around|about|approximately|roughly|~"
+
+RANGE_PATTERN = re.compile(r"(?:between\s+)?" + _AMOUNT + r"\s*(?:-|to|and)\s*" + _AMOUNT)
+MAX_PATTERN = re.compile(r"(?<!\w)(" + _MAX_WORDS + r")\s*" + _AMOUNT)
+MIN_PATTERN = re.compile(r"(?<!\w)(" + _MIN_WORDS + r")\s*" + _AMOUNT)
+AROUND_PATTERN = re.compile(r"(?<!\w)(" + _AROUND_WORDS + r")\s*" + _AMOUNT)
+
+# Bare max/min are also product names ("iphone pro max 256"), so they only
+# introduce a price with a currency marker or an amount of at least 1000
+_BARE_WORDS = {"max", "maximum", "min", "minimum"}
+_CURRENCY_PATTERN = re.compile(r"\$|dollars|usd|bucks")
+
+# Relative tolerance for "around $800"
+AROUND_TOLERANCE = 0.15
+
+
+def _amount(number: str, thousands: Optional[str]) -> float:
+    value = float(number.replace(",", ""))
+    return value * 1000 if thousands else value
+
+
+def _term_pattern(terms: Iterable[str]) -> Optional[re.Pattern]:
+    terms = sorted({term.lower() for term in terms if term}, key=len, reverse=True)
+    if not terms:
+        return None
+    return re.compile(r"\b(" + "|".join(re.escape(term) for term in terms) + r")\b")
+
+
+class ParsedQuery:
+    """Filters read from a query, plus the text left for retrieval"""
+
+    def __init__(
+        self,
+        text: str,
+        category: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        brands: Optional[List[str]] = None
+    ):
+        self.text = text
+        self.category = category
+        self.min_price = min_price
+        self.max_price = max_price
+        self.brands = brands or []
+
+    def __bool__(self) -> bool:
+        return any((self.category, self.min_price is not None, self.max_price is not None, self.brands))
+
+    def __repr__(self) -> str:
+        return (
+            f"ParsedQuery(text={self.text!r}, category={self.category!r}, "
+            f"min_price={self.min_price!r}, max_price={self.max_price!r}, brands={self.brands!r})"
+        )
+
+
+class QueryParser:
+    """
+    Infer category, price bounds and brands from natural-language queries
+
+    Args:
+        feature_mapping: Per-category feature keywords, as in HybridSearch;
+            a keyword used by only one category implies that category when
+            the query names no product type
+        brands: Brand names from the catalog
+    """
+
+    def __init__(self, feature_mapping: Optional[Dict[str, Dict[str, List[str]]]] = None, brands: Iterable[str] = ()):
+        self.category_terms = {}
+        for category, terms in CATEGORY_TERMS.items():
+            for term in [category, *terms]:
+                self.category_terms[term] = category
+        self.category_pattern = _term_pattern(self.category_terms)
+
+        # Feature keywords that only one category uses
+        owners: Dict[str, Set[str]] = {}
+        for category, features in (feature_mapping or {}).items():
+            for keywords in features.values():
+                for keyword in keywords:
+                    owners.setdefault(keyword.lower(), set()).add(category)
+        self.feature_terms = {
+            keyword: categories.pop()
+            for keyword, categories in owners.items()
+            if len(categories) == 1 and keyword not in self.category_terms
+        }
+        self.feature_pattern = _term_pattern(self.feature_terms)
+
+        self.brands = {brand.lower(): brand for brand in brands if brand}
+        self.brand_pattern = _term_pattern(self.brands)
+
+    def parse(self, query: str) -> ParsedQuery:
+        """
+        Parse a query
+
+        Args:
+            query: Natural language search query
+
+        Returns:
+            Inferred filters, and the query with price phrases removed
+        """
+        lowered = query.lower()
+        parsed = ParsedQuery(query)
+
+        categories = {self.category_terms[m] for m in self.category_pattern.findall(lowered)}
+        if not categories and self.feature_pattern is not None:
+            categories = {self.feature_terms[m] for m in self.feature_pattern.findall(lowered)}
+        # Several product types ("laptop or tablet") leave the category open
+        if len(categories) == 1 and categories.issubset(VALID_CATEGORIES):
+            parsed.category = categories.pop()
+
+        if self.brand_pattern is not None:
+            for match in self.brand_pattern.findall(lowered):
+                brand = self.brands[match]
+                if brand not in parsed.brands:
+                    parsed.brands.append(brand)
+
+        spans = []
+        match = RANGE_PATTERN.search(lowered)
+        if match and ("$" in match.group(0) or "between" in match.group(0)):
+            low, high = _amount(match.group(1), match.group(2)), _amount(match.group(3), match.group(4))
+            parsed.min_price, parsed.max_price = min(low, high), max(low, high)
+            spans.append(match.span())
+        else:
+            for pattern in (MAX_PATTERN, MIN_PATTERN, AROUND_PATTERN):
+                match = pattern.search(lowered)
+                if not match:
+                    continue
+                value = _amount(match.group(2), match.group(3))
+                if match.group(1) in _BARE_WORDS and value < 1000 and not _CURRENCY_PATTERN.search(match.group(0)):
+                    continue
+                if pattern is MAX_PATTERN:
+                    parsed.max_price = value
+                elif pattern is MIN_PATTERN:
+                    parsed.min_price = value
+                else:
+                    parsed.min_price = value * (1 - AROUND_TOLERANCE)
+                    parsed.max_price = value * (1 + AROUND_TOLERANCE)
+                spans.append(match.span())
+
+        if spans:
+            text = query
+            for start, end in sorted(spans, reverse=True):
+                text = text[:start] + text[end:]
+            parsed.text = " ".join(text.split()) or query
+        return parsed
@@ -0,0 +1,176 @@
+from typing import Dict, Iterable, Optional, Tuple
+from collections import OrderedDict
+import json
+import logging
+import math
+import time
+from .config import settings
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Per-client token buckets plus a global cap on in-flight expensive requests.
+# Both run in the ASGI middleware on the event loop thread, so plain dicts and
+# counters are safe without locks.
+
+# Paths that are never limited, so probes and scrapes keep working under overload
+EXEMPT_PATHS = ("/", "/health", "/ready", "/metrics", "/docs", "/openapi.json")
+
+# Admin requests draw from their own, stricter buckets keyed by IP alone, so
+# admin keys can't be guessed at the API rate and admin work isn't starved by
+# a client's API traffic
+ADMIN_PREFIX = "/admin"
+
+REQUESTS_REJECTED = registry.counter(
+    "http_requests_rejected_total",
+    "Requests shed by rate limiting or admission control",
+    ["reason"]
+)
+
+
+class RateLimiter:
+    """
+    Token buckets keyed by client identity
+
+    Each client may burst up to `burst` requests, refilled at
+    `per_minute` / 60 tokens per second. Only the most recently seen
+    `max_clients` buckets are kept; an evicted client starts full again.
+    """
+
+    def __init__(self, per_minute: float, burst: int, max_clients: int = 10000):
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def acquire(self, key: str, now: Optional[float] = None) -> Tuple[bool, float]:
+        """
+        Take one token from the client's bucket
+
+        Returns:
+            Whether the request is allowed, and seconds until a token is available
+        """
+        now = time.monotonic() if now is None else now
+        tokens, updated = self._buckets.pop(key, (float(self.burst), now))
+        tokens = min(float(self.burst), tokens + (now - updated) * self.rate)
+        allowed = tokens >= 1.0
+        if allowed:
+            tokens -= 1.0
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        retry_after = 0.0 if allowed else (1.0 - tokens) / self.rate
+        return allowed, retry_after
+
+
+class AdmissionController:
+    """Caps concurrent requests on expensive paths; excess requests are shed"""
+
+    def __init__(self, max_in_flight: int, paths: Iterable[str]):
+        self.max_in_flight = max_in_flight
+        self.paths = tuple(paths)
+        self.in_flight = 0
+
+    def applies_to(self, path: str) -> bool:
+        return any(path.startswith(prefix) for prefix in self.paths)
+
+    def try_admit(self) -> bool:
+        if self.in_flight >= self.max_in_flight:
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self) -> None:
+        self.in_flight -= 1
+
+
+def _client_key(scope, headers: Dict[bytes, bytes]) -> str:
+    # Clients are identified by API key and IP together. Unknown keys are
+    # ignored so rotating made-up keys can't mint fresh buckets. Behind a
+    # proxy, run uvicorn with --proxy-headers so scope["client"] is the real client.
+    api_key = headers.get(b"x-api-key", b"").decode("latin-1")
+    if api_key != settings.API_KEY:
+        api_key = ""
+    client = scope.get("client")
+    return f"{api_key}@{client[0] if client else 'unknown'}"
+
+
+async def _reject(send, status: int, detail: str, retry_after: float) -> None:
+    body = json.dumps({"detail": detail}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("latin-1")),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode("latin-1")),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware enforcing per-client rate limits and admission control
+
+    Clients over RATE_LIMIT_PER_MINUTE get 429; requests to expensive paths
+    beyond ADMISSION_MAX_IN_FLIGHT get 503. Both carry Retry-After. Admin
+    requests are limited separately at ADMIN_RATE_LIMIT_PER_MINUTE per IP.
+    """
+
+    def __init__(
+        self,
+        app,
+        limiter: Optional[RateLimiter] = None,
+        admission: Optional[AdmissionController] = None,
+        enabled: Optional[bool] = None,
+        admin_limiter: Optional[RateLimiter] = None
+    ):
+        self.app = app
+        self.enabled = settings.RATE_LIMIT_ENABLED if enabled is None else enabled
+        self.limiter = limiter or RateLimiter(settings.RATE_LIMIT_PER_MINUTE, settings.RATE_LIMIT_BURST)
+        self.admin_limiter = admin_limiter or RateLimiter(
+            settings.ADMIN_RATE_LIMIT_PER_MINUTE,
+            settings.ADMIN_RATE_LIMIT_BURST,
+            max_clients=1000
+        )
+        self.admission = admission or AdmissionController(
+            settings.ADMISSION_MAX_IN_FLIGHT,
+            [path.strip() for path in settings.ADMISSION_PATHS.split(",") if path.strip()]
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        if path in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        if path.startswith(ADMIN_PREFIX):
+            client = scope.get("client")
+            allowed, retry_after = self.admin_limiter.acquire(client[0] if client else "unknown")
+        else:
+            allowed, retry_after = self.limiter.acquire(_client_key(scope, dict(scope["headers"])))
+        if not allowed:
+            if registry.enabled:
+                REQUESTS_REJECTED.labels("rate_limit").inc()
+            await _reject(send, 429, "Rate limit exceeded", retry_after)
+            return
+
+        if not self.admission.applies_to(path):
+            await self.app(scope, receive, send)
+            return
+
+        if not self.admission.try_admit():
+            if registry.enabled:
+                REQUESTS_REJECTED.labels("overload").inc()
+            logger.warning(f"Shedding {path}: {self.admission.in_flight} expensive requests in flight")
+            await _reject(send, 503, "Server is busy, retry later", settings.ADMISSION_RETRY_AFTER_S)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.admission.release()
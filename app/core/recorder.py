@@ -0,0 +1,187 @@
+from typing import Dict, List, Optional
+import atexit
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import shutil
+import time
+from .config import settings
+from .metrics import request_stats, route_path
+
+logger = logging.getLogger(__name__)
+
+# Opt-in traffic capture for reproducing performance problems offline. Each
+# request is written as one JSON line: its shape (method, path, query string,
+# JSON body, the headers that change how it is served), status, latency,
+# response size, per-stage search durations and cache outcomes. Lines are
+# handed to a background thread, and each worker process writes its own
+# size-rotated file, with rotated files gzipped. scripts/replay.py
+# re-issues a capture against the app.
+#
+# Captures contain query text, so they are as sensitive as access logs.
+# Credentials, client addresses and other headers are never written.
+
+# Request headers that affect how a response is produced
+CAPTURED_HEADERS = ("accept", "accept-encoding", "content-type", "if-none-match")
+
+# Probes and operator endpoints are not traffic worth replaying
+EXCLUDED_PREFIXES = ("/health", "/ready", "/metrics", "/admin", "/docs", "/openapi.json")
+
+
+def _gzip_rotator(source: str, dest: str) -> None:
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+class _CaptureWriter:
+    """Queue-backed rotating writer, created per process so forked workers don't share a file"""
+
+    def __init__(self, directory: str, max_bytes: int, backups: int):
+        os.makedirs(directory, exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(
+            os.path.join(directory, f"requests-{os.getpid()}.jsonl"),
+            maxBytes=max_bytes,
+            backupCount=backups,
+            encoding="utf-8"
+        )
+        handler.namer = lambda name: name + ".gz"
+        handler.rotator = _gzip_rotator
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self.queue: "queue.Queue" = queue.Queue(maxsize=10000)
+        self.listener = logging.handlers.QueueListener(self.queue, handler)
+        self.listener.start()
+        self.dropped = 0
+        # Write out queued lines on shutdown
+        atexit.register(self.close)
+
+    def write(self, record: Dict) -> None:
+        line = json.dumps(record, separators=(",", ":"), default=str)
+        try:
+            self.queue.put_nowait(logging.makeLogRecord({"msg": line}))
+        except queue.Full:
+            # Never slow requests down to keep up with the disk
+            self.dropped += 1
+
+    def close(self) -> None:
+        if self.listener._thread is not None:
+            self.listener.stop()
+
+
+class RecorderMiddleware:
+    """
+    ASGI middleware capturing request shape, timing, stages and cache outcomes
+
+    Args:
+        app: ASGI app to wrap
+        enabled: Capture requests; RECORDER_ENABLED by default
+        directory: Where capture files are written; RECORDER_DIR by default
+        sample_rate: Fraction of requests captured
+        max_body_bytes: Larger bodies (e.g. uploaded images) are not stored,
+            and those requests are marked as not replayable
+    """
+
+    def __init__(
+        self,
+        app,
+        enabled: Optional[bool] = None,
+        directory: Optional[str] = None,
+        sample_rate: Optional[float] = None,
+        max_body_bytes: Optional[int] = None
+    ):
+        self.app = app
+        self.enabled = settings.RECORDER_ENABLED if enabled is None else enabled
+        self.directory = directory or settings.RECORDER_DIR
+        self.sample_rate = settings.RECORDER_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.max_body_bytes = settings.RECORDER_MAX_BODY_BYTES if max_body_bytes is None else max_body_bytes
+        self._writer: Optional[_CaptureWriter] = None
+        self._pid: Optional[int] = None
+
+    def writer(self) -> _CaptureWriter:
+        if self._pid != os.getpid():
+            self._writer = _CaptureWriter(self.directory, settings.RECORDER_MAX_BYTES, settings.RECORDER_BACKUPS)
+            self._pid = os.getpid()
+            logger.info(f"Recording requests to {self.directory}")
+        return self._writer
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not self.enabled
+            or scope["path"].startswith(EXCLUDED_PREFIXES)
+            or (self.sample_rate < 1.0 and random.random() >= self.sample_rate)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        chunks: List[bytes] = []
+        body_size = 0
+        response = {"status": 500, "bytes": 0}
+
+        async def receive_wrapper():
+            nonlocal body_size
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                body_size += len(chunk)
+                if body_size <= self.max_body_bytes:
+                    chunks.append(chunk)
+            return message
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        stats = {"stages": {}, "cache": {}}
+        token = request_stats.set(stats)
+        started_at = time.time()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            request_stats.reset(token)
+            self.writer().write(self._record(scope, chunks, body_size, response, stats, started_at, elapsed_ms))
+
+    def _record(self, scope, chunks, body_size, response, stats, started_at, elapsed_ms) -> Dict:
+        headers = {}
+        for name, value in scope.get("headers", []):
+            name = name.decode("latin-1").lower()
+            if name in CAPTURED_HEADERS:
+                headers[name] = value.decode("latin-1")
+
+        record = {
+            "ts": round(started_at, 6),
+            "method": scope["method"],
+            "path": scope["path"],
+            "route": route_path(scope),
+            "status": response["status"],
+            "ms": round(elapsed_ms, 3),
+            "bytes": response["bytes"],
+        }
+        if scope.get("query_string"):
+            record["query"] = scope["query_string"].decode("latin-1")
+        if headers:
+            record["headers"] = headers
+        if body_size:
+            record["body_bytes"] = body_size
+            if body_size > self.max_body_bytes:
+                record["replayable"] = False
+            else:
+                body = b"".join(chunks)
+                try:
+                    record["body"] = json.loads(body)
+                except ValueError:
+                    record["replayable"] = False
+        if stats["stages"]:
+            record["stages"] = {stage: round(ms, 3) for stage, ms in stats["stages"].items()}
+        if stats["cache"]:
+            record["cache"] = stats["cache"]
+        return record
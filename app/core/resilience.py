@@ -0,0 +1,345 @@
+from typing import Callable, Dict, List, Optional, Tuple
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from contextvars import ContextVar
+import json
+import logging
+import threading
+import time
+from .metrics import registry
+from .profiling import submit_attached
+from .stats import percentile
+from .upstream import UpstreamUnavailable, remaining_time
+
+logger = logging.getLogger(__name__)
+
+# Tail-latency and outage protection for the vector index. Queries and
+# fetches are hedged: if the first attempt hasn't answered by about the
+# observed p95, a duplicate is sent and the first answer wins. Hedges spend
+# from a budget earned as a fraction of calls, so they add at most that
+# fraction of extra load. A circuit breaker trips on sustained errors or
+# slow calls and serves cached results or a fallback index until a probe
+# call succeeds. Callers can tell a degraded answer apart with
+# track_fallbacks, e.g. to keep it out of HTTP caches.
+
+VECTOR_HEDGES = registry.counter(
+    "vector_index_hedges_total",
+    "Hedged vector index calls by whether the hedge answered first",
+    ["operation", "outcome"]
+)
+VECTOR_FALLBACKS = registry.counter(
+    "vector_index_fallbacks_total",
+    "Vector index calls served from a fallback",
+    ["operation", "source"]
+)
+CIRCUIT_STATE = registry.gauge(
+    "vector_index_circuit_open",
+    "1 while the vector index circuit breaker is open"
+)
+
+_fallbacks: ContextVar[Optional[List[str]]] = ContextVar("vector_fallbacks", default=None)
+
+
+@contextmanager
+def track_fallbacks():
+    """
+    Collect the fallback sources ("cache" or "index") that served vector
+    index calls made within the block
+
+    Calls from worker threads count too, as long as they run under a copy
+    of the block's context (run_in_thread, submit_attached).
+    """
+    served: List[str] = []
+    token = _fallbacks.set(served)
+    try:
+        yield served
+    finally:
+        _fallbacks.reset(token)
+
+
+class LatencyTracker:
+    """Rolling window of recent call latencies"""
+
+    def __init__(self, window: int = 200):
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float) -> None:
+        with self._lock:
+            self._latencies.append(latency)
+
+    def percentile(self, pct: float, min_samples: int = 20) -> Optional[float]:
+        with self._lock:
+            if len(self._latencies) < min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        return percentile(ordered, pct)
+
+
+class HedgeBudget:
+    """Each call earns `ratio` hedge tokens (up to `burst`); a hedge spends one"""
+
+    def __init__(self, ratio: float, burst: float = 10.0):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = 0.0
+        self._lock = threading.Lock()
+
+    def earn(self) -> None:
+        with self._lock:
+            self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def spend(self) -> bool:
+        with self._lock:
+            if self.tokens < 1.0:
+                return False
+            self.tokens -= 1.0
+            return True
+
+
+class CircuitBreaker:
+    """
+    Closed/open/half-open breaker over a rolling window of call outcomes
+
+    Trips once the window holds at least `min_calls` outcomes and either the
+    error rate reaches `error_rate` or the share of calls slower than
+    `slow_call` seconds reaches `slow_rate`. After `open_seconds` one probe
+    call is let through; its outcome closes or re-opens the breaker.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(
+        self,
+        window: int = 50,
+        min_calls: int = 20,
+        error_rate: float = 0.5,
+        slow_call: float = 1.0,
+        slow_rate: float = 0.8,
+        open_seconds: float = 30.0
+    ):
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call = slow_call
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.state = self.CLOSED
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may go to the primary"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record(self, success: bool, latency: float) -> None:
+        with self._lock:
+            slow = latency >= self.slow_call
+            if self.state == self.HALF_OPEN and self._probing:
+                self._probing = False
+                if success and not slow:
+                    self._close()
+                else:
+                    self._open()
+                return
+            self._outcomes.append((success, slow))
+            if self.state == self.CLOSED and len(self._outcomes) >= self.min_calls:
+                errors = sum(1 for ok, _ in self._outcomes if not ok) / len(self._outcomes)
+                slow_calls = sum(1 for _, is_slow in self._outcomes if is_slow) / len(self._outcomes)
+                if errors >= self.error_rate or slow_calls >= self.slow_rate:
+                    logger.warning(f"Vector index circuit opened: {errors:.0%} errors, {slow_calls:.0%} slow calls")
+                    self._open()
+
+    def _open(self) -> None:
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        if registry.enabled:
+            CIRCUIT_STATE.labels().set(1)
+
+    def _close(self) -> None:
+        logger.info("Vector index circuit closed")
+        self.state = self.CLOSED
+        self._outcomes.clear()
+        if registry.enabled:
+            CIRCUIT_STATE.labels().set(0)
+
+
+class _ResultCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items: "OrderedDict[Tuple, object]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key: Tuple, value) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+
+def _query_key(kwargs: Dict) -> Tuple:
+    vector = kwargs.get("vector")
+    return (
+        "query",
+        # Hashed rather than stored, so cached keys stay small
+        hash(tuple(vector)) if vector is not None else kwargs.get("id"),
+        kwargs.get("top_k"),
+        kwargs.get("namespace", ""),
+        json.dumps(kwargs.get("filter"), sort_keys=True, default=str),
+        bool(kwargs.get("include_metadata")),
+        bool(kwargs.get("include_values")),
+    )
+
+
+class ResilientIndex:
+    """
+    Vector index wrapper adding hedging, a circuit breaker and fallbacks
+
+    query and fetch are protected; other methods (upsert, update, stats)
+    pass straight through to the wrapped index.
+
+    Args:
+        index: Primary index (Pinecone or a stand-in)
+        fallback_index: Index to query while the primary is unavailable
+        hedge_delay: Hedge delay in seconds until enough latencies are observed
+        hedge_budget: Extra load allowed for hedges, as a fraction of calls
+        hedge_percentile: Latency percentile used as the hedge delay
+        cache_size: Recent results kept for serving during outages
+        workers: Threads issuing primary and hedged calls
+        breaker: Circuit breaker; defaults to CircuitBreaker()
+    """
+
+    def __init__(
+        self,
+        index,
+        fallback_index=None,
+        hedge_delay: float = 0.1,
+        hedge_budget: float = 0.05,
+        hedge_percentile: float = 95.0,
+        cache_size: int = 1024,
+        workers: int = 16,
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        self.index = index
+        self.fallback_index = fallback_index
+        self.default_hedge_delay = hedge_delay
+        self.hedge_percentile = hedge_percentile
+        self.budget = HedgeBudget(hedge_budget)
+        self.breaker = breaker or CircuitBreaker()
+        self.latencies = {"query": LatencyTracker(), "fetch": LatencyTracker()}
+        self.cache = _ResultCache(cache_size)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="vector-index")
+
+    def __getattr__(self, name):
+        return getattr(self.index, name)
+
+    def hedge_delay(self, operation: str) -> float:
+        observed = self.latencies[operation].percentile(self.hedge_percentile)
+        return observed if observed is not None else self.default_hedge_delay
+
+    def _attempt(self, operation: str, fn: Callable) -> Future:
+        start = time.monotonic()
+        # Under the request's context, so its trace and profile cover the worker
+        future = submit_attached(self.executor, fn)
+        future.add_done_callback(
+            lambda f: f.exception() is None and self.latencies[operation].record(time.monotonic() - start)
+        )
+        return future
+
+    def _hedged(self, operation: str, fn: Callable):
+        self.budget.earn()
+        primary = self._attempt(operation, fn)
+        pending = {primary}
+        remaining = remaining_time()
+        delay = self.hedge_delay(operation)
+        if remaining is not None:
+            delay = min(delay, max(0.0, remaining))
+
+        done, _ = wait(pending, timeout=delay)
+        hedge = None
+        if not done and self.budget.spend():
+            hedge = self._attempt(operation, fn)
+            pending.add(hedge)
+
+        error = None
+        while pending:
+            remaining = remaining_time()
+            done, pending = wait(pending, timeout=max(0.0, remaining) if remaining is not None else None, return_when=FIRST_COMPLETED)
+            if not done:
+                raise UpstreamUnavailable(f"Vector index {operation} did not answer before the request deadline")
+            for future in done:
+                if future.exception() is None:
+                    if hedge is not None and registry.enabled:
+                        VECTOR_HEDGES.labels(operation, "won" if future is hedge else "lost").inc()
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _call(self, operation: str, key: Tuple, fn: Callable, fallback: Callable):
+        if not self.breaker.allow():
+            return self._fallback(operation, key, fallback, None)
+
+        start = time.monotonic()
+        try:
+            result = self._hedged(operation, fn)
+        except Exception as e:
+            self.breaker.record(False, time.monotonic() - start)
+            return self._fallback(operation, key, fallback, e)
+        self.breaker.record(True, time.monotonic() - start)
+        self.cache.put(key, result)
+        return result
+
+    def _fallback(self, operation: str, key: Tuple, fallback: Callable, error: Optional[Exception]):
+        cached = self.cache.get(key)
+        if cached is not None:
+            source = "cache"
+            result = cached
+        elif self.fallback_index is not None:
+            source = "index"
+            result = fallback()
+        elif error is not None:
+            raise error
+        else:
+            raise UpstreamUnavailable("Vector index circuit is open and no fallback is available", retry_after=self.breaker.open_seconds)
+        if registry.enabled:
+            VECTOR_FALLBACKS.labels(operation, source).inc()
+        served = _fallbacks.get()
+        if served is not None:
+            served.append(source)
+        return result
+
+    def query(self, **kwargs):
+        return self._call(
+            "query",
+            _query_key(kwargs),
+            lambda: self.index.query(**kwargs),
+            lambda: self.fallback_index.query(**kwargs)
+        )
+
+    def fetch(self, ids: List[str], namespace: str = "", **kwargs):
+        return self._call(
+            "fetch",
+            ("fetch", tuple(ids), namespace),
+            lambda: self.index.fetch(ids=ids, namespace=namespace, **kwargs),
+            lambda: self.fallback_index.fetch(ids=ids, namespace=namespace, **kwargs)
+        )
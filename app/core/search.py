@@ -1,10 +1,23 @@
-from typing import List, Dict, Optional, Union
-import pinecone
-import openai
+from typing import List, Dict, Optional, Sequence, Tuple, Union
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
 from dotenv import load_dotenv
 import os
 import re
 import logging
+import threading
+from .catalog import VALID_CATEGORIES, project_metadata, shard_namespace
+from .config import settings
+from .lexical import BM25Index
+from .metrics import record_cache_lookup, record_upstream_error, time_stage
+from .profiling import submit_attached
+from .providers import get_embedding_client, get_vector_index
+from .query_log import normalize_query
+from .query_parser import QueryParser
+from .tracing import record_usage, set_attributes, span, traced
+from .embeddings import embedding_options, estimate_tokens, shorten_embedding
+from .upstream import governor
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -13,33 +26,81 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
+class EmbeddingCache:
+    """Query embeddings by normalized text and size, least recently used evicted first"""
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._items: "OrderedDict[Tuple[str, int], List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, int]) -> Optional[List[float]]:
+        with self._lock:
+            embedding = self._items.get(key)
+            if embedding is not None:
+                self._items.move_to_end(key)
+        record_cache_lookup("embedding", embedding is not None)
+        return embedding
+
+    def put(self, key: Tuple[str, int], embedding: List[float]) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._items[key] = embedding
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
 class HybridSearch:
-    def __init__(self):
+    def __init__(
+        self,
+        index=None,
+        openai_client=None,
+        lexical_index=None,
+        sharded: Optional[bool] = None,
+        dimensions: Optional[int] = None
+    ):
         try:
-            # Initialize Pinecone
-            api_key = os.getenv("PINECONE_API_KEY")
-            if not api_key:
-                raise ValueError("PINECONE_API_KEY not found in environment variables")
-                
-            index_name = os.getenv("PINECONE_INDEX_NAME", "commerce-agent")
-            logger.info(f"Initializing Pinecone with index: {index_name}")
-            
-            # Initialize Pinecone with the new client
-            self.pc = pinecone.Pinecone(api_key=api_key)
-            self.index = self.pc.Index(index_name)
-            logger.info("Pinecone initialized successfully")
+            # Vector index and embedding client come from the configured providers
+            # unless injected, e.g. offline stand-ins in tests and benchmarks
+            self.index = index if index is not None else get_vector_index()
+            logger.info("Vector index initialized successfully")
             
-            # Initialize OpenAI
-            openai_api_key = os.getenv("OPENAI_API_KEY")
-            if not openai_api_key:
-                raise ValueError("OPENAI_API_KEY not found in environment variables")
-            self.openai_client = openai.OpenAI(api_key=openai_api_key)
-            logger.info("OpenAI initialized successfully")
+            self.openai_client = openai_client if openai_client is not None else get_embedding_client()
+            logger.info("Embedding client initialized successfully")
             
         except Exception as e:
             logger.error(f"Error initializing search: {str(e)}")
             raise
         
+        # Lexical index built at ingest time, queried alongside the vector search
+        self.lexical_index = lexical_index
+        if self.lexical_index is None and os.path.exists(settings.LEXICAL_INDEX_PATH):
+            try:
+                self.lexical_index = BM25Index.load(settings.LEXICAL_INDEX_PATH)
+            except Exception as e:
+                logger.error(f"Error loading lexical index: {str(e)}")
+        elif self.lexical_index is None:
+            logger.info(f"No lexical index at {settings.LEXICAL_INDEX_PATH}, using vector search only")
+        self.executor = ThreadPoolExecutor(max_workers=settings.SEARCH_WORKERS)
+        
+        # Query embeddings must have the size the catalog was embedded at
+        self.dimensions = settings.EMBEDDING_DIMENSIONS if dimensions is None else dimensions
+        self.embedding_cache = EmbeddingCache(settings.EMBEDDING_CACHE_SIZE)
+        
+        # With category sharding each category has its own namespace; a
+        # category-scoped query searches one shard, others fan out to all
+        self.sharded = settings.CATEGORY_SHARDING if sharded is None else sharded
+        self.shards = {category: shard_namespace(category) for category in VALID_CATEGORIES}
+        if self.sharded:
+            self.shard_executor = ThreadPoolExecutor(
+                max_workers=settings.SEARCH_WORKERS * len(self.shards),
+                thread_name_prefix="shard"
+            )
+        
         # Keywords for feature matching
         self.feature_mapping = {
             "laptops": {
@@ -72,14 +133,132 @@ class HybridSearch:
                 "sports": ["sports", "workout", "running", "exercise", "gym"]
             }
         }
+        
+        # Category, price and brand read from the query text fill in filters
+        # the client left unset; brands come from the lexical index's catalog
+        brands = self.lexical_index.values("brand") if self.lexical_index is not None else ()
+        self.query_parser = QueryParser(self.feature_mapping, brands)
 
     def _get_embedding(self, text: str) -> List[float]:
-        """Get embedding for a text query"""
-        response = self.openai_client.embeddings.create(
-            model="text-embedding-3-small",
-            input=text
+        """Get embedding for a text query, from the cache when it was embedded before"""
+        # Case and spacing don't change what a query means, so they share an
+        # entry; the text is embedded as the client sent it
+        key = (normalize_query(text) or text, self.dimensions)
+        embedding = self.embedding_cache.get(key)
+        set_attributes(embedding_cache_hit=embedding is not None)
+        if embedding is not None:
+            return embedding
+        with span("openai.embeddings.create", **{"gen_ai.request.model": "text-embedding-3-small"}) as current:
+            try:
+                response = governor.call(
+                    "text-embedding-3-small",
+                    lambda: self.openai_client.embeddings.create(
+                        model="text-embedding-3-small",
+                        input=text,
+                        **embedding_options(self.dimensions)
+                    ),
+                    estimate_tokens(text)
+                )
+            except Exception:
+                record_upstream_error("openai", "embeddings")
+                raise
+            record_usage(current, response)
+        embedding = shorten_embedding(response.data[0].embedding, self.dimensions)
+        self.embedding_cache.put(key, embedding)
+        return embedding
+
+    def _query_index(self, **kwargs):
+        """Query the vector index, counting upstream failures"""
+        with span(
+            "vector_index.query",
+            top_k=kwargs.get("top_k"),
+            namespace=kwargs.get("namespace"),
+            filtered=bool(kwargs.get("filter"))
+        ) as current:
+            try:
+                results = self.index.query(**kwargs)
+            except Exception:
+                record_upstream_error("vector_index", "query")
+                raise
+            current.set_attribute("matches", len(results.matches))
+            return results
+
+    def _fetch_index(self, ids: List[str], namespace: str = "products"):
+        """Fetch vectors by ID, counting upstream failures"""
+        with span("vector_index.fetch", ids=len(ids), namespace=namespace):
+            try:
+                return self.index.fetch(ids=ids, namespace=namespace)
+            except Exception:
+                record_upstream_error("vector_index", "fetch")
+                raise
+
+    def _fan_out(self, fn, items: List) -> List:
+        """Call fn(item) for each shard request in parallel, under the current trace"""
+        futures = [submit_attached(self.shard_executor, fn, item) for item in items]
+        return [future.result() for future in futures]
+
+    def _query_shards(self, category: Optional[str], filter: Optional[Dict], **kwargs):
+        """
+        Query the products namespace, or the category shards when sharded
+
+        A category-scoped query goes to that category's shard only, without
+        the now redundant category filter. Other queries fan out to every
+        shard and the matches are merged by score.
+        """
+        if not self.sharded:
+            return self._query_index(namespace="products", filter=filter, **kwargs)
+        if category in self.shards:
+            filter = {key: value for key, value in (filter or {}).items() if key != "category"}
+            return self._query_index(namespace=self.shards[category], filter=filter or None, **kwargs)
+
+        with span("vector_index.fan_out", shards=len(self.shards)):
+            results = self._fan_out(
+                lambda namespace: self._query_index(namespace=namespace, filter=filter, **kwargs),
+                list(self.shards.values())
+            )
+        matches = sorted(
+            (match for result in results for match in result.matches),
+            key=lambda match: match.score,
+            reverse=True
         )
-        return response.data[0].embedding
+        return SimpleNamespace(matches=matches[:kwargs.get("top_k", len(matches))], namespace="products")
+
+    def _shard_of(self, product_id: str) -> Optional[str]:
+        """Namespace of a product's category as recorded in the lexical index, if known"""
+        row = self.lexical_index.row(product_id) if self.lexical_index is not None else None
+        return self.shards.get(row.get("category")) if row is not None else None
+
+    def _fetch_namespaces(self, requests: List[Tuple[str, List[str]]]) -> Dict:
+        """Fetch each (namespace, ids) request, in parallel when there are several"""
+        if len(requests) == 1:
+            namespace, ids = requests[0]
+            return dict(self._fetch_index(ids, namespace).vectors)
+        vectors = {}
+        for result in self._fan_out(lambda request: self._fetch_index(request[1], request[0]), requests):
+            vectors.update(result.vectors)
+        return vectors
+
+    def _fetch_shards(self, ids: List[str]):
+        """
+        Fetch vectors by ID from the products namespace, or from their shards when sharded
+
+        Each product is fetched from the shard of the category the lexical
+        index recorded for it. Products it doesn't know, or that have since
+        moved to another category, are looked up in every shard.
+        """
+        if not self.sharded:
+            return self._fetch_index(ids)
+        routed: Dict[str, List[str]] = {}
+        for product_id in ids:
+            namespace = self._shard_of(product_id)
+            if namespace is not None:
+                routed.setdefault(namespace, []).append(product_id)
+        vectors = self._fetch_namespaces(list(routed.items())) if routed else {}
+        unresolved = [product_id for product_id in ids if product_id not in vectors]
+        if unresolved:
+            with span("vector_index.fan_out", shards=len(self.shards)):
+                vectors.update(self._fetch_namespaces([(namespace, unresolved) for namespace in self.shards.values()]))
+        return SimpleNamespace(vectors=vectors, namespace="products")
 
     def _extract_exact_features(self, query: str, category: str) -> Dict[str, float]:
         """Extract exact features from query using regex patterns"""
@@ -91,16 +270,112 @@ class HybridSearch:
                         features[feature_type] = 1.0
         return features
 
+    @staticmethod
+    def _matches_filters(
+        product: Dict,
+        category: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        brands: Optional[Sequence[str]] = None
+    ) -> bool:
+        """Check product metadata against the search filters"""
+        if category and product.get("category") != category:
+            return False
+        if brands and product.get("brand") not in brands:
+            return False
+        if min_price is not None and product["price"] < min_price:
+            return False
+        if max_price is not None and product["price"] > max_price:
+            return False
+        return True
+
+    @staticmethod
+    def _fuse_lexical(candidates: List[Dict], lexical_hits: List[Dict], weight: float) -> List[Dict]:
+        """
+        Add normalized BM25 scores to the vector scores
+
+        Products found only by the lexical index join the candidates with a
+        vector score of zero and no metadata yet (see _with_metadata).
+        """
+        if not lexical_hits:
+            return candidates
+        top_score = lexical_hits[0]["score"]
+        fused = {candidate["id"]: candidate for candidate in candidates}
+        for hit in lexical_hits:
+            boost = weight * hit["score"] / top_score
+            if hit["id"] in fused:
+                fused[hit["id"]]["score"] += boost
+            else:
+                fused[hit["id"]] = {
+                    "id": hit["id"],
+                    "score": boost,
+                    "metadata": None
+                }
+        return list(fused.values())
+
+    def _with_metadata(self, candidates: List[Dict]) -> List[Dict]:
+        """Fetch the records of candidates found only by the lexical index, which stores IDs"""
+        missing = [candidate["id"] for candidate in candidates if candidate["metadata"] is None]
+        if not missing:
+            return candidates
+        with time_stage("lexical_fetch"):
+            vectors = self._fetch_shards(missing).vectors
+        for candidate in candidates:
+            if candidate["metadata"] is None and candidate["id"] in vectors:
+                candidate["metadata"] = vectors[candidate["id"]].metadata
+        return [candidate for candidate in candidates if candidate["metadata"] is not None]
+
+    def _rerank(
+        self,
+        candidates: List[Dict],
+        exact_features: Dict[str, float],
+        category: Optional[str],
+        top_k: int
+    ) -> List[Dict]:
+        """Boost candidates by exact feature matches and keep the top_k"""
+        if exact_features:
+            for candidate in candidates:
+                # Calculate feature match boost
+                feature_score = 0.0
+                product_features = " ".join(candidate["metadata"]["features"]).lower()
+                for feature_type, weight in exact_features.items():
+                    if any(keyword in product_features for keyword in self.feature_mapping[category][feature_type]):
+                        feature_score += weight
+                
+                # Combine scores
+                candidate["score"] = candidate["score"] * (1 + feature_score)
+        
+        candidates.sort(key=lambda x: x["score"], reverse=True)
+        return candidates[:top_k]
+
+    @staticmethod
+    def _project(results: List[Dict], fields: Optional[Sequence[str]]) -> List[Dict]:
+        """Trim each result's metadata to the requested fields without touching the index's copy"""
+        if not fields:
+            return results
+        for result in results:
+            result["metadata"] = project_metadata(result["metadata"], fields)
+        return results
+
+    def _lexical_search(self, query: str, top_k: int, predicate) -> List[Dict]:
+        with span("lexical.search", top_k=top_k) as current:
+            hits = self.lexical_index.search(query, top_k, predicate)
+            current.set_attribute("hits", len(hits))
+            return hits
+
+    @traced("HybridSearch.search")
     def search(
         self,
         query: str,
         category: Optional[str] = None,
         min_price: Optional[float] = None,
         max_price: Optional[float] = None,
-        top_k: int = 3
+        top_k: int = 3,
+        fields: Optional[Sequence[str]] = None,
+        infer_filters: Optional[bool] = None
     ) -> List[Dict]:
         """
-        Hybrid search combining semantic and exact feature matching
+        Hybrid search combining semantic, lexical (BM25) and exact feature matching
         
         Args:
             query: Natural language search query
@@ -108,15 +383,70 @@ class HybridSearch:
             min_price: Minimum price filter
             max_price: Maximum price filter
             top_k: Number of results to return
+            fields: Metadata fields to return; all fields when None
+            infer_filters: Read category, price bounds and brand from the
+                query for filters not given explicitly; defaults to
+                QUERY_PARSING_ENABLED
             
         Returns:
             List of matching products with scores
         """
+        set_attributes(top_k=top_k, category=category, min_price=min_price, max_price=max_price)
+        
+        if settings.QUERY_PARSING_ENABLED if infer_filters is None else infer_filters:
+            with time_stage("query_parse"):
+                parsed = self.query_parser.parse(query)
+            if parsed:
+                set_attributes(
+                    inferred_category=parsed.category,
+                    inferred_min_price=parsed.min_price,
+                    inferred_max_price=parsed.max_price,
+                    inferred_brands=parsed.brands or None
+                )
+                results = self._search(
+                    parsed.text,
+                    category or parsed.category,
+                    min_price if min_price is not None else parsed.min_price,
+                    max_price if max_price is not None else parsed.max_price,
+                    top_k,
+                    fields,
+                    brands=parsed.brands
+                )
+                if results:
+                    return results
+                # A misread query shouldn't turn into an empty page
+                logger.info(f"No results with inferred filters {parsed!r}, searching without them")
+        return self._search(query, category, min_price, max_price, top_k, fields)
+
+    def _search(
+        self,
+        query: str,
+        category: Optional[str],
+        min_price: Optional[float],
+        max_price: Optional[float],
+        top_k: int,
+        fields: Optional[Sequence[str]],
+        brands: Optional[Sequence[str]] = None
+    ) -> List[Dict]:
+        # Query the lexical index while the embedding and vector query are in flight.
+        # The copied context keeps its span under this request's trace.
+        lexical_future = None
+        if self.lexical_index is not None:
+            lexical_future = submit_attached(
+                self.executor,
+                self._lexical_search,
+                query,
+                top_k * 2,
+                lambda product: self._matches_filters(product, category, min_price, max_price, brands)
+            )
+        
         # Get query embedding
-        query_embedding = self._get_embedding(query)
+        with time_stage("embed"):
+            query_embedding = self._get_embedding(query)
         
         # Match exact features if category specified
-        exact_features = self._extract_exact_features(query, category) if category else {}
+        with time_stage("feature_extraction"):
+            exact_features = self._extract_exact_features(query, category) if category else {}
         
         # Build filter conditions
         filter_conditions = {}
@@ -129,62 +459,49 @@ class HybridSearch:
                 filter_conditions["price"]["$lte"] = max_price
             else:
                 filter_conditions["price"] = {"$lte": max_price}
+        if brands:
+            filter_conditions["brand"] = {"$eq": brands[0]} if len(brands) == 1 else {"$in": list(brands)}
         
         # Search Pinecone
-        results = self.index.query(
-            vector=query_embedding,
-            top_k=top_k * 2,  # Get extra results for filtering
-            include_metadata=True,
-            namespace="products",
-            filter=filter_conditions if filter_conditions else None
-        )
+        with time_stage("vector_query"):
+            results = self._query_shards(
+                category,
+                filter=filter_conditions if filter_conditions else None,
+                vector=query_embedding,
+                top_k=top_k * 2,  # Get extra results for filtering
+                include_metadata=True
+            )
         
-        # Apply feature matching if needed
-        if exact_features:
-            filtered_results = []
-            for match in results.matches:
-                product = match.metadata
-                
-                if category and product["category"] != category:
-                    continue
-                
-                if min_price is not None and product["price"] < min_price:
-                    continue
-                if max_price is not None and product["price"] > max_price:
-                    continue
-
-                # Calculate feature match boost
-                feature_score = 0.0
-                product_features = " ".join(product["features"]).lower()
-                for feature_type, weight in exact_features.items():
-                    if any(keyword in product_features for keyword in self.feature_mapping[category][feature_type]):
-                        feature_score += weight
-
-                # Combine scores
-                combined_score = match.score * (1 + feature_score)
-                
-                filtered_results.append({
-                    "id": match.id,
-                    "score": combined_score,
-                    "metadata": product
-                })
-            
-            filtered_results.sort(key=lambda x: x["score"], reverse=True)
-            results.matches = filtered_results[:top_k]
-        else:
-            results.matches = results.matches[:top_k]
-        
-        return [{
+        candidates = [{
             "id": match.id,
             "score": match.score,
             "metadata": match.metadata
         } for match in results.matches]
+        
+        # Fuse lexical scores into the vector scores
+        if lexical_future is not None:
+            with time_stage("lexical_wait"):
+                lexical_hits = lexical_future.result()
+            candidates = self._with_metadata(self._fuse_lexical(candidates, lexical_hits, settings.LEXICAL_WEIGHT))
+        
+        with time_stage("rerank"), span("HybridSearch.rerank", candidates=len(candidates)):
+            # Apply feature matching if needed
+            if exact_features:
+                candidates = [
+                    candidate for candidate in candidates
+                    if self._matches_filters(candidate["metadata"], category, min_price, max_price, brands)
+                ]
+            results = self._rerank(candidates, exact_features, category, top_k)
+        # Re-ranking reads features, so the projection can only happen after it
+        return self._project(results, fields)
 
+    @traced("HybridSearch.recommend_similar")
     def recommend_similar(
         self,
         product_id: str,
         category: Optional[str] = None,
-        top_k: int = 3
+        top_k: int = 3,
+        fields: Optional[Sequence[str]] = None
     ) -> List[Dict]:
         """
         Find similar products based on a reference product
@@ -193,12 +510,16 @@ class HybridSearch:
             product_id: ID of the reference product
             category: Filter by product category
             top_k: Number of recommendations to return
+            fields: Metadata fields to return; all fields when None
             
         Returns:
             List of similar products with scores
         """
+        set_attributes(top_k=top_k, category=category)
+        
         # Get reference product
-        ref_product = self.index.fetch(ids=[product_id], namespace="products")
+        with time_stage("vector_fetch"):
+            ref_product = self._fetch_shards([product_id])
         if not ref_product.vectors:
             return []
         
@@ -208,13 +529,14 @@ class HybridSearch:
         if category:
             filter_conditions["category"] = {"$eq": category}
         
-        results = self.index.query(
-            vector=ref_vector,
-            top_k=top_k + 1,
-            include_metadata=True,
-            namespace="products",
-            filter=filter_conditions
-        )
+        with time_stage("vector_query"):
+            results = self._query_shards(
+                category,
+                filter=filter_conditions,
+                vector=ref_vector,
+                top_k=top_k + 1,
+                include_metadata=True
+            )
         
         similar_products = []
         for match in results.matches:
@@ -228,15 +550,17 @@ class HybridSearch:
                 "metadata": match.metadata
             })
         
-        return similar_products[:top_k]
+        return self._project(similar_products[:top_k], fields)
 
+    @traced("HybridSearch.get_product")
     def get_product(self, product_id: str) -> Optional[dict]:
         """
         Get a product by its ID
         """
         try:
             # Fetch the vector and metadata for the product
-            response = self.index.fetch(ids=[product_id], namespace="products")
+            with time_stage("vector_fetch"):
+                response = self._fetch_shards([product_id])
             if not response.vectors or product_id not in response.vectors:
                 return None
             return response.vectors[product_id].metadata
@@ -1,9 +1,12 @@
+from typing import Optional
 from fastapi import HTTPException, Security, Depends
 from fastapi.security import APIKeyHeader
 from starlette.status import HTTP_403_FORBIDDEN
+import hmac
 from .config import settings
 
 api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
+admin_key_header = APIKeyHeader(name="X-Admin-Key", auto_error=False)
 
 async def verify_api_key(api_key: str = Security(api_key_header)):
     if not api_key:
@@ -16,4 +19,19 @@ async def verify_api_key(api_key: str = Security(api_key_header)):
             status_code=HTTP_403_FORBIDDEN,
             detail="Invalid API key"
         )
-    return api_key 
\ No newline at end of file
+    return api_key
+
+def is_admin_key(admin_key: Optional[str]) -> bool:
+    """Check a key against ADMIN_API_KEY in constant time; never matches when no admin key is configured"""
+    if not settings.ADMIN_API_KEY or not admin_key:
+        return False
+    return hmac.compare_digest(admin_key.encode("utf-8"), settings.ADMIN_API_KEY.encode("utf-8"))
+
+async def verify_admin_key(admin_key: str = Security(admin_key_header)):
+    # Admin endpoints are disabled entirely when no admin key is configured
+    if not is_admin_key(admin_key):
+        raise HTTPException(
+            status_code=HTTP_403_FORBIDDEN,
+            detail="Invalid admin key"
+        )
+    return admin_key
@@ -0,0 +1,114 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+from collections import OrderedDict
+import json
+import threading
+import time
+from .config import settings
+from .metrics import record_cache_lookup
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Fast JSON encoding for product results. Search results come from our own
+# index, so the endpoints skip per-request pydantic validation and encode
+# straight to bytes. Each product's metadata is encoded once per catalog
+# version and the bytes are reused across responses for FRAGMENT_CACHE_TTL_S
+# seconds. A hit is a dict lookup on (id, version, projection); the metadata
+# itself is never compared or copied. Without a known catalog version nothing
+# would invalidate a fragment, so results are encoded without the cache.
+
+
+def dumps(value) -> bytes:
+    """Encode a value as compact JSON bytes, using orjson when installed"""
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def loads(data: bytes):
+    """Decode JSON bytes, using orjson when installed"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FragmentCache:
+    """Encoded metadata by (product ID, catalog version, projection), bounded in size and age"""
+
+    def __init__(self, max_size: int = 10000, ttl: float = 300.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._fragments: "OrderedDict[Tuple, Tuple[float, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple, metadata: Dict) -> bytes:
+        if self.max_size <= 0 or self.ttl <= 0:
+            return dumps(metadata)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._fragments.get(key)
+            if entry is not None and now - entry[0] < self.ttl:
+                self._fragments.move_to_end(key)
+                self.hits += 1
+                record_cache_lookup("fragment", True)
+                return entry[1]
+        record_cache_lookup("fragment", False)
+        fragment = dumps(metadata)
+        with self._lock:
+            self.misses += 1
+            self._fragments[key] = (now, fragment)
+            self._fragments.move_to_end(key)
+            while len(self._fragments) > self.max_size:
+                self._fragments.popitem(last=False)
+        return fragment
+
+    def clear(self) -> None:
+        """Drop all fragments, e.g. after a catalog reload"""
+        with self._lock:
+            self._fragments.clear()
+
+
+fragment_cache = FragmentCache(
+    max_size=settings.FRAGMENT_CACHE_SIZE,
+    ttl=settings.FRAGMENT_CACHE_TTL_S
+)
+
+
+def encode_products(
+    results: List[Dict],
+    cache: Optional[FragmentCache] = None,
+    fields: Optional[Sequence[str]] = None,
+    version: Optional[str] = None
+) -> bytes:
+    """
+    Encode search results as a JSON array of {id, score, metadata}
+
+    Args:
+        results: Results from HybridSearch, with id, score and metadata
+        cache: Fragment cache for the metadata; defaults to the shared one
+        fields: Projection the metadata was trimmed to, part of the cache key
+        version: Catalog version the results were read from, part of the
+            cache key; None encodes every result without the cache
+
+    Returns:
+        UTF-8 JSON bytes matching List[ProductResponse]
+    """
+    cache = fragment_cache if cache is None else cache
+    projection = tuple(fields) if fields else None
+    parts = []
+    for result in results:
+        product_id = str(result["id"])
+        parts.append(
+            b'{"id":' + dumps(product_id)
+            + b',"score":' + dumps(float(result["score"]))
+            + b',"metadata":' + (
+                dumps(result["metadata"]) if version is None
+                else cache.get((product_id, version, projection), result["metadata"])
+            )
+            + b"}"
+        )
+    return b"[" + b",".join(parts) + b"]"
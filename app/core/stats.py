@@ -0,0 +1,27 @@
+from typing import Dict, List
+import math
+
+# Latency summaries shared by the benchmark, load-test and replay tools
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Linearly interpolated percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = (len(sorted_values) - 1) * pct / 100
+    low, high = math.floor(rank), math.ceil(rank)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def summarize(latencies: List[float], elapsed: float) -> Dict:
+    """Latency percentiles (ms) and throughput for a set of timed calls"""
+    ordered = sorted(latencies)
+    return {
+        "count": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered) * 1000 if ordered else 0.0,
+        "p50_ms": percentile(ordered, 50) * 1000,
+        "p95_ms": percentile(ordered, 95) * 1000,
+        "p99_ms": percentile(ordered, 99) * 1000,
+        "max_ms": ordered[-1] * 1000 if ordered else 0.0,
+        "ops_per_sec": len(ordered) / elapsed if elapsed > 0 else 0.0,
+    }
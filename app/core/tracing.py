@@ -0,0 +1,226 @@
+from typing import Dict, Optional
+import functools
+import importlib
+import inspect
+import logging
+import os
+from .config import settings
+from .metrics import route_path
+
+logger = logging.getLogger(__name__)
+
+# Span-based tracing through OpenTelemetry. The SDK is an optional dependency:
+# without it, or with TRACING_ENABLED=false, span() returns a shared no-op and
+# traced() calls straight through, so instrumented code needs no guards.
+
+try:
+    from opentelemetry import propagate, trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import (
+        BatchSpanProcessor,
+        ConsoleSpanExporter,
+        SpanExporter,
+        SpanExportResult,
+    )
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+    from opentelemetry.trace import SpanKind, Status, StatusCode
+except ImportError:
+    trace = None
+
+_tracer = None
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set_attribute(self, key, value) -> None:
+        pass
+
+    def set_attributes(self, attributes) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def _clean(attributes: Dict) -> Dict:
+    # OpenTelemetry rejects None attribute values
+    return {key: value for key, value in attributes.items() if value is not None}
+
+
+def span(name: str, **attributes):
+    """
+    Context manager for a span that is a child of the current one
+
+    Args:
+        name: Span name, e.g. "pinecone.query"
+        **attributes: Span attributes; None values are dropped
+
+    Returns:
+        The active span (or a no-op stand-in when tracing is off)
+    """
+    if _tracer is None:
+        return _NOOP_SPAN
+    return _tracer.start_as_current_span(name, attributes=_clean(attributes))
+
+
+def set_attributes(**attributes) -> None:
+    """Set attributes on the current span"""
+    if _tracer is not None:
+        trace.get_current_span().set_attributes(_clean(attributes))
+
+
+def record_usage(current_span, response) -> None:
+    """Copy token counts from an OpenAI response onto a span"""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    current_span.set_attributes(_clean({
+        "gen_ai.usage.input_tokens": getattr(usage, "prompt_tokens", None),
+        "gen_ai.usage.output_tokens": getattr(usage, "completion_tokens", None),
+    }))
+
+
+def traced(name: Optional[str] = None):
+    """Decorator running a sync or async function inside a span"""
+    def decorator(fn):
+        span_name = name or fn.__qualname__
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if _tracer is None:
+                    return await fn(*args, **kwargs)
+                with _tracer.start_as_current_span(span_name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return fn(*args, **kwargs)
+            with _tracer.start_as_current_span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+if trace is not None:
+    class JsonLinesSpanExporter(SpanExporter):
+        """Appends finished spans to a file, one OTLP-style JSON object per line"""
+
+        def __init__(self, path: str):
+            self.path = path
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+        def export(self, spans) -> "SpanExportResult":
+            with open(self.path, "a", encoding="utf-8") as f:
+                for finished in spans:
+                    f.write(finished.to_json(indent=None) + "\n")
+            return SpanExportResult.SUCCESS
+
+        def shutdown(self) -> None:
+            pass
+
+
+def _build_exporter():
+    exporter = settings.TRACING_EXPORTER
+    if exporter == "file":
+        return JsonLinesSpanExporter(settings.TRACING_FILE_PATH)
+    if exporter == "console":
+        return ConsoleSpanExporter()
+    if exporter == "otlp":
+        # Endpoint and headers come from the standard OTEL_EXPORTER_OTLP_* variables
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter()
+    raise ValueError(f"Unknown TRACING_EXPORTER: {exporter}")
+
+
+def _instrument_http_clients() -> None:
+    # OpenAI calls go through httpx and Pinecone through urllib3; each
+    # instrumentor is optional and adds a client span per HTTP request
+    instrumentors = [
+        ("opentelemetry.instrumentation.httpx", "HTTPXClientInstrumentor"),
+        ("opentelemetry.instrumentation.urllib3", "URLLib3Instrumentor"),
+    ]
+    for module_name, class_name in instrumentors:
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError:
+            continue
+        getattr(module, class_name)().instrument()
+        logger.info(f"Tracing HTTP client calls with {class_name}")
+
+
+def setup_tracing(tracer_provider=None) -> bool:
+    """
+    Configure the tracer from settings
+
+    Args:
+        tracer_provider: Provider to use instead of building one from settings
+
+    Returns:
+        Whether tracing is active
+    """
+    global _tracer
+    if tracer_provider is None and not settings.TRACING_ENABLED:
+        return False
+    if trace is None:
+        logger.warning("TRACING_ENABLED is set but opentelemetry-sdk is not installed; tracing disabled")
+        return False
+
+    if tracer_provider is None:
+        tracer_provider = TracerProvider(
+            resource=Resource.create({"service.name": settings.TRACING_SERVICE_NAME}),
+            sampler=ParentBased(TraceIdRatioBased(settings.TRACING_SAMPLE_RATIO))
+        )
+        tracer_provider.add_span_processor(BatchSpanProcessor(_build_exporter()))
+        trace.set_tracer_provider(tracer_provider)
+        _instrument_http_clients()
+        logger.info(f"Tracing enabled with the {settings.TRACING_EXPORTER} exporter")
+
+    _tracer = tracer_provider.get_tracer("app")
+    return True
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware opening a server span per request
+
+    Incoming W3C traceparent headers are honoured, so spans join a caller's
+    trace. Spans are named after the route template to keep names bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or _tracer is None:
+            await self.app(scope, receive, send)
+            return
+
+        carrier = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        route = route_path(scope)
+        with _tracer.start_as_current_span(
+            f"{scope['method']} {route}",
+            context=propagate.extract(carrier),
+            kind=SpanKind.SERVER,
+            attributes={"http.method": scope["method"], "http.route": route, "http.target": scope["path"]}
+        ) as server_span:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    server_span.set_attribute("http.status_code", message["status"])
+                    if message["status"] >= 500:
+                        server_span.set_status(Status(StatusCode.ERROR))
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,396 @@
+from typing import Awaitable, Callable, Dict, Optional
+from contextlib import contextmanager
+from contextvars import ContextVar
+import asyncio
+import logging
+import random
+import threading
+import time
+import openai
+from .config import settings
+from .embeddings import RETRYABLE_OPENAI_ERRORS, estimate_tokens
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Shared governor for OpenAI calls made while serving requests. Each model
+# gets an AIMD concurrency limit (additive increase while calls succeed fast,
+# multiplicative decrease on 429s or slow responses) and a tokens-per-minute
+# budget. Retries use full-jitter backoff and honour Retry-After. Every wait
+# is bounded by the request deadline, so a call that can no longer finish in
+# time fails fast with UpstreamUnavailable instead of queueing.
+
+UPSTREAM_LIMIT = registry.gauge(
+    "upstream_concurrency_limit",
+    "Adaptive concurrency limit per upstream model",
+    ["model"]
+)
+UPSTREAM_RETRIES = registry.counter(
+    "upstream_retries_total",
+    "Retried upstream calls by model and reason",
+    ["model", "reason"]
+)
+
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+# How often an async call waiting for a concurrency slot checks for one
+ASYNC_SLOT_POLL_S = 0.01
+
+
+class UpstreamUnavailable(Exception):
+    """An upstream call was shed or could not finish within the request deadline"""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def remaining_time() -> Optional[float]:
+    """Seconds left before the current request's deadline, or None without one"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+@contextmanager
+def request_deadline(seconds: float):
+    """Set the deadline for upstream calls made within the block"""
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def _check_wait(wait: float, what: str) -> None:
+    remaining = remaining_time()
+    if remaining is not None and wait >= remaining:
+        raise UpstreamUnavailable(f"{what} would exceed the request deadline ({remaining * 1000:.0f}ms left)")
+
+
+class AdaptiveConcurrencyLimit:
+    """
+    AIMD concurrency limit
+
+    The limit grows by one per limit's worth of fast successes and is
+    multiplied by `backoff` after a 429 or a response slower than
+    `latency_target`. Decreases are spaced at least `decrease_interval`
+    apart so one burst of failures from calls already in flight counts once.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int = 1,
+        maximum: int = 64,
+        latency_target: float = 5.0,
+        backoff: float = 0.5,
+        decrease_interval: float = 1.0
+    ):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.decrease_interval = decrease_interval
+        self.in_flight = 0
+        self._last_decrease = float("-inf")
+        self._condition = threading.Condition()
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Wait for a slot; False if none freed up within timeout"""
+        with self._condition:
+            return self._condition.wait_for(lambda: self.in_flight < int(self.limit), timeout=timeout) and self._take()
+
+    def _take(self) -> bool:
+        self.in_flight += 1
+        return True
+
+    def release(self, latency: Optional[float] = None, throttled: bool = False) -> None:
+        with self._condition:
+            self.in_flight -= 1
+            if throttled or (latency is not None and latency > self.latency_target):
+                now = time.monotonic()
+                if now - self._last_decrease >= self.decrease_interval:
+                    self.limit = max(self.minimum, self.limit * self.backoff)
+                    self._last_decrease = now
+            elif latency is not None:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+
+class TokenBudget:
+    """Tokens-per-minute budget, refilled continuously"""
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: int) -> float:
+        """
+        Reserve tokens, which may drive the budget negative
+
+        Returns:
+            Seconds the caller should wait before using the reservation
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= min(tokens, self.capacity)
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def refund(self, tokens: int) -> None:
+        """Return the difference between an estimate and actual usage"""
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + tokens)
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_throttle(exc: Exception) -> bool:
+    return isinstance(exc, openai.RateLimitError) or getattr(exc, "status_code", None) == 429
+
+
+def _is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, openai.RateLimitError):
+        # An exhausted quota won't recover by retrying
+        return getattr(exc, "code", None) != "insufficient_quota"
+    return isinstance(exc, RETRYABLE_OPENAI_ERRORS)
+
+
+class ModelGovernor:
+    """Concurrency limit, token budget and retry policy for one model"""
+
+    def __init__(self, model: str, tokens_per_minute: Optional[int] = None):
+        self.model = model
+        self.concurrency = AdaptiveConcurrencyLimit(
+            initial=settings.UPSTREAM_INITIAL_CONCURRENCY,
+            minimum=settings.UPSTREAM_MIN_CONCURRENCY,
+            maximum=settings.UPSTREAM_MAX_CONCURRENCY,
+            latency_target=settings.UPSTREAM_LATENCY_TARGET_MS / 1000
+        )
+        self.budget = TokenBudget(tokens_per_minute) if tokens_per_minute else None
+        self.max_retries = settings.UPSTREAM_MAX_RETRIES
+        self.base_delay = settings.UPSTREAM_RETRY_BASE_DELAY_S
+        self.max_delay = settings.UPSTREAM_RETRY_MAX_DELAY_S
+
+    def _reserve(self, estimated_tokens: int) -> float:
+        """Reserve budget tokens; seconds to wait before calling"""
+        if self.budget is None:
+            return 0.0
+        wait = self.budget.reserve(estimated_tokens)
+        if wait > 0:
+            try:
+                _check_wait(wait, f"{self.model} token budget")
+            except UpstreamUnavailable:
+                self.budget.refund(estimated_tokens)
+                raise
+        return wait
+
+    def _no_capacity(self, estimated_tokens: int) -> UpstreamUnavailable:
+        if self.budget is not None:
+            self.budget.refund(estimated_tokens)
+        return UpstreamUnavailable(f"No {self.model} capacity before the request deadline")
+
+    def _admit(self, estimated_tokens: int) -> None:
+        wait = self._reserve(estimated_tokens)
+        if wait > 0:
+            time.sleep(wait)
+        remaining = remaining_time()
+        if not self.concurrency.acquire(timeout=max(0.0, remaining) if remaining is not None else None):
+            raise self._no_capacity(estimated_tokens)
+
+    async def _admit_async(self, estimated_tokens: int) -> None:
+        wait = self._reserve(estimated_tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        # Polled rather than waited on in a thread, so a cancelled caller never holds a slot
+        while not self.concurrency.acquire(timeout=0):
+            remaining = remaining_time()
+            if remaining is not None and remaining <= 0:
+                raise self._no_capacity(estimated_tokens)
+            await asyncio.sleep(ASYNC_SLOT_POLL_S if remaining is None else min(ASYNC_SLOT_POLL_S, remaining))
+
+    def _retry_delay(self, e: Exception, attempt: int, estimated_tokens: int) -> Optional[float]:
+        """Release the slot after a failed call; seconds before retrying, or None to give up"""
+        throttled = _is_throttle(e)
+        self.concurrency.release(throttled=throttled)
+        self._reconcile(estimated_tokens, None)
+        if not _is_retryable(e) or attempt == self.max_retries:
+            return None
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        delay = max(delay, _retry_after(e) or 0.0)
+        _check_wait(delay, f"Retrying {self.model}")
+        if registry.enabled:
+            UPSTREAM_RETRIES.labels(self.model, "throttled" if throttled else type(e).__name__).inc()
+        logger.warning(f"Retrying {self.model} after {type(e).__name__} in {delay:.2f}s (attempt {attempt + 1}/{self.max_retries})")
+        return delay
+
+    def _succeeded(self, start: float, estimated_tokens: int, result) -> None:
+        self.concurrency.release(latency=time.monotonic() - start)
+        self._reconcile(estimated_tokens, result)
+        if registry.enabled:
+            UPSTREAM_LIMIT.labels(self.model).set(self.concurrency.limit)
+
+    def call(self, fn: Callable, estimated_tokens: int = 0):
+        """
+        Call fn under this model's limits, retrying transient failures
+
+        Args:
+            fn: Zero-argument callable making one upstream request
+            estimated_tokens: Tokens reserved from the budget up front
+
+        Returns:
+            fn's result
+        """
+        for attempt in range(self.max_retries + 1):
+            self._admit(estimated_tokens)
+            start = time.monotonic()
+            try:
+                result = fn()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, estimated_tokens)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            self._succeeded(start, estimated_tokens, result)
+            return result
+
+    async def acall(self, fn: Callable[[], Awaitable], estimated_tokens: int = 0):
+        """
+        Await fn() under this model's limits, retrying transient failures
+
+        Unlike call, the request runs on the event loop: cancelling the
+        caller cancels it, and one still running at the request deadline is
+        cancelled and raises UpstreamUnavailable.
+
+        Args:
+            fn: Zero-argument callable returning an awaitable for one upstream request
+            estimated_tokens: Tokens reserved from the budget up front
+
+        Returns:
+            The awaited result
+        """
+        for attempt in range(self.max_retries + 1):
+            await self._admit_async(estimated_tokens)
+            start = time.monotonic()
+            remaining = remaining_time()
+            try:
+                result = await asyncio.wait_for(fn(), timeout=max(0.0, remaining) if remaining is not None else None)
+            except asyncio.TimeoutError:
+                # Counts as a slow response; the reservation is kept as it may have been billed
+                self.concurrency.release(latency=time.monotonic() - start)
+                raise UpstreamUnavailable(f"{self.model} did not answer before the request deadline")
+            except asyncio.CancelledError:
+                self.concurrency.release()
+                raise
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, estimated_tokens)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            self._succeeded(start, estimated_tokens, result)
+            return result
+
+    def _reconcile(self, estimated_tokens: int, result) -> None:
+        if self.budget is None:
+            return
+        usage = getattr(result, "usage", None)
+        if usage is None:
+            # Failed calls may still have been billed; keep the reservation
+            return
+        self.budget.refund(estimated_tokens - getattr(usage, "total_tokens", estimated_tokens))
+
+
+def _parse_limits(spec: str) -> Dict[str, int]:
+    limits = {}
+    for part in spec.split(","):
+        model, _, tokens = part.partition("=")
+        if model.strip() and tokens.strip():
+            limits[model.strip()] = int(tokens)
+    return limits
+
+
+class UpstreamGovernor:
+    """Per-model governors, created on first use"""
+
+    def __init__(self, tokens_per_minute: Optional[Dict[str, int]] = None):
+        self.tokens_per_minute = tokens_per_minute if tokens_per_minute is not None else _parse_limits(settings.UPSTREAM_TPM_LIMITS)
+        self._models: Dict[str, ModelGovernor] = {}
+        self._lock = threading.Lock()
+
+    def for_model(self, model: str) -> ModelGovernor:
+        governor = self._models.get(model)
+        if governor is None:
+            with self._lock:
+                governor = self._models.setdefault(model, ModelGovernor(model, self.tokens_per_minute.get(model)))
+        return governor
+
+    def call(self, model: str, fn: Callable, estimated_tokens: int = 0):
+        """Call fn through the named model's governor"""
+        return self.for_model(model).call(fn, estimated_tokens)
+
+    async def acall(self, model: str, fn: Callable[[], Awaitable], estimated_tokens: int = 0):
+        """Await an async call through the named model's governor"""
+        return await self.for_model(model).acall(fn, estimated_tokens)
+
+
+# Tokens an image input is billed at, taken as a 1024x1024 image at high detail
+IMAGE_TOKENS = 765
+# Formatting overhead per chat message
+MESSAGE_TOKENS = 4
+
+
+def _content_tokens(content) -> int:
+    """Tokens in a prompt string, a list of inputs, or a list of chat content parts"""
+    if isinstance(content, str):
+        return estimate_tokens(content)
+    tokens = 0
+    for part in content or ():
+        if isinstance(part, str):
+            tokens += estimate_tokens(part)
+        elif part.get("type") == "image_url":
+            # Counted at a fixed cost; the base64 data URL says nothing about billed tokens
+            tokens += IMAGE_TOKENS
+        else:
+            tokens += estimate_tokens(part.get("text", ""))
+    return tokens
+
+
+def estimate_request_tokens(kwargs: Dict) -> int:
+    """Rough token count of an embeddings or chat request, including the reply"""
+    if kwargs.get("messages"):
+        tokens = sum(MESSAGE_TOKENS + _content_tokens(message.get("content")) for message in kwargs["messages"])
+    else:
+        tokens = _content_tokens(kwargs.get("input"))
+    return tokens + (kwargs.get("max_tokens") or 0)
+
+
+governor = UpstreamGovernor()
+
+
+class DeadlineMiddleware:
+    """ASGI middleware giving each request REQUEST_TIMEOUT_S to finish its upstream calls"""
+
+    def __init__(self, app, timeout: Optional[float] = None):
+        self.app = app
+        self.timeout = settings.REQUEST_TIMEOUT_S if timeout is None else timeout
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.timeout <= 0:
+            await self.app(scope, receive, send)
+            return
+        with request_deadline(self.timeout):
+            await self.app(scope, receive, send)
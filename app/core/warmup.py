@@ -0,0 +1,130 @@
+from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+import time
+from .conditional import catalog_version
+from .config import settings
+from .serialization import encode_products
+
+logger = logging.getLogger(__name__)
+
+# Cache warm-up before a worker reports ready. The most frequent recorded
+# queries are replayed through the full search path (embedding, vector and
+# lexical queries, result encoding), which fills the embedding cache, the
+# vector result cache, the fragment cache and the page cache behind a local
+# index. /ready answers 503 until warm-up finishes or times out.
+
+
+class WarmupState:
+    """Progress of the latest warm-up, shared with the readiness probe"""
+
+    def __init__(self):
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self.status: Dict = {"state": "pending"}
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def start(self, total: int) -> None:
+        with self._lock:
+            self.status = {"state": "running", "total": total, "done": 0, "errors": 0, "started_at": time.time()}
+
+    def progress(self, error: bool) -> None:
+        with self._lock:
+            self.status["done"] += 1
+            if error:
+                self.status["errors"] += 1
+
+    def finish(self, state: str = "complete") -> None:
+        with self._lock:
+            self.status["state"] = state
+            if "started_at" in self.status:
+                self.status["elapsed_s"] = round(time.time() - self.status["started_at"], 3)
+        self._ready.set()
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return dict(self.status, ready=self.ready)
+
+
+warmup_state = WarmupState()
+
+
+def warm_up(
+    search,
+    queries: List[Tuple[str, Optional[str], int]],
+    concurrency: int = 4,
+    timeout: float = 120.0,
+    top_k: int = 5,
+    state: Optional[WarmupState] = None
+) -> Dict:
+    """
+    Replay queries through the search pipeline to fill caches
+
+    Args:
+        search: HybridSearch instance serving requests
+        queries: (query, category, count) tuples, e.g. from QueryLog.top
+        concurrency: Searches run at once, bounding the load on upstreams
+        timeout: Seconds after which remaining queries are skipped
+        top_k: Results per search, matching the API default
+        state: Progress tracker; the shared warmup_state by default
+
+    Returns:
+        The final warm-up status
+    """
+    state = warmup_state if state is None else state
+    state.start(len(queries))
+    deadline = time.monotonic() + timeout
+
+    def replay(entry: Tuple[str, Optional[str], int]) -> None:
+        if time.monotonic() >= deadline:
+            return
+        query, category, _ = entry
+        try:
+            version = catalog_version()
+            encode_products(search.search(query, category=category, top_k=top_k), version=version)
+        except Exception as e:
+            logger.warning(f"Warm-up query failed: {str(e)}")
+            state.progress(error=True)
+        else:
+            state.progress(error=False)
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="warmup") as pool:
+        list(pool.map(replay, queries))
+    # Queries skipped after the deadline never report progress
+    state.finish("complete" if state.snapshot()["done"] == len(queries) else "timed_out")
+    status = state.snapshot()
+    logger.info(
+        f"Warm-up {status['state']}: {status['done']}/{status['total']} queries, "
+        f"{status['errors']} errors in {status.get('elapsed_s', 0)}s"
+    )
+    return status
+
+
+def start_warmup(search, query_log, top_n: Optional[int] = None) -> bool:
+    """
+    Warm caches from the query log in a background thread
+
+    Args:
+        search: HybridSearch instance serving requests
+        query_log: QueryLog to take the most frequent queries from
+        top_n: Queries to replay; WARMUP_TOP_N by default
+
+    Returns:
+        False if a warm-up is already running
+    """
+    if warmup_state.snapshot()["state"] == "running":
+        return False
+    queries = query_log.top(settings.WARMUP_TOP_N if top_n is None else top_n)
+    warmup_state.start(len(queries))
+    threading.Thread(
+        target=warm_up,
+        args=(search, queries),
+        kwargs={"concurrency": settings.WARMUP_CONCURRENCY, "timeout": settings.WARMUP_TIMEOUT_S},
+        name="warmup",
+        daemon=True
+    ).start()
+    return True
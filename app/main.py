@@ -1,6 +1,16 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from .api import endpoints
+from fastapi.responses import JSONResponse, PlainTextResponse
+from .api import admin, endpoints
+from .core.compression import CompressionMiddleware
+from .core.config import settings
+from .core.metrics import MetricsMiddleware, registry
+from .core.profiling import ProfilingMiddleware
+from .core.ratelimit import RateLimitMiddleware
+from .core.recorder import RecorderMiddleware
+from .core.tracing import TracingMiddleware, setup_tracing
+from .core.upstream import DeadlineMiddleware, UpstreamUnavailable
+from .core.warmup import start_warmup, warmup_state
 
 app = FastAPI(
     title="AI Commerce Agent",
@@ -8,26 +18,84 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# CORS middleware
+# gzip/brotli for larger JSON responses
+app.add_middleware(CompressionMiddleware)
+
+# Deadline for upstream calls made while serving each request
+app.add_middleware(DeadlineMiddleware)
+
+# Per-client rate limits and load shedding for expensive endpoints
+app.add_middleware(RateLimitMiddleware)
+
+# CORS middleware, outside the rate limiter so 429/503 responses carry CORS
+# headers and preflight requests are answered without spending tokens
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # In production, replace with actual origins
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],
 )
 
+# Per-route latency and in-flight metrics
+app.add_middleware(MetricsMiddleware)
+
+# Opt-in sampling profiler for selected requests
+app.add_middleware(ProfilingMiddleware)
+
+# Server span per request when tracing is enabled
+setup_tracing()
+app.add_middleware(TracingMiddleware)
+
+# Opt-in capture of request shape and timing for scripts/replay.py
+app.add_middleware(RecorderMiddleware)
+
+@app.exception_handler(UpstreamUnavailable)
+async def upstream_unavailable_handler(request: Request, exc: UpstreamUnavailable):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(max(1, round(exc.retry_after)))}
+    )
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to AI Commerce Agent API"}
 
+@app.on_event("startup")
+async def warm_caches():
+    # Runs in the background; /ready reports 503 until it finishes
+    if not settings.WARMUP_ON_STARTUP or not start_warmup(endpoints.search, endpoints.query_log):
+        warmup_state.finish("skipped")
+
+@app.on_event("shutdown")
+async def flush_query_log():
+    endpoints.query_log.flush()
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 503 until cache warm-up has finished or timed out"""
+    status = warmup_state.snapshot()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 # Include router
 app.include_router(
     endpoints.router,
     prefix="/api",
     tags=["search"]
-) 
\ No newline at end of file
+)
+
+app.include_router(
+    admin.router,
+    prefix="/admin",
+    tags=["admin"]
+)
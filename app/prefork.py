@@ -0,0 +1,171 @@
+"""
+Pre-fork server: load the app once, then fork uvicorn workers.
+
+The parent imports the app and any PREFORK_PRELOAD modules. That covers
+clients, the lexical index, the local vector index mappings and, when
+listed, models such as CLIP in app.services.ai_service. It then collects
+garbage and calls gc.freeze(), so the collector in the workers never
+touches the inherited objects and their pages stay shared copy-on-write.
+Finally it binds the socket and forks workers that serve from it.
+
+Preloading CUDA models before forking is not supported; with a GPU,
+run plain uvicorn instead. Metrics, rate limits and profiles are per worker.
+Send SIGUSR1 to the parent to log RSS/PSS/shared memory per process.
+
+Usage:
+    python -m app.prefork --workers 4 --port 8000
+    PREFORK_PRELOAD=app.services.ai_service python -m app.prefork
+"""
+from typing import Dict, List, Optional
+import argparse
+import gc
+import importlib
+import logging
+import os
+import signal
+import sys
+import time
+
+logger = logging.getLogger("app.prefork")
+
+# A worker that dies within this many seconds of starting is not restarted,
+# so a broken deploy doesn't fork in a tight loop
+MIN_WORKER_UPTIME_S = 5.0
+
+
+def preload(app_path: str, modules: List[str]):
+    """Import the ASGI app and extra modules in the parent, then freeze the heap"""
+    start = time.perf_counter()
+    # Skip collections while importing; everything loaded here lives for the process
+    gc.disable()
+    for module in modules:
+        importlib.import_module(module)
+    module_name, _, attribute = app_path.partition(":")
+    app = getattr(importlib.import_module(module_name), attribute or "app")
+    gc.collect()
+    gc.freeze()
+    gc.enable()
+    logger.info(
+        f"Preloaded {app_path} and {len(modules)} modules in {time.perf_counter() - start:.2f}s; "
+        f"{gc.get_freeze_count()} objects frozen"
+    )
+    return app
+
+
+def memory_usage(pid: int) -> Dict[str, int]:
+    """RSS, PSS and shared memory of a process in kB, from /proc (Linux only)"""
+    usage = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name in ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty"):
+                    usage[name.lower()] = int(value.split()[0])
+    except OSError:
+        pass
+    return usage
+
+
+class Arbiter:
+    """
+    Forks workers serving a shared socket and replaces any that exit
+
+    Args:
+        config: uvicorn Config for the preloaded app
+        workers: Number of worker processes
+    """
+
+    def __init__(self, config, workers: int):
+        self.config = config
+        self.workers = workers
+        self.socket = None
+        self.children: Dict[int, float] = {}
+        self.stopping = False
+
+    def spawn(self) -> int:
+        import uvicorn
+
+        pid = os.fork()
+        if pid:
+            self.children[pid] = time.monotonic()
+            return pid
+
+        # Child: restore default handlers; uvicorn installs its own for shutdown
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGUSR1):
+            signal.signal(sig, signal.SIG_DFL)
+        code = 0
+        try:
+            uvicorn.Server(self.config).run(sockets=[self.socket])
+        except Exception:
+            logger.exception("Worker crashed")
+            code = 1
+        finally:
+            os._exit(code)
+
+    def stop(self, signum, frame) -> None:
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def report_memory(self, signum, frame) -> None:
+        for pid in [os.getpid(), *self.children]:
+            usage = memory_usage(pid)
+            role = "parent" if pid == os.getpid() else "worker"
+            logger.info(f"{role} {pid}: " + ", ".join(f"{name}={kb / 1024:.1f}MB" for name, kb in usage.items()))
+
+    def run(self) -> None:
+        self.socket = self.config.bind_socket()
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGUSR1, self.report_memory)
+
+        start = time.perf_counter()
+        for _ in range(self.workers):
+            self.spawn()
+        logger.info(f"Forked {self.workers} workers in {(time.perf_counter() - start) * 1000:.0f}ms on {self.config.host}:{self.config.port}")
+
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except InterruptedError:
+                continue
+            except ChildProcessError:
+                break
+            started = self.children.pop(pid, None)
+            if self.stopping or started is None:
+                continue
+            uptime = time.monotonic() - started
+            logger.warning(f"Worker {pid} exited with status {status} after {uptime:.1f}s")
+            if uptime < MIN_WORKER_UPTIME_S:
+                logger.error("Worker failed during startup, shutting down")
+                self.stop(None, None)
+                continue
+            self.spawn()
+        self.socket.close()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    import uvicorn
+    from app.core.config import settings
+
+    parser = argparse.ArgumentParser(description="Serve the API from pre-forked workers sharing a preloaded heap")
+    parser.add_argument("--app", default="app.main:app", help="ASGI app to preload, as module:attribute")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=settings.PREFORK_WORKERS, help="Worker processes (default: PREFORK_WORKERS)")
+    parser.add_argument("--preload", default=settings.PREFORK_PRELOAD, help="Comma-separated modules to import before forking")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level.upper())
+    modules = [module.strip() for module in args.preload.split(",") if module.strip()]
+    app = preload(args.app, modules)
+    config = uvicorn.Config(app, host=args.host, port=args.port, log_level=args.log_level)
+    Arbiter(config, args.workers).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
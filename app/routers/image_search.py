@@ -24,6 +24,13 @@ async def search_by_image(
     
     Optionally combine with text query for hybrid search.
     """
+    # Without the image index only the text side of a hybrid search can run
+    if not text_query and not ai_service.image_search_enabled:
+        raise HTTPException(
+            status_code=503,
+            detail="Image search is not enabled"
+        )
+    
     try:
         # Read and validate image
         contents = await image.read()
@@ -81,6 +88,13 @@ async def search_by_image_url(
     
     Optionally combine with text query for hybrid search.
     """
+    # Without the image index only the text side of a hybrid search can run
+    if not text_query and not ai_service.image_search_enabled:
+        raise HTTPException(
+            status_code=503,
+            detail="Image search is not enabled"
+        )
+    
     try:
         # Download and validate image
         import httpx
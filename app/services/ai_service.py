@@ -6,11 +6,20 @@ from langchain.prompts import PromptTemplate
 from langchain.vectorstores import Pinecone
 import pinecone
 from typing import List, Dict, Optional
+import asyncio
 import torch
 from PIL import Image
 import clip
 from transformers import CLIPProcessor, CLIPModel
 from ..core.config import settings
+from ..core.fusion import fuse
+from ..core.tracing import set_attributes, span, traced
+from ..core.embeddings import estimate_tokens
+from ..core.profiling import run_in_thread
+from ..core.upstream import governor
+
+class ImageSearchDisabled(RuntimeError):
+    """Raised for image-only searches while IMAGE_SEARCH_ENABLED is off"""
 
 class AIService:
     def __init__(self):
@@ -18,13 +27,15 @@ class AIService:
         self.llm = ChatOpenAI(
             model_name=settings.GPT_MODEL,
             temperature=0.7,
-            openai_api_key=settings.OPENAI_API_KEY
+            openai_api_key=settings.OPENAI_API_KEY,
+            max_retries=0  # retried by the upstream governor
         )
         
         # Initialize embeddings
         self.embeddings = OpenAIEmbeddings(
             model=settings.EMBEDDING_MODEL,
-            openai_api_key=settings.OPENAI_API_KEY
+            openai_api_key=settings.OPENAI_API_KEY,
+            max_retries=0  # retried by the upstream governor
         )
         
         # Initialize Pinecone
@@ -33,10 +44,16 @@ class AIService:
             environment=settings.PINECONE_ENV
         )
         self.index = pinecone.Index(settings.PINECONE_INDEX_NAME)
-        
-        # Initialize CLIP
+        # CLIP vectors live in their own index since their space and
+        # dimensionality differ from the text embeddings. It is loaded by
+        # scripts/index_images.py, so it is only queried once enabled.
+        self.image_search_enabled = settings.IMAGE_SEARCH_ENABLED
+        self.image_index = None
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.clip_model, self.clip_preprocess = clip.load("ViT-B/32", device=self.device)
+        if self.image_search_enabled:
+            self.image_index = pinecone.Index(settings.PINECONE_IMAGE_INDEX_NAME)
+            # Initialize CLIP
+            self.clip_model, self.clip_preprocess = clip.load("ViT-B/32", device=self.device)
         
         # Initialize conversation memory
         self.memory = ConversationBufferMemory(k=settings.CONVERSATION_MEMORY_K)
@@ -61,73 +78,120 @@ class AIService:
             prompt=self.base_prompt
         )
 
+    @traced("AIService.get_response")
     async def get_response(self, query: str, context: Optional[Dict] = None) -> str:
         """Generate a response to a user query."""
         if context:
             # Augment the query with context
             query = f"Context: {context}\nQuery: {query}"
         
-        response = await self.conversation.apredict(input=query)
+        with span("openai.chat", **{"gen_ai.request.model": settings.GPT_MODEL}):
+            # The chain also sends the conversation history, so this estimate is a floor
+            response = await governor.acall(
+                settings.GPT_MODEL,
+                lambda: self.conversation.apredict(input=query),
+                estimate_tokens(query)
+            )
         return response
 
+    @traced("AIService.get_product_recommendations")
     async def get_product_recommendations(self, query: str, n: int = 5) -> List[Dict]:
         """Get product recommendations based on text query."""
+        set_attributes(top_k=n)
+        
         # Get query embedding
-        query_embedding = await self.embeddings.aembed_query(query)
+        with span("openai.embeddings.create", **{"gen_ai.request.model": settings.EMBEDDING_MODEL}):
+            query_embedding = await self._embed_query(query)
         
         # Search Pinecone
-        results = self.index.query(
-            vector=query_embedding,
-            top_k=n,
-            include_metadata=True
-        )
+        with span("vector_index.query", top_k=n):
+            results = self.index.query(
+                vector=query_embedding,
+                top_k=n,
+                include_metadata=True
+            )
         
         return [result.metadata for result in results.matches]
 
-    async def search_by_image(self, image: Image.Image, n: int = 5) -> List[Dict]:
-        """Search for products using an image."""
-        # Preprocess image
+    async def _embed_query(self, text: str) -> List[float]:
+        """Embed a query through the upstream governor."""
+        return await governor.acall(
+            settings.EMBEDDING_MODEL,
+            lambda: self.embeddings.aembed_query(text),
+            estimate_tokens(text)
+        )
+
+    def _encode_image(self, image: Image.Image) -> List[float]:
+        """Encode an image into a CLIP embedding."""
         image_input = self.clip_preprocess(image).unsqueeze(0).to(self.device)
-        
-        # Get image embedding
         with torch.no_grad():
             image_features = self.clip_model.encode_image(image_input)
-            image_embedding = image_features.cpu().numpy().tolist()[0]
-        
-        # Search Pinecone
-        results = self.index.query(
-            vector=image_embedding,
-            top_k=n,
-            include_metadata=True
-        )
-        
-        return [result.metadata for result in results.matches]
+        return image_features.cpu().numpy().tolist()[0]
 
+    @traced("AIService._text_retrieval")
+    async def _text_retrieval(self, text_query: str, n: int) -> List[Dict]:
+        """Rank products against the text embedding index."""
+        with span("openai.embeddings.create", **{"gen_ai.request.model": settings.EMBEDDING_MODEL}):
+            query_embedding = await self._embed_query(text_query)
+        with span("vector_index.query", top_k=n):
+            results = await run_in_thread(
+                self.index.query,
+                vector=query_embedding,
+                top_k=n,
+                include_metadata=True
+            )
+        return [{"id": match.id, "score": match.score, "metadata": match.metadata} for match in results.matches]
+
+    @traced("AIService._image_retrieval")
+    async def _image_retrieval(self, image: Image.Image, n: int) -> List[Dict]:
+        """Rank products against the CLIP image index."""
+        with span("clip.encode_image", device=self.device):
+            image_embedding = await run_in_thread(self._encode_image, image)
+        with span("vector_index.query", top_k=n, index="images"):
+            results = await run_in_thread(
+                self.image_index.query,
+                vector=image_embedding,
+                top_k=n,
+                include_metadata=True
+            )
+        return [{"id": match.id, "score": match.score, "metadata": match.metadata} for match in results.matches]
+
+    @traced("AIService.search_by_image")
+    async def search_by_image(self, image: Image.Image, n: int = 5) -> List[Dict]:
+        """Search for products using an image."""
+        if not self.image_search_enabled:
+            raise ImageSearchDisabled("Image search is disabled; load the image index and set IMAGE_SEARCH_ENABLED")
+        results = await self._image_retrieval(image, n)
+        return [result["metadata"] for result in results]
+
+    @traced("AIService.hybrid_search")
     async def hybrid_search(self, text_query: str, image: Optional[Image.Image] = None, n: int = 5) -> List[Dict]:
-        """Perform hybrid search using both text and image if available."""
-        # Get text embedding
-        text_embedding = await self.embeddings.aembed_query(text_query)
+        """
+        Perform hybrid search using both text and image if available.
         
-        if image:
-            # Get image embedding
-            image_input = self.clip_preprocess(image).unsqueeze(0).to(self.device)
-            with torch.no_grad():
-                image_features = self.clip_model.encode_image(image_input)
-                image_embedding = image_features.cpu().numpy().tolist()[0]
-            
-            # Combine embeddings (simple average for now)
-            combined_embedding = [(t + i) / 2 for t, i in zip(text_embedding, image_embedding)]
-        else:
-            combined_embedding = text_embedding
+        Text and image retrieval run concurrently against their own indexes
+        and the ranked lists are fused, so latency is the slower of the two.
+        With image search disabled, only the text query is used.
+        """
+        set_attributes(top_k=n, with_image=image is not None)
         
-        # Search Pinecone
-        results = self.index.query(
-            vector=combined_embedding,
-            top_k=n,
-            include_metadata=True
+        # Get extra candidates from each retriever so fusion has overlap to work with
+        candidates = n * 2
+        retrievals = [self._text_retrieval(text_query, candidates)]
+        weights = [settings.HYBRID_TEXT_WEIGHT]
+        if image and self.image_search_enabled:
+            retrievals.append(self._image_retrieval(image, candidates))
+            weights.append(settings.HYBRID_IMAGE_WEIGHT)
+        
+        ranked_lists = await asyncio.gather(*retrievals)
+        fused = fuse(
+            ranked_lists,
+            weights=weights,
+            method=settings.HYBRID_FUSION_METHOD,
+            k=settings.RRF_K
         )
         
-        return [result.metadata for result in results.matches]
+        return [result["metadata"] for result in fused[:n]]
 
 # Create singleton instance
 ai_service = AIService() 
\ No newline at end of file
@@ -0,0 +1,270 @@
+"""
+Benchmark suite for the search hot paths.
+
+Runs against the offline stand-ins for OpenAI and Pinecone, so timings
+reflect our own code rather than the network. Each benchmark is warmed up,
+repeated, and reported as p50/p95/p99 latency and ops/sec at one or more
+concurrency levels. Results can be written as JSON and compared against a
+stored baseline to flag regressions.
+
+Usage:
+    python scripts/benchmark.py --output bench.json
+    python scripts/benchmark.py --baseline bench.json --threshold 0.2
+"""
+from typing import Callable, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.ingestion import IngestionPipeline
+from app.core.lexical import BM25Index
+from app.core.offline import InMemoryIndex, OfflineOpenAI
+from app.core.search import HybridSearch
+from app.core.serialization import FragmentCache, encode_products
+from app.core.stats import summarize
+from scripts.init_db import generate_products
+
+QUERIES = [
+    ("gaming laptop with rtx graphics", "laptops"),
+    ("smartphone with good camera and 5g", "smartphones"),
+    ("noise cancelling headphones for the gym", "audio"),
+    ("tablet for drawing with stylus", "tablets"),
+    ("lightweight business laptop with long battery life", "laptops"),
+    ("5000mAh battery phone", "smartphones"),
+]
+
+
+def run_benchmark(fn: Callable[[int], object], iterations: int, concurrency: int = 1, warmup: int = 10) -> Dict:
+    """
+    Time fn over many calls with concurrent workers
+
+    Args:
+        fn: Callable taking the call number, so workloads can rotate inputs
+        iterations: Total number of timed calls across all workers
+        concurrency: Number of worker threads issuing calls at once
+        warmup: Untimed calls made first to fill caches and lazy state
+
+    Returns:
+        Summary with p50/p95/p99 latency and ops/sec
+    """
+    for i in range(warmup):
+        fn(i)
+
+    per_worker = max(1, iterations // concurrency)
+
+    def worker(worker_id: int) -> List[float]:
+        latencies = []
+        for i in range(per_worker):
+            start = time.perf_counter()
+            fn(worker_id * per_worker + i)
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    summary = summarize([latency for latencies in results for latency in latencies], elapsed)
+    summary["concurrency"] = concurrency
+    return summary
+
+
+def build_environment(num_products: int = 1000, dimensions: int = 1536, seed: int = 42) -> Dict:
+    """Seed an offline index and search instance with generated products"""
+    random.seed(seed)
+    products = generate_products(num_products)
+    client = OfflineOpenAI(dimensions=dimensions)
+    index = InMemoryIndex()
+    IngestionPipeline(client, index, namespace="products").run(products)
+    lexical_index = BM25Index.from_products(products)
+    search = HybridSearch(index=index, openai_client=client, lexical_index=lexical_index)
+    sharded_index = InMemoryIndex()
+    IngestionPipeline(client, sharded_index, namespace="products", shard_by_category=True).run(products)
+    sharded_search = HybridSearch(index=sharded_index, openai_client=client, lexical_index=lexical_index, sharded=True)
+    return {"products": products, "client": client, "index": index, "search": search, "sharded_search": sharded_search}
+
+
+def build_suites(env: Dict) -> Dict[str, Callable[[int], object]]:
+    """Named workloads over the offline environment"""
+    search = env["search"]
+    sharded_search = env["sharded_search"]
+    products = env["products"]
+    rerank_candidates = [{"id": p["id"], "score": 0.5, "metadata": p} for p in products if p["category"] == "laptops"][:100]
+    rerank_features = search._extract_exact_features("gaming laptop with long battery", "laptops")
+    top50 = search.search("laptop", top_k=50)
+    warm_cache = FragmentCache()
+    no_cache = FragmentCache(max_size=0)
+
+    def search_basic(i):
+        return search.search(QUERIES[i % len(QUERIES)][0], top_k=5)
+
+    def search_filtered(i):
+        query, category = QUERIES[i % len(QUERIES)]
+        return search.search(query, category=category, min_price=200, max_price=2500, top_k=20)
+
+    def search_filtered_sharded(i):
+        query, category = QUERIES[i % len(QUERIES)]
+        return sharded_search.search(query, category=category, min_price=200, max_price=2500, top_k=20)
+
+    def search_sharded_fan_out(i):
+        return sharded_search.search(QUERIES[i % len(QUERIES)][0], top_k=5)
+
+    def search_large(i):
+        return search.search(QUERIES[i % len(QUERIES)][0], top_k=50)
+
+    def similar(i):
+        return search.recommend_similar(products[i % len(products)]["id"], top_k=10)
+
+    def feature_extraction(i):
+        query, category = QUERIES[i % len(QUERIES)]
+        return search._extract_exact_features(query, category)
+
+    def rerank(i):
+        candidates = [dict(candidate) for candidate in rerank_candidates]
+        return search._rerank(candidates, rerank_features, "laptops", 20)
+
+    def lexical(i):
+        return search.lexical_index.search(QUERIES[i % len(QUERIES)][0], top_k=20)
+
+    def serialize(i):
+        return encode_products(top50, cache=warm_cache, version="bench")
+
+    def serialize_uncached(i):
+        return encode_products(top50, cache=no_cache, version="bench")
+
+    return {
+        "search.basic": search_basic,
+        "search.filtered": search_filtered,
+        "search.filtered.sharded": search_filtered_sharded,
+        "search.basic.sharded": search_sharded_fan_out,
+        "search.top50": search_large,
+        "recommend_similar": similar,
+        "feature_extraction": feature_extraction,
+        "rerank": rerank,
+        "lexical": lexical,
+        "serialize.top50": serialize,
+        "serialize.top50.uncached": serialize_uncached,
+    }
+
+
+# Pure-CPU microbenchmarks gain nothing from threads, so they run single-threaded
+CONCURRENT_SUITES = ("search.basic", "search.filtered", "search.filtered.sharded", "search.top50", "recommend_similar")
+
+
+def benchmark_ingestion(env: Dict, runs: int = 3) -> Dict:
+    """Products/sec for a full load into a fresh offline index"""
+    products = env["products"]
+    latencies = []
+    for _ in range(runs):
+        pipeline = IngestionPipeline(env["client"], InMemoryIndex(), namespace="products")
+        stats = pipeline.run(products)
+        latencies.append(stats.elapsed)
+    summary = summarize(latencies, sum(latencies))
+    summary["products_per_sec"] = len(products) * runs / sum(latencies)
+    summary["concurrency"] = 1
+    return summary
+
+
+def run_suite(
+    env: Dict,
+    iterations: int = 200,
+    concurrency_levels: List[int] = (1,),
+    only: Optional[List[str]] = None
+) -> Dict[str, Dict]:
+    """Run every benchmark (or the named subset) and return results by name"""
+    results = {}
+    for name, fn in build_suites(env).items():
+        if only and name not in only:
+            continue
+        levels = concurrency_levels if name in CONCURRENT_SUITES else [1]
+        for concurrency in levels:
+            key = name if concurrency == 1 else f"{name}@c{concurrency}"
+            results[key] = run_benchmark(fn, iterations, concurrency=concurrency)
+    if not only or "ingestion" in only:
+        results["ingestion"] = benchmark_ingestion(env)
+    return results
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> List[str]:
+    """Describe benchmarks whose p95 or throughput regressed beyond threshold"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        if current["p95_ms"] > previous["p95_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p95 {previous['p95_ms']:.3f}ms -> {current['p95_ms']:.3f}ms")
+        if current["ops_per_sec"] < previous["ops_per_sec"] * (1 - threshold):
+            regressions.append(f"{name}: ops/sec {previous['ops_per_sec']:.1f} -> {current['ops_per_sec']:.1f}")
+    return regressions
+
+
+def print_results(results: Dict[str, Dict]) -> None:
+    print(f"{'benchmark':<28}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ops/sec':>12}")
+    for name, r in results.items():
+        print(f"{name:<28}{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}{r['p99_ms']:>10.3f}{r['ops_per_sec']:>12.1f}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark search hot paths against offline stand-ins")
+    parser.add_argument("--products", type=int, default=1000, help="Catalog size")
+    parser.add_argument("--dimensions", type=int, default=1536, help="Embedding dimensionality")
+    parser.add_argument("--iterations", type=int, default=200, help="Timed calls per benchmark")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--only", help="Comma-separated benchmark names to run")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare against a previous JSON result file")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    env = build_environment(args.products, args.dimensions, args.seed)
+    results = run_suite(
+        env,
+        iterations=args.iterations,
+        concurrency_levels=[int(c) for c in args.concurrency.split(",")],
+        only=args.only.split(",") if args.only else None
+    )
+    print_results(results)
+
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "products": args.products,
+            "dimensions": args.dimensions,
+            "iterations": args.iterations,
+            "seed": args.seed,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print("Regressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("No regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""
+Offline evaluation of shortened embeddings.
+
+Embeds a catalog and a query set once at full size, then for each candidate
+size shortens the vectors the way the API does (truncate and renormalize,
+see shorten_embedding) and compares retrieval against the full-size index.
+Reports recall@k and top-1 agreement with the full-size results, vector
+query latency and the memory the vectors take, so the smallest size that
+keeps quality can be chosen for EMBEDDING_DIMENSIONS.
+
+The offline hashed embeddings are not trained to front-load information,
+so their recall drops faster than text-embedding-3's; use --provider openai
+(needs OPENAI_API_KEY) for numbers that reflect the real model.
+
+Usage:
+    python scripts/eval_dimensions.py --dimensions 256,512,1024,1536
+    python scripts/eval_dimensions.py --provider openai --products 2000 --output dims.json
+"""
+from typing import Dict, List
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.embeddings import shorten_embedding
+from app.core.ingestion import build_product_text
+from app.core.offline import InMemoryIndex, OfflineOpenAI
+from app.core.stats import summarize
+from scripts.benchmark import QUERIES
+from scripts.init_db import generate_products
+
+MODEL = "text-embedding-3-small"
+
+
+def build_queries(products: List[Dict], count: int) -> List[str]:
+    """The benchmark queries plus short queries written from sampled products"""
+    queries = [query for query, _ in QUERIES]
+    for product in random.sample(products, min(count, len(products))):
+        feature = random.choice(product["features"]) if product["features"] else ""
+        queries.append(f"{product.get('use_case', '')} {product['category']} {feature}".strip())
+    return queries
+
+
+def embed(client, texts: List[str], batch_size: int = 256) -> List[List[float]]:
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        response = client.embeddings.create(model=MODEL, input=texts[start:start + batch_size])
+        vectors.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+    return vectors
+
+
+def build_index(ids: List[str], vectors: List[List[float]], dimensions: int) -> InMemoryIndex:
+    index = InMemoryIndex()
+    batch = [
+        {"id": vector_id, "values": shorten_embedding(vector, dimensions)}
+        for vector_id, vector in zip(ids, vectors)
+    ]
+    index.upsert(vectors=batch, namespace="products")
+    return index
+
+
+def search(index: InMemoryIndex, query_vectors: List[List[float]], top_k: int):
+    """Top-k IDs per query and per-query latencies"""
+    results, latencies = [], []
+    for vector in query_vectors:
+        start = time.perf_counter()
+        matches = index.query(vector=vector, top_k=top_k, namespace="products").matches
+        latencies.append(time.perf_counter() - start)
+        results.append([match.id for match in matches])
+    return results, latencies
+
+
+def evaluate(
+    ids: List[str],
+    vectors: List[List[float]],
+    query_vectors: List[List[float]],
+    dimensions: List[int],
+    top_k: int = 10
+) -> Dict[int, Dict]:
+    """
+    Compare retrieval at each size against the full-size vectors
+
+    Args:
+        ids: Product IDs
+        vectors: Full-size product embeddings
+        query_vectors: Full-size query embeddings
+        dimensions: Sizes to evaluate
+        top_k: Cut-off for recall
+
+    Returns:
+        Per size: recall@k and top-1 agreement with the full-size results,
+        query latency summary and vector memory in bytes (float32)
+    """
+    full_size = len(vectors[0])
+    reference, _ = search(build_index(ids, vectors, full_size), query_vectors, top_k)
+
+    report = {}
+    for size in dimensions:
+        size = min(size, full_size)
+        index = build_index(ids, vectors, size)
+        queries = [shorten_embedding(vector, size) for vector in query_vectors]
+        # Warm up the index's normalized matrix before timing
+        search(index, queries[:5], top_k)
+        start = time.perf_counter()
+        results, latencies = search(index, queries, top_k)
+        elapsed = time.perf_counter() - start
+
+        recall = sum(
+            len(set(found) & set(expected)) / len(expected)
+            for found, expected in zip(results, reference) if expected
+        ) / len(reference)
+        top1 = sum(
+            1 for found, expected in zip(results, reference) if found[:1] == expected[:1]
+        ) / len(reference)
+        report[size] = {
+            "recall_at_k": recall,
+            "top1_agreement": top1,
+            "latency": summarize(latencies, elapsed),
+            "vector_bytes": len(ids) * size * 4,
+        }
+    return report
+
+
+def print_report(report: Dict[int, Dict], top_k: int) -> None:
+    full = max(report)
+    print(f"{'dims':>6}{f'recall@{top_k}':>12}{'top-1':>8}{'p50 ms':>10}{'p95 ms':>10}{'memory MB':>12}{'saved':>8}")
+    for size, r in sorted(report.items()):
+        saved = 1 - r["vector_bytes"] / report[full]["vector_bytes"]
+        print(
+            f"{size:>6}{r['recall_at_k']:>12.3f}{r['top1_agreement']:>8.3f}"
+            f"{r['latency']['p50_ms']:>10.3f}{r['latency']['p95_ms']:>10.3f}"
+            f"{r['vector_bytes'] / 2**20:>12.1f}{saved:>8.0%}"
+        )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure recall, latency and memory of shortened embeddings")
+    parser.add_argument("--provider", choices=["offline", "openai"], default="offline", help="Embedding source")
+    parser.add_argument("--products", type=int, default=2000, help="Catalog size")
+    parser.add_argument("--queries", type=int, default=200, help="Generated queries, on top of the benchmark queries")
+    parser.add_argument("--dimensions", default="256,512,768,1024,1536", help="Comma-separated sizes to evaluate")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    products = generate_products(args.products)
+    queries = build_queries(products, args.queries)
+    if args.provider == "openai":
+        import openai
+        client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    else:
+        client = OfflineOpenAI(dimensions=1536)
+
+    start = time.perf_counter()
+    vectors = embed(client, [build_product_text(product) for product in products])
+    query_vectors = embed(client, queries)
+    print(f"Embedded {len(products)} products and {len(queries)} queries in {time.perf_counter() - start:.1f}s")
+
+    sizes = [int(size) for size in args.dimensions.split(",")]
+    report = evaluate([product["id"] for product in products], vectors, query_vectors, sizes, args.top_k)
+    print_report(report, args.top_k)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "provider": args.provider,
+                "products": args.products,
+                "queries": len(queries),
+                "top_k": args.top_k,
+                "results": {str(size): r for size, r in report.items()},
+            }, f, indent=2)
+        print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""
+Embed product images with CLIP and load them into the image index.
+
+Image search and the image side of hybrid search query
+PINECONE_IMAGE_INDEX_NAME, which holds one CLIP ViT-B/32 vector per
+product. Products are streamed from a catalog export; those with an
+image_url are downloaded, encoded in batches and upserted with the product
+as metadata. Products without an image_url are skipped. Create the index
+beforehand with 512 dimensions and the cosine metric, then set
+IMAGE_SEARCH_ENABLED=true on the API.
+
+Usage:
+    python scripts/index_images.py --source catalog.jsonl
+    python scripts/index_images.py --source catalog.parquet --batch-size 64 --download-workers 16
+"""
+from typing import Dict, Iterator, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import io
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.catalog import CatalogLoader
+from app.core.config import settings
+from app.core.ingestion import retry_with_backoff
+
+logger = logging.getLogger(__name__)
+
+
+def with_images(products) -> Iterator[Dict]:
+    """Products that have an image URL"""
+    for product in products:
+        if product.get("image_url"):
+            yield product
+
+
+def batched(items: Iterator[Dict], size: int) -> Iterator[List[Dict]]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def download(client, product: Dict):
+    """Fetch and decode a product image, or None if it can't be read"""
+    from PIL import Image
+
+    try:
+        response = retry_with_backoff(lambda: client.get(product["image_url"]), (Exception,), max_retries=2)
+        response.raise_for_status()
+        return Image.open(io.BytesIO(response.content)).convert("RGB")
+    except Exception as e:
+        logger.warning(f"Skipping image for {product['id']}: {str(e)}")
+        return None
+
+
+def encode(model, preprocess, device: str, images: List) -> List[List[float]]:
+    """CLIP image embeddings for a batch, as AIService computes them for queries"""
+    import torch
+
+    batch = torch.stack([preprocess(image) for image in images]).to(device)
+    with torch.no_grad():
+        features = model.encode_image(batch)
+    return features.float().cpu().numpy().tolist()
+
+
+def index_images(source: str, batch_size: int = 32, download_workers: int = 8, upsert_batch_size: int = 100) -> Tuple[int, int]:
+    """
+    Embed and upsert product images
+
+    Args:
+        source: Catalog export (.jsonl, .csv or .parquet)
+        batch_size: Images encoded per CLIP forward pass
+        download_workers: Concurrent image downloads
+        upsert_batch_size: Vectors per upsert request
+
+    Returns:
+        (products indexed, products skipped for a missing or unreadable image)
+    """
+    import clip
+    import httpx
+    import pinecone
+    import torch
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    model, preprocess = clip.load("ViT-B/32", device=device)
+    pc = pinecone.Pinecone(api_key=settings.PINECONE_API_KEY)
+    index = pc.Index(settings.PINECONE_IMAGE_INDEX_NAME)
+
+    loader = CatalogLoader(source, chunk_size=settings.INGEST_BATCH_SIZE)
+    indexed = 0
+    with httpx.Client(timeout=30.0, follow_redirects=True) as client, \
+            ThreadPoolExecutor(max_workers=download_workers) as pool:
+        for batch in batched(with_images(loader), batch_size):
+            images = list(pool.map(lambda product: download(client, product), batch))
+            ready = [(product, image) for product, image in zip(batch, images) if image is not None]
+            if not ready:
+                continue
+            embeddings = encode(model, preprocess, device, [image for _, image in ready])
+            vectors = [
+                {"id": product["id"], "values": embedding, "metadata": product}
+                for (product, _), embedding in zip(ready, embeddings)
+            ]
+            for i in range(0, len(vectors), upsert_batch_size):
+                chunk = vectors[i:i + upsert_batch_size]
+                retry_with_backoff(lambda: index.upsert(vectors=chunk), (Exception,))
+            indexed += len(vectors)
+            logger.info(f"Indexed {indexed} product images")
+    return indexed, loader.loaded - indexed
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load CLIP embeddings of product images into the image index")
+    parser.add_argument("--source", required=True, help="Catalog export with an image_url per product (.jsonl, .csv or .parquet)")
+    parser.add_argument("--batch-size", type=int, default=32, help="Images per CLIP forward pass")
+    parser.add_argument("--download-workers", type=int, default=8, help="Concurrent image downloads")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    indexed, skipped = index_images(args.source, args.batch_size, args.download_workers)
+    print(f"Indexed {indexed} product images into {settings.PINECONE_IMAGE_INDEX_NAME}; skipped {skipped}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,8 +2,20 @@ import pinecone
 import openai
 from dotenv import load_dotenv
 import os
+import shutil
+import sys
 import json
 import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.core.catalog import CatalogLoader
+from app.core.ingestion import IngestionPipeline
+from app.core.lexical import BM25Writer
+from app.core.offline import InMemoryIndex
+from app.core.local_index import CHECKPOINT_FILE, LEGACY_CHECKPOINT_FILE, current_version, load_index, publish_index
 
 # Load environment variables
 load_dotenv()
@@ -214,54 +226,122 @@ def generate_products(num_products=100):
     
     return products
 
-def init_pinecone():
-    print("Initializing Pinecone database with sample products...")
-    
-    # Initialize Pinecone
-    pc = pinecone.Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-    index = pc.Index(os.getenv("PINECONE_INDEX_NAME", "commerce-agent"))
+def open_local_index(reset=False):
+    """
+    Start a local index build from the current version
+
+    The checkpoint published with that version is copied to a working file,
+    so only new or changed products are embedded. An interrupted build
+    restarts from the published version, never from a half-built one.
+    """
+    root = settings.LOCAL_INDEX_PATH
+    os.makedirs(root, exist_ok=True)
+    checkpoint_path = os.path.join(root, f".{CHECKPOINT_FILE}")
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    version = current_version(root)
+    if reset or version is None:
+        return InMemoryIndex(), checkpoint_path
+    for name in (CHECKPOINT_FILE, LEGACY_CHECKPOINT_FILE):
+        published = os.path.join(root, version, name)
+        if os.path.exists(published):
+            shutil.copyfile(published, checkpoint_path)
+            break
+    return load_index(root), checkpoint_path
+
+def init_pinecone(num_products=100, source=None, checkpoint_path=None, reset=False, build_lexical_index=True, target="pinecone", shard_by_category=False, dimensions=0):
+    if target == "local":
+        print(f"Building local vector index in {settings.LOCAL_INDEX_PATH}...")
+        index, checkpoint_path = open_local_index(reset)
+    else:
+        print("Initializing Pinecone database with products...")
+        
+        # Initialize Pinecone
+        pc = pinecone.Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+        index = pc.Index(os.getenv("PINECONE_INDEX_NAME", "commerce-agent"))
     
     # Initialize OpenAI
-    openai.api_key = os.getenv("OPENAI_API_KEY")
+    openai_client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
     
-    # Generate products
-    products = generate_products(100)
+    checkpoint_path = checkpoint_path or settings.INGEST_CHECKPOINT_PATH
+    if reset and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
     
-    # Upload products to Pinecone
-    batch_size = 10
-    for i in range(0, len(products), batch_size):
-        batch = products[i:i + batch_size]
-        vectors = []
-        
-        for product in batch:
-            # Create rich product text for better semantic search
-            product_text = (
-                f"{product['name']} {product['description']} "
-                f"Brand: {product['brand']} Category: {product['category']} "
-                f"Features: {' '.join(product['features'])} "
-                f"Use case: {product.get('use_case', '')} "
-                f"Price: ${product['price']}"
-            )
-            
-            # Get embedding from OpenAI
-            response = openai.embeddings.create(
-                model="text-embedding-3-small",
-                input=product_text
-            )
-            embedding = response.data[0].embedding
-            
-            # Prepare vector with metadata
-            vectors.append({
-                "id": product["id"],
-                "values": embedding,
-                "metadata": product
-            })
-        
-        # Upsert batch to Pinecone
-        index.upsert(vectors=vectors, namespace="products")
-        print(f"Uploaded batch {i//batch_size + 1}/{(len(products) + batch_size - 1)//batch_size}")
+    # Stream products from a catalog export, or generate sample products
+    loader = None
+    if source:
+        loader = CatalogLoader(source, chunk_size=settings.INGEST_BATCH_SIZE)
+        products = loader
+    else:
+        products = generate_products(num_products)
+    
+    # Build the lexical index over the same products as they stream past.
+    # Postings are spilled to disk in chunks, so memory stays flat.
+    lexical_index = BM25Writer(settings.LEXICAL_INDEX_PATH, settings.INGEST_LEXICAL_CHUNK_SIZE) if build_lexical_index else None
+    
+    def catalog():
+        for product in products:
+            if lexical_index is not None:
+                lexical_index.add(product)
+            yield product
+    
+    # Embed and upload products to Pinecone
+    pipeline = IngestionPipeline(
+        openai_client,
+        index,
+        namespace="products",
+        model="text-embedding-3-small",
+        max_batch_tokens=settings.INGEST_BATCH_TOKENS,
+        max_batch_size=settings.INGEST_BATCH_SIZE,
+        upsert_batch_size=settings.INGEST_UPSERT_BATCH_SIZE,
+        embed_workers=settings.INGEST_EMBED_WORKERS,
+        upsert_workers=settings.INGEST_UPSERT_WORKERS,
+        checkpoint_path=checkpoint_path,
+        shard_by_category=shard_by_category,
+        dimensions=dimensions
+    )
+    stats = pipeline.run(catalog())
+    print(f"Uploaded {stats.summary()}")
+    if loader is not None and loader.invalid:
+        print(f"Skipped {loader.invalid} invalid records from {source}")
+    
+    if target == "local":
+        version = publish_index(
+            index,
+            settings.LOCAL_INDEX_PATH,
+            dtype=settings.LOCAL_INDEX_DTYPE,
+            keep=settings.LOCAL_INDEX_KEEP_VERSIONS,
+            checkpoint_path=checkpoint_path,
+            quantization=settings.LOCAL_INDEX_QUANTIZATION,
+            pq_subspaces=settings.LOCAL_INDEX_PQ_SUBSPACES
+        )
+        print(f"Published local index version {version}")
+    
+    if lexical_index is not None:
+        lexical_index.close()
+        print(f"Lexical index written to {settings.LEXICAL_INDEX_PATH}")
     
     print("Database initialization complete!")
 
 if __name__ == "__main__":
-    init_pinecone() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Load the product catalog into Pinecone")
+    parser.add_argument("--source", help="Catalog export to stream (.jsonl, .csv or .parquet); sample products are generated if omitted")
+    parser.add_argument("--num-products", type=int, default=100, help="Number of sample products to generate")
+    parser.add_argument("--checkpoint", help="Checkpoint file used to resume an interrupted load")
+    parser.add_argument("--reset", action="store_true", help="Ignore any existing checkpoint and load everything")
+    parser.add_argument("--skip-lexical-index", action="store_true", help="Do not build the lexical index")
+    parser.add_argument("--shard-by-category", action="store_true", default=settings.CATEGORY_SHARDING, help="Write each category to its own namespace (default: CATEGORY_SHARDING)")
+    parser.add_argument("--dimensions", type=int, default=settings.EMBEDDING_DIMENSIONS, help="Shorten embeddings to this size; must match EMBEDDING_DIMENSIONS when serving (default: EMBEDDING_DIMENSIONS, 0 = full size)")
+    parser.add_argument("--target", choices=["pinecone", "local"], default="local" if settings.VECTOR_STORE == "local" else "pinecone", help="Write to Pinecone or publish a new local index version")
+    args = parser.parse_args()
+    
+    init_pinecone(
+        num_products=args.num_products,
+        source=args.source,
+        checkpoint_path=args.checkpoint,
+        reset=args.reset,
+        build_lexical_index=not args.skip_lexical_index,
+        target=args.target,
+        shard_by_category=args.shard_by_category,
+        dimensions=args.dimensions
+    )
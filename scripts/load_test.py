@@ -0,0 +1,304 @@
+"""
+HTTP load generator replaying the request mix from postman_collection.json.
+
+Requests run either in-process against the ASGI app (with the offline
+stand-ins for OpenAI and Pinecone) or against a running server. Load is
+closed-loop (a fixed number of concurrent clients) or open-loop (Poisson
+arrivals at a target rate). Each step reports latency percentiles, a
+latency histogram, error rate and achieved RPS per endpoint; stepping
+through several rates shows where a worker saturates.
+
+Usage:
+    python scripts/load_test.py --in-process --concurrency 1,8,32 --duration 10
+    python scripts/load_test.py --base-url http://localhost:8000 --rate 20,40,80 --duration 30
+    python scripts/load_test.py --in-process --mix "Search Products=4,Agent Q&A=1"
+"""
+from typing import Dict, List, Optional
+from collections import Counter, defaultdict
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.stats import summarize
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 1x1 PNG used when a scenario posts an image URL instead of image data
+PLACEHOLDER_IMAGE = (
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=="
+)
+
+# Upper bounds (ms) of the latency histogram buckets
+HISTOGRAM_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+
+def load_scenarios(collection_path: str, variables: Dict[str, str]) -> List[Dict]:
+    """Turn each request in a Postman collection into a replayable scenario"""
+    with open(collection_path, encoding="utf-8") as f:
+        collection = json.load(f)
+
+    def substitute(text: str) -> str:
+        for key, value in variables.items():
+            text = text.replace(f"{{{{{key}}}}}", value)
+        return text
+
+    scenarios = []
+    for item in collection["item"]:
+        request = item["request"]
+        url = substitute(request["url"]["raw"])
+        path = url.split("//", 1)[-1]
+        path = path[path.index("/"):] if "/" in path else "/"
+        body = None
+        if request.get("body", {}).get("mode") == "raw" and request["body"]["raw"].strip():
+            body = json.loads(substitute(request["body"]["raw"]))
+            if request["url"]["path"][-1] == "image" and "image" not in body:
+                body = {"image": PLACEHOLDER_IMAGE, **{k: v for k, v in body.items() if k != "image_url"}}
+        scenarios.append({
+            "name": item["name"],
+            "method": request["method"],
+            "path": path,
+            "body": body,
+            "weight": 1.0,
+        })
+    return scenarios
+
+
+def apply_mix(scenarios: List[Dict], mix: Optional[str]) -> List[Dict]:
+    """Apply "Name=weight,..." weights; scenarios not listed are dropped"""
+    if not mix:
+        return scenarios
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight or 1)
+    unknown = set(weights) - {s["name"] for s in scenarios}
+    if unknown:
+        raise ValueError(f"Unknown scenarios in mix: {', '.join(sorted(unknown))}")
+    return [dict(s, weight=weights[s["name"]]) for s in scenarios if s["name"] in weights]
+
+
+class Recorder:
+    """Per-scenario latencies, status codes and errors for one load step"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+        self.errors: Dict[str, int] = Counter()
+
+    def record(self, name: str, latency: float, status: Optional[int]) -> None:
+        self.latencies[name].append(latency)
+        if status is None or status >= 500:
+            self.errors[name] += 1
+        self.statuses[name][str(status) if status is not None else "error"] += 1
+
+    def report(self, elapsed: float) -> Dict[str, Dict]:
+        report = {}
+        names = list(self.latencies) + ["total"]
+        for name in names:
+            if name == "total":
+                latencies = [latency for values in self.latencies.values() for latency in values]
+                errors = sum(self.errors.values())
+                statuses = sum(self.statuses.values(), Counter())
+            else:
+                latencies, errors, statuses = self.latencies[name], self.errors[name], self.statuses[name]
+            if not latencies:
+                continue
+            summary = summarize(latencies, elapsed)
+            summary["rps"] = summary.pop("ops_per_sec")
+            summary["error_rate"] = errors / len(latencies)
+            summary["statuses"] = dict(statuses)
+            histogram = Counter()
+            for latency in latencies:
+                ms = latency * 1000
+                bucket = next((f"le_{b}" for b in HISTOGRAM_BUCKETS_MS if ms <= b), "le_inf")
+                histogram[bucket] += 1
+            summary["histogram_ms"] = {
+                bucket: histogram.get(bucket, 0)
+                for bucket in [f"le_{b}" for b in HISTOGRAM_BUCKETS_MS] + ["le_inf"]
+            }
+            report[name] = summary
+        return report
+
+
+async def issue(client, scenario: Dict, recorder: Recorder, headers: Dict[str, str]) -> None:
+    start = time.perf_counter()
+    status = None
+    try:
+        response = await client.request(scenario["method"], scenario["path"], json=scenario["body"], headers=headers)
+        status = response.status_code
+    except Exception:
+        pass
+    recorder.record(scenario["name"], time.perf_counter() - start, status)
+
+
+async def closed_loop(client, scenarios, concurrency: int, duration: float, headers) -> Dict:
+    """Run a fixed number of clients, each issuing requests back to back"""
+    recorder = Recorder()
+    weights = [s["weight"] for s in scenarios]
+    deadline = time.perf_counter() + duration
+
+    async def user():
+        while time.perf_counter() < deadline:
+            await issue(client, random.choices(scenarios, weights)[0], recorder, headers)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return recorder.report(time.perf_counter() - start)
+
+
+async def open_loop(client, scenarios, rate: float, duration: float, max_in_flight: int, headers) -> Dict:
+    """Issue requests with Poisson arrivals at the target rate, regardless of latency"""
+    recorder = Recorder()
+    weights = [s["weight"] for s in scenarios]
+    in_flight = asyncio.Semaphore(max_in_flight)
+    tasks = []
+    dropped = 0
+
+    async def bounded(scenario):
+        try:
+            await issue(client, scenario, recorder, headers)
+        finally:
+            in_flight.release()
+
+    start = time.perf_counter()
+    next_arrival = start
+    while next_arrival < start + duration:
+        await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+        if in_flight.locked():
+            # Arrivals beyond the in-flight cap are counted, not queued client-side
+            dropped += 1
+        else:
+            await in_flight.acquire()
+            tasks.append(asyncio.ensure_future(bounded(random.choices(scenarios, weights)[0])))
+        next_arrival += random.expovariate(rate)
+    await asyncio.gather(*tasks)
+    report = recorder.report(time.perf_counter() - start)
+    if "total" in report:
+        report["total"]["target_rps"] = rate
+        report["total"]["dropped_arrivals"] = dropped
+    return report
+
+
+def prepare_in_process_app(num_products: int):
+    """Import the app wired to offline stand-ins and seeded with sample products"""
+    catalog = tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False)
+    catalog.close()
+    # Settings are read at import time, so configure them before importing the app
+    for key, value in {
+        "EMBEDDING_PROVIDER": "offline",
+        "CHAT_PROVIDER": "offline",
+        "VECTOR_STORE": "memory",
+        "OFFLINE_CATALOG_PATH": catalog.name,
+        # Load comes from one client, so per-client limits would only measure the limiter
+        "RATE_LIMIT_ENABLED": "false",
+    }.items():
+        os.environ.setdefault(key, value)
+
+    from scripts.init_db import generate_products
+
+    random.seed(42)
+    with open(catalog.name, "w", encoding="utf-8") as f:
+        for product in generate_products(num_products):
+            f.write(json.dumps(product) + "\n")
+
+    from app.main import app
+    return app
+
+
+def print_report(label: str, report: Dict[str, Dict]) -> None:
+    print(f"\n== {label}")
+    print(f"{'endpoint':<40}{'rps':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>9}")
+    for name, r in report.items():
+        print(f"{name:<40}{r['rps']:>8.1f}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['error_rate']:>8.1%}")
+
+
+async def run(args) -> List[Dict]:
+    import httpx
+
+    variables = {"base_url": args.base_url or "", "product_id": args.product_id}
+    scenarios = apply_mix(load_scenarios(args.collection, variables), args.mix)
+    headers = {"X-API-Key": args.api_key} if args.api_key else {}
+
+    if args.in_process:
+        app = prepare_in_process_app(args.products)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testserver", timeout=args.timeout)
+    else:
+        client = httpx.AsyncClient(
+            base_url=args.base_url,
+            timeout=args.timeout,
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        )
+
+    steps = []
+    async with client:
+        if args.rate:
+            for rate in [float(r) for r in args.rate.split(",")]:
+                report = await open_loop(client, scenarios, rate, args.duration, args.max_in_flight, headers)
+                print_report(f"open loop at {rate:g} req/s", report)
+                steps.append({"mode": "open", "rate": rate, "endpoints": report})
+        else:
+            for concurrency in [int(c) for c in args.concurrency.split(",")]:
+                report = await closed_loop(client, scenarios, concurrency, args.duration, headers)
+                print_report(f"closed loop with {concurrency} clients", report)
+                steps.append({"mode": "closed", "concurrency": concurrency, "endpoints": report})
+    return steps
+
+
+def find_saturation(steps: List[Dict]) -> Optional[Dict]:
+    """First step where achieved RPS stops tracking the offered load"""
+    previous = None
+    for step in steps:
+        total = step["endpoints"].get("total")
+        if not total:
+            continue
+        if step["mode"] == "open" and total["rps"] < step["rate"] * 0.9:
+            return step
+        if step["mode"] == "closed" and previous and total["rps"] < previous["rps"] * 1.1:
+            return step
+        previous = total
+    return None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Replay the Postman request mix under load")
+    parser.add_argument("--collection", default=os.path.join(ROOT, "postman_collection.json"))
+    parser.add_argument("--base-url", help="Target server, e.g. http://localhost:8000")
+    parser.add_argument("--in-process", action="store_true", help="Drive the ASGI app directly with offline stand-ins")
+    parser.add_argument("--products", type=int, default=1000, help="Catalog size for --in-process")
+    parser.add_argument("--product-id", default="laptop-0", help="Value for {{product_id}}")
+    parser.add_argument("--api-key", default=os.getenv("API_KEY"))
+    parser.add_argument("--mix", help='Scenario weights, e.g. "Search Products=4,Agent Q&A=1"')
+    parser.add_argument("--concurrency", default="1,4,16", help="Closed-loop client counts to step through")
+    parser.add_argument("--rate", help="Open-loop arrival rates (req/s) to step through")
+    parser.add_argument("--max-in-flight", type=int, default=256, help="In-flight cap for open-loop load")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per step")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--output", help="Write step results as JSON to this file")
+    args = parser.parse_args()
+
+    if not args.in_process and not args.base_url:
+        parser.error("either --in-process or --base-url is required")
+
+    steps = asyncio.run(run(args))
+
+    saturated = find_saturation(steps)
+    if saturated:
+        label = f"{saturated['rate']:g} req/s" if saturated["mode"] == "open" else f"{saturated['concurrency']} clients"
+        print(f"\nThroughput stopped scaling at {label}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "steps": steps}, f, indent=2)
+        print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
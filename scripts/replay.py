@@ -0,0 +1,223 @@
+"""
+Replay requests captured by the recorder middleware (RECORDER_ENABLED=true).
+
+Captured requests are re-issued in their original order, either in-process
+against the ASGI app (with the offline stand-ins for OpenAI and Pinecone) or
+against a running server. With --speed 1 the original gaps between requests
+are kept, --speed 2 halves them and --speed 0 sends requests back to back.
+Per-endpoint latency percentiles are reported next to the latencies seen
+when the traffic was captured, and optionally against an earlier replay.
+
+Usage:
+    python scripts/replay.py data/recordings --in-process
+    python scripts/replay.py data/recordings/requests-123.jsonl.1.gz --base-url http://localhost:8000 --speed 4
+    python scripts/replay.py data/recordings --in-process --speed 0 --output after.json \\
+        --baseline before.json --threshold 0.2
+"""
+from typing import Dict, List, Optional
+from collections import defaultdict
+import argparse
+import asyncio
+import glob
+import gzip
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.stats import summarize
+from scripts.load_test import Recorder, prepare_in_process_app, print_report
+
+
+def capture_files(path: str) -> List[str]:
+    """Capture files under a directory (current and rotated), or the file itself"""
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, "*.jsonl")) + glob.glob(os.path.join(path, "*.jsonl.*")))
+    return [path]
+
+
+def load_capture(paths: List[str], limit: Optional[int] = None) -> List[Dict]:
+    """
+    Read captured requests, oldest first
+
+    Requests whose body wasn't stored (too large, or not JSON) are skipped.
+    """
+    records = []
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                if record.get("replayable", True):
+                    records.append(record)
+    records.sort(key=lambda record: record["ts"])
+    return records[:limit] if limit else records
+
+
+def endpoint_name(record: Dict) -> str:
+    return f"{record['method']} {record.get('route') or record['path']}"
+
+
+def schedule(records: List[Dict], speed: float) -> List[float]:
+    """Send offsets in seconds from the start of the replay"""
+    if not records or speed <= 0:
+        return [0.0] * len(records)
+    first = records[0]["ts"]
+    return [(record["ts"] - first) / speed for record in records]
+
+
+def captured_report(records: List[Dict]) -> Dict[str, Dict]:
+    """Latency percentiles as measured by the recorder when the traffic was captured"""
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    for record in records:
+        latencies[endpoint_name(record)].append(record["ms"] / 1000)
+    elapsed = records[-1]["ts"] - records[0]["ts"] if records else 0.0
+    report = {name: summarize(values, elapsed) for name, values in latencies.items()}
+    if records:
+        report["total"] = summarize([record["ms"] / 1000 for record in records], elapsed)
+    return report
+
+
+async def replay(client, records: List[Dict], speed: float, concurrency: int, headers: Dict[str, str]) -> Dict:
+    """
+    Re-issue captured requests at their (scaled) original times
+
+    Args:
+        client: httpx.AsyncClient for the target
+        records: Captured requests, oldest first
+        speed: Time scale; 0 sends requests as fast as concurrency allows
+        concurrency: Requests in flight at once; later requests wait for a slot
+        headers: Extra headers sent with every request, e.g. the API key
+
+    Returns:
+        Per-endpoint report, plus how late requests started against the schedule
+    """
+    recorder = Recorder()
+    slots = asyncio.Semaphore(max(1, concurrency))
+    lateness: List[float] = []
+
+    async def send(record: Dict, offset: float, start: float) -> None:
+        await asyncio.sleep(max(0.0, start + offset - time.perf_counter()))
+        async with slots:
+            lateness.append(time.perf_counter() - start - offset)
+            url = record["path"] + (f"?{record['query']}" if record.get("query") else "")
+            sent = time.perf_counter()
+            status = None
+            try:
+                response = await client.request(
+                    record["method"],
+                    url,
+                    json=record.get("body"),
+                    headers={**record.get("headers", {}), **headers}
+                )
+                status = response.status_code
+            except Exception:
+                pass
+            recorder.record(endpoint_name(record), time.perf_counter() - sent, status)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(send(record, offset, start) for record, offset in zip(records, schedule(records, speed))))
+    report = recorder.report(time.perf_counter() - start)
+    if "total" in report and speed > 0:
+        report["total"]["p95_start_lag_ms"] = summarize(lateness, 1.0)["p95_ms"]
+    return report
+
+
+def compare_p95(current: Dict[str, Dict], reference: Dict[str, Dict]) -> Dict[str, Dict]:
+    """p95 of each endpoint present in both reports, with the relative change"""
+    comparison = {}
+    for name, summary in current.items():
+        if name not in reference:
+            continue
+        before, after = reference[name]["p95_ms"], summary["p95_ms"]
+        comparison[name] = {
+            "before_ms": before,
+            "after_ms": after,
+            "change": (after - before) / before if before > 0 else 0.0,
+        }
+    return comparison
+
+
+def print_comparison(label: str, comparison: Dict[str, Dict]) -> None:
+    print(f"\n== p95 {label}")
+    print(f"{'endpoint':<40}{'before ms':>11}{'after ms':>11}{'change':>9}")
+    for name, c in comparison.items():
+        print(f"{name:<40}{c['before_ms']:>11.1f}{c['after_ms']:>11.1f}{c['change']:>+9.1%}")
+
+
+async def run(args, records: List[Dict]) -> Dict[str, Dict]:
+    import httpx
+
+    headers = {"X-API-Key": args.api_key} if args.api_key else {}
+    if args.in_process:
+        app = prepare_in_process_app(args.products)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testserver", timeout=args.timeout)
+    else:
+        client = httpx.AsyncClient(
+            base_url=args.base_url,
+            timeout=args.timeout,
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        )
+    async with client:
+        return await replay(client, records, args.speed, args.concurrency, headers)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Replay captured requests and compare latencies")
+    parser.add_argument("capture", help="Capture file (.jsonl or rotated .gz) or the recorder directory")
+    parser.add_argument("--base-url", help="Target server, e.g. http://localhost:8000")
+    parser.add_argument("--in-process", action="store_true", help="Drive the ASGI app directly with offline stand-ins")
+    parser.add_argument("--products", type=int, default=1000, help="Catalog size for --in-process")
+    parser.add_argument("--speed", type=float, default=1.0, help="Time scale; 1 keeps original pacing, 0 is as fast as possible")
+    parser.add_argument("--concurrency", type=int, default=64, help="Cap on requests in flight")
+    parser.add_argument("--limit", type=int, help="Replay only the first N requests")
+    parser.add_argument("--api-key", default=os.getenv("API_KEY"))
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--output", help="Write the replay report as JSON to this file")
+    parser.add_argument("--baseline", help="Report from an earlier --output to compare p95 against")
+    parser.add_argument("--threshold", type=float, help="Exit 1 if any endpoint's p95 exceeds the baseline by this fraction")
+    args = parser.parse_args()
+
+    if not args.in_process and not args.base_url:
+        parser.error("either --in-process or --base-url is required")
+    if args.threshold is not None and not args.baseline:
+        parser.error("--threshold requires --baseline")
+
+    records = load_capture(capture_files(args.capture), args.limit)
+    if not records:
+        print(f"No replayable requests in {args.capture}")
+        return 1
+    print(f"Replaying {len(records)} requests at speed {args.speed:g}")
+
+    captured = captured_report(records)
+    report = asyncio.run(run(args, records))
+    print_report("replay", report)
+    print_comparison("captured -> replayed", compare_p95(report, captured))
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["endpoints"]
+        comparison = compare_p95(report, baseline)
+        print_comparison("baseline -> replayed", comparison)
+        if args.threshold is not None:
+            regressions = [name for name, c in comparison.items() if c["change"] > args.threshold]
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "captured": captured, "endpoints": report}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if regressions:
+        print(f"\np95 regressed by more than {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+import asyncio
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import Response
+from app.core import compression, conditional
+from app.core.compression import CompressionMiddleware, negotiate_encoding
+from app.core.conditional import make_etag, match_if_none_match
+
+BODY = b'[' + b",".join(b'{"id":"p-%d","score":0.5,"metadata":{"name":"Laptop"}}' % i for i in range(100)) + b']'
+
+def make_app():
+    app = FastAPI()
+
+    @app.get("/large")
+    async def large():
+        return Response(content=BODY, media_type="application/json", headers={"ETag": '"abc"'})
+
+    @app.get("/small")
+    async def small():
+        return Response(content=b"[]", media_type="application/json")
+
+    @app.get("/image")
+    async def image():
+        return Response(content=b"\x89PNG" * 1000, media_type="image/png")
+
+    return CompressionMiddleware(app, minimum_size=1024, enabled=True)
+
+def fetch(app, path, accept_encoding):
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            return await client.get(path, headers={"accept-encoding": accept_encoding})
+    return asyncio.run(run())
+
+def test_negotiate_encoding_respects_quality():
+    assert negotiate_encoding("gzip, br", ["br", "gzip"]) == "br"
+    assert negotiate_encoding("br;q=0.5, gzip", ["br", "gzip"]) == "gzip"
+    assert negotiate_encoding("*;q=0, identity", ["br", "gzip"]) is None
+    assert negotiate_encoding("", ["gzip"]) is None
+
+def test_large_json_is_gzipped_with_encoded_etag(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    response = fetch(make_app(), "/large", "gzip")
+    assert response.headers["content-encoding"] == "gzip"
+    assert int(response.headers["content-length"]) < len(BODY)
+    assert response.headers["etag"] == '"abc-gzip"'
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.content == BODY
+
+def test_small_and_binary_responses_are_not_compressed():
+    app = make_app()
+    small = fetch(app, "/small", "gzip")
+    assert "content-encoding" not in small.headers
+    assert small.headers["vary"] == "Accept-Encoding"
+    assert "content-encoding" not in fetch(app, "/image", "gzip").headers
+    assert "content-encoding" not in fetch(app, "/large", "identity").headers
+
+def test_etags_follow_catalog_version(monkeypatch):
+    """Test that ETags change with the catalog and match compressed and weak forms"""
+    monkeypatch.setattr(conditional.settings, "CATALOG_VERSION", "v1")
+    etag = make_etag("similar", "laptop-1", None, 3, None)
+    assert etag == make_etag("similar", "laptop-1", None, 3, None)
+    assert etag != make_etag("similar", "laptop-1", None, 5, None)
+
+    assert match_if_none_match(etag, etag) == etag
+    assert match_if_none_match(f'"other", W/{etag[:-1]}-br"', etag) == f'W/{etag[:-1]}-br"'
+    assert match_if_none_match("*", etag) == etag
+    assert match_if_none_match('"other"', etag) is None
+
+    monkeypatch.setattr(conditional.settings, "CATALOG_VERSION", "v2")
+    assert match_if_none_match(etag, make_etag("similar", "laptop-1", None, 3, None)) is None
+
+def test_etags_follow_ranking_settings(monkeypatch):
+    """Test that changing how results are ranked invalidates ETags"""
+    monkeypatch.setattr(conditional.settings, "CATALOG_VERSION", "v1")
+    etag = make_etag("search", {"query": "laptop"})
+    monkeypatch.setattr(conditional.settings, "LEXICAL_WEIGHT", conditional.settings.LEXICAL_WEIGHT + 0.1)
+    assert make_etag("search", {"query": "laptop"}) != etag
+
+def test_no_etag_without_catalog_version(monkeypatch, tmp_path):
+    """Test that ETags need CATALOG_VERSION unless a local index is served"""
+    monkeypatch.setattr(conditional.settings, "CATALOG_VERSION", "")
+    monkeypatch.setattr(conditional.settings, "VECTOR_STORE", "pinecone")
+    checkpoint = tmp_path / "checkpoint.db"
+    checkpoint.write_bytes(b"SQLite format 3\x00")
+    monkeypatch.setattr(conditional.settings, "INGEST_CHECKPOINT_PATH", str(checkpoint))
+    assert make_etag("similar", "laptop-1") is None
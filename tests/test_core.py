@@ -102,4 +102,72 @@ def test_error_handling(search):
         
         # Test invalid category
         with pytest.raises(ValueError):
-            search.search("test query", category="invalid_category") 
\ No newline at end of file
+            search.search("test query", category="invalid_category") 
+
+def test_reciprocal_rank_fusion():
+    from app.core.fusion import reciprocal_rank_fusion
+
+    text = [{"id": "a", "score": 0.9}, {"id": "b", "score": 0.8}]
+    image = [{"id": "b", "score": 0.3}, {"id": "c", "score": 0.2}]
+
+    fused = reciprocal_rank_fusion([text, image])
+    assert [r["id"] for r in fused] == ["b", "a", "c"]
+
+    # Zeroing the image weight falls back to the text ranking
+    fused = reciprocal_rank_fusion([text, image], weights=[1.0, 0.0])
+    assert fused[0]["id"] == "a"
+
+def test_weighted_score_fusion():
+    from app.core.fusion import fuse
+
+    text = [{"id": "a", "score": 0.9}, {"id": "b", "score": 0.5}]
+    image = [{"id": "b", "score": 30.0}, {"id": "a", "score": 10.0}]
+
+    fused = fuse([text, image], weights=[1.0, 0.5], method="weighted")
+    assert fused[0]["id"] == "a"
+    assert fused[0]["score"] == pytest.approx(1.0)
+
+    with pytest.raises(ValueError):
+        fuse([text, image], method="unknown")
+
+def test_bm25_exact_spec_matching():
+    from app.core.lexical import BM25Index, tokenize
+
+    assert tokenize("5000mAh Battery") == ["5000mah", "5000", "mah", "battery"]
+
+    index = BM25Index.from_products([
+        {"id": "p1", "name": "Galaxy Phone", "description": "Powerful 5000mAh battery",
+         "features": ["5000mAh Battery"], "category": "smartphones", "price": 700},
+        {"id": "p2", "name": "Pixel Phone", "description": "Powerful 4000mAh battery",
+         "features": ["4000mAh Battery"], "category": "smartphones", "price": 600},
+        {"id": "a1", "name": "Sony Headphones", "description": "LDAC connectivity",
+         "features": ["LDAC"], "category": "audio", "price": 300},
+    ])
+
+    assert index.search("phone with 5000 mAh")[0]["id"] == "p1"
+    assert [r["id"] for r in index.search("LDAC")] == ["a1"]
+    assert index.search("LDAC", predicate=lambda p: p["category"] == "smartphones") == []
+
+def test_bm25_writer_spills_and_merges(tmp_path):
+    """Test that an index built on disk in chunks ranks like one built in memory"""
+    from app.core.lexical import BM25Index, BM25Writer
+
+    products = [
+        {"id": f"p{i}", "name": f"Phone {i}", "description": f"{4000 + i * 500}mAh battery",
+         "features": ["OLED"] if i % 2 else ["LCD"], "category": "smartphones", "brand": "Acme", "price": 500 + i}
+        for i in range(7)
+    ]
+    path = str(tmp_path / "lexical")
+    writer = BM25Writer(path, chunk_size=2)
+    for product in products:
+        writer.add(product)
+    writer.close()
+
+    loaded = BM25Index.load(path)
+    in_memory = BM25Index.from_products(products)
+    for query in ("oled phone", "5000mah", "phone 3"):
+        assert loaded.search(query, top_k=5) == pytest.approx(in_memory.search(query, top_k=5))
+    assert loaded.values("brand") == {"Acme"}
+    # Only filter columns are kept per product
+    assert loaded.columns[0] == {"category": "smartphones", "brand": "Acme", "price": 500}
+    assert [hit["id"] for hit in loaded.search("oled", predicate=lambda row: row["price"] > 504)] == ["p5"]
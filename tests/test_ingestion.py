@@ -0,0 +1,189 @@
+import pytest
+import json
+from unittest.mock import MagicMock
+from app.core.embeddings import shorten_embedding
+from app.core.ingestion import IngestionPipeline, batch_by_tokens, content_hash, retry_with_backoff
+
+def make_products(n):
+    return [{
+        "id": f"laptop-{i}",
+        "name": f"Laptop {i}",
+        "description": "Gaming laptop with NVIDIA RTX 3070",
+        "brand": "ASUS",
+        "category": "laptops",
+        "features": ["16GB RAM", "Wi-Fi 6"],
+        "price": 1000 + i
+    } for i in range(n)]
+
+def fake_openai_client():
+    client = MagicMock()
+
+    def create(model, input):
+        response = MagicMock()
+        response.data = [MagicMock(index=i, embedding=[float(len(text)), 1.0]) for i, text in enumerate(input)]
+        return response
+
+    client.embeddings.create.side_effect = create
+    return client
+
+def test_batch_by_tokens():
+    items = [({"id": str(i)}, "x" * 40) for i in range(10)]  # ~11 tokens each
+    batches = list(batch_by_tokens(items, max_tokens=25, max_items=100))
+    assert [len(b) for b in batches] == [2, 2, 2, 2, 2]
+
+    batches = list(batch_by_tokens(items, max_tokens=10_000, max_items=4))
+    assert [len(b) for b in batches] == [4, 4, 2]
+
+def test_retry_with_backoff():
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise ConnectionError("rate limited")
+        return "ok"
+
+    assert retry_with_backoff(flaky, (ConnectionError,), base_delay=0) == "ok"
+    assert len(calls) == 3
+
+    def always_fails():
+        raise ConnectionError("rate limited")
+
+    with pytest.raises(ConnectionError):
+        retry_with_backoff(always_fails, (ConnectionError,), max_retries=1, base_delay=0)
+
+def test_pipeline_batches_and_upserts():
+    client = fake_openai_client()
+    index = MagicMock()
+    pipeline = IngestionPipeline(client, index, max_batch_size=8, upsert_batch_size=5)
+
+    stats = pipeline.run(make_products(20))
+
+    assert stats.upserted == 20
+    assert client.embeddings.create.call_count == 3
+    upserted = [v["id"] for call in index.upsert.call_args_list for v in call.kwargs["vectors"]]
+    assert sorted(upserted) == sorted(p["id"] for p in make_products(20))
+
+def test_pipeline_resumes_from_checkpoint(tmp_path):
+    checkpoint = str(tmp_path / "checkpoint.db")
+    index = MagicMock()
+    index.upsert.side_effect = [None, RuntimeError("interrupted")] + [None] * 10
+
+    pipeline = IngestionPipeline(fake_openai_client(), index, max_batch_size=5, upsert_batch_size=5,
+                                 embed_workers=1, upsert_workers=1, max_retries=0, checkpoint_path=checkpoint)
+    with pytest.raises(RuntimeError):
+        pipeline.run(make_products(20))
+
+    client = fake_openai_client()
+    resumed = IngestionPipeline(client, index, max_batch_size=5, upsert_batch_size=5, checkpoint_path=checkpoint)
+    stats = resumed.run(make_products(20))
+
+    assert stats.skipped >= 5
+    assert stats.skipped + stats.upserted == 20
+
+def test_checkpoint_commits_only_on_save(tmp_path):
+    from app.core.ingestion import Checkpoint
+
+    path = str(tmp_path / "checkpoint.db")
+    checkpoint = Checkpoint(path)
+    checkpoint.mark_done([("laptop-1", "t1", "m1", "products")])
+    checkpoint.save()
+    checkpoint.mark_done([("laptop-2", "t2", "m2", "products")])
+    assert "laptop-2" in checkpoint and len(checkpoint) == 2
+
+    # Rows marked since the last save are uncommitted and lost on a crash
+    reopened = Checkpoint(path)
+    assert reopened.get("laptop-1") == ("t1", "m1", "products")
+    assert "laptop-2" not in reopened
+
+def test_incremental_sync_skips_unchanged_and_updates_metadata(tmp_path):
+    checkpoint = str(tmp_path / "checkpoint.db")
+    index = MagicMock()
+    products = make_products(10)
+    IngestionPipeline(fake_openai_client(), index, checkpoint_path=checkpoint).run(products)
+
+    products[0]["price"] = 999       # metadata-only change
+    products[1]["stock"] = 3         # metadata-only change
+    products[2]["description"] = "Refreshed model with OLED display"  # text change
+
+    client = fake_openai_client()
+    stats = IngestionPipeline(client, index, checkpoint_path=checkpoint).run(products)
+
+    assert (stats.upserted, stats.updated, stats.skipped) == (1, 2, 7)
+    assert client.embeddings.create.call_count == 1
+    assert len(client.embeddings.create.call_args.kwargs["input"]) == 1
+    updated = {call.kwargs["id"] for call in index.update.call_args_list}
+    assert updated == {"laptop-0", "laptop-1"}
+
+def test_switching_to_sharding_moves_checkpointed_products(tmp_path):
+    """Test that a checkpoint from an unsharded load doesn't skip products that must move shard"""
+    from app.core.offline import InMemoryIndex, OfflineOpenAI
+
+    client = OfflineOpenAI(dimensions=16)
+    index = InMemoryIndex()
+    products = make_products(4)
+    pipeline = IngestionPipeline(client, index, checkpoint_path=str(tmp_path / "checkpoint.db"))
+    pipeline.run(products)
+
+    # A JSON checkpoint from before namespaces were recorded is converted, its
+    # entries assumed to be in the base namespace
+    checkpoint = str(tmp_path / "checkpoint.json")
+    legacy = {product["id"]: list(pipeline.checkpoint.get(product["id"])[:2]) for product in products}
+    with open(checkpoint, "w", encoding="utf-8") as f:
+        json.dump({"products": legacy}, f)
+
+    stats = IngestionPipeline(client, index, checkpoint_path=checkpoint, shard_by_category=True).run(products)
+    assert (stats.upserted, stats.skipped) == (4, 0)
+    namespaces = index.describe_index_stats()["namespaces"]
+    assert namespaces["products-laptops"]["vector_count"] == 4
+    assert namespaces.get("products", {"vector_count": 0})["vector_count"] == 0
+
+    stats = IngestionPipeline(client, index, checkpoint_path=checkpoint, shard_by_category=True).run(products)
+    assert stats.skipped == 4
+
+def test_shortened_embeddings(tmp_path):
+    import numpy as np
+    from app.core.offline import InMemoryIndex, OfflineOpenAI
+    from app.core.search import HybridSearch
+
+    short = shorten_embedding([3.0, 4.0, 12.0], 2)
+    assert np.allclose(short, [0.6, 0.8])
+    assert shorten_embedding([0.6, 0.8], 2) == [0.6, 0.8]
+    assert shorten_embedding([1.0, 0.0], None) == [1.0, 0.0]
+    # Changing the size re-embeds everything
+    assert content_hash("text", 256) != content_hash("text") == content_hash("text", 0)
+
+    client = OfflineOpenAI(dimensions=128)
+    index = InMemoryIndex()
+    IngestionPipeline(client, index, namespace="products", dimensions=32).run(make_products(5))
+    assert len(index.fetch(ids=["laptop-0"], namespace="products").vectors["laptop-0"].values) == 32
+
+    search = HybridSearch(index=index, openai_client=client, lexical_index=None, dimensions=32)
+    assert len(search._get_embedding("gaming laptop")) == 32
+    assert len(search.search("gaming laptop", top_k=3, infer_filters=False)) == 3
+
+def test_catalog_loader_streams_and_validates(tmp_path):
+    from app.core.catalog import CatalogLoader
+
+    jsonl = tmp_path / "catalog.jsonl"
+    rows = make_products(5) + [{"id": "bad-1", "name": "No price", "category": "laptops"}]
+    jsonl.write_text("\n".join(json.dumps(row) for row in rows))
+
+    loader = CatalogLoader(str(jsonl), chunk_size=2)
+    assert [len(chunk) for chunk in loader.chunks()] == [2, 2, 1]
+    assert (loader.loaded, loader.invalid) == (5, 1)
+
+    csv_path = tmp_path / "catalog.csv"
+    csv_path.write_text(
+        "id,name,description,brand,category,price,features\n"
+        "audio-1,Sony WH Pro,Noise cancelling,Sony,Audio,349.99,LDAC|30 hours\n"
+        "audio-2,Bad Category,Speaker,JBL,speakers,99,Bluetooth 5.3\n"
+    )
+    products = list(CatalogLoader(str(csv_path)))
+    assert len(products) == 1
+    assert products[0]["category"] == "audio"
+    assert products[0]["price"] == 349.99
+    assert products[0]["features"] == ["LDAC", "30 hours"]
+
+    with pytest.raises(ValueError):
+        CatalogLoader(str(tmp_path / "catalog.xml"))
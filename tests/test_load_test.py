@@ -0,0 +1,13 @@
+from scripts.load_test import apply_mix, load_scenarios
+
+def test_load_test_scenarios_from_postman_collection():
+    """Test that the load generator replays the Postman request mix"""
+    scenarios = load_scenarios("postman_collection.json", {"base_url": "", "product_id": "laptop-1"})
+    by_name = {s["name"]: s for s in scenarios}
+
+    assert by_name["Search Products"]["path"] == "/api/search"
+    assert by_name["Get Similar Products"]["path"] == "/api/similar/laptop-1?top_k=3"
+    assert "image" in by_name["Image Search"]["body"]
+
+    mixed = apply_mix(scenarios, "Search Products=4,Agent Q&A=1")
+    assert [(s["name"], s["weight"]) for s in mixed] == [("Search Products", 4.0), ("Agent Q&A", 1.0)]
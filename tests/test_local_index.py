@@ -0,0 +1,114 @@
+import os
+import numpy as np
+import pytest
+from app.core.ingestion import IngestionPipeline
+from app.core.local_index import LocalIndex, current_version, load_index, publish_index
+from app.core.offline import InMemoryIndex, OfflineOpenAI
+from app.core.resilience import ResilientIndex
+from app.core.search import HybridSearch
+
+PRODUCTS = [
+    {"id": "laptop-1", "name": "ASUS Gaming Laptop", "description": "Gaming laptop with NVIDIA RTX 3070 graphics",
+     "brand": "ASUS", "category": "laptops", "features": ["NVIDIA RTX 3070", "Up to 8 hours"], "price": 1800},
+    {"id": "laptop-2", "name": "Dell Business Laptop", "description": "Lightweight business laptop for the office",
+     "brand": "Dell", "category": "laptops", "features": ["Fingerprint Reader", "Up to 20 hours"], "price": 1100},
+    {"id": "phone-1", "name": "Samsung Galaxy Phone", "description": "Smartphone with great night mode camera",
+     "brand": "Samsung", "category": "smartphones", "features": ["5G", "5000mAh Battery"], "price": 900},
+    {"id": "audio-1", "name": "Sony Wireless Headphones", "description": "Noise cancelling headphones for the gym",
+     "brand": "Sony", "category": "audio", "features": ["LDAC", "Sweat resistant"], "price": 300},
+]
+
+@pytest.fixture
+def client():
+    return OfflineOpenAI(dimensions=64)
+
+@pytest.fixture
+def memory_index(client):
+    index = InMemoryIndex()
+    IngestionPipeline(client, index, namespace="products").run(PRODUCTS)
+    return index
+
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_local_index_matches_in_memory_index(tmp_path, client, memory_index, dtype):
+    """Test that queries against the mapped files agree with the index they were written from"""
+    publish_index(memory_index, str(tmp_path), dtype=dtype)
+    local = LocalIndex(str(tmp_path))
+    vector = client.embeddings.create(model="m", input="gaming laptop").data[0].embedding
+
+    filters = [
+        None,
+        {"category": {"$eq": "laptops"}, "price": {"$gte": 1000, "$lte": 2000}},
+        {"id": {"$ne": "laptop-1"}},
+        {"features": {"$in": ["LDAC"]}},
+        {"$or": [{"price": {"$lt": 500}}, {"brand": "Dell"}]},
+    ]
+    for filter in filters:
+        expected = memory_index.query(vector=vector, top_k=3, include_metadata=True, namespace="products", filter=filter)
+        actual = local.query(vector=vector, top_k=3, include_metadata=True, namespace="products", filter=filter)
+        assert [m.id for m in actual.matches] == [m.id for m in expected.matches]
+        assert [m.metadata for m in actual.matches] == [m.metadata for m in expected.matches]
+        assert np.allclose([m.score for m in actual.matches], [m.score for m in expected.matches], atol=1e-2)
+
+    fetched = local.fetch(ids=["phone-1", "missing"], namespace="products")
+    assert list(fetched.vectors) == ["phone-1"]
+    assert fetched.vectors["phone-1"].metadata["brand"] == "Samsung"
+
+@pytest.mark.parametrize("quantization", ["int8", "pq"])
+def test_quantized_index_rescores_at_full_precision(tmp_path, quantization):
+    """Test that scanning compressed codes and re-scoring finds the exact top results with exact scores"""
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(20, 64))
+    vectors = centers[rng.integers(0, 20, 2000)] + 0.5 * rng.normal(size=(2000, 64))
+    index = InMemoryIndex()
+    index.upsert(
+        vectors=[{"id": str(i), "values": vector, "metadata": {"price": i}} for i, vector in enumerate(vectors)],
+        namespace="products"
+    )
+    exact_root, quantized_root = str(tmp_path / "exact"), str(tmp_path / "quantized")
+    publish_index(index, exact_root)
+    publish_index(index, quantized_root, quantization=quantization, pq_subspaces=16)
+    exact, quantized = LocalIndex(exact_root), LocalIndex(quantized_root)
+
+    codes = quantized._snapshot.namespaces["products"].codes
+    assert codes.nbytes * (4 if quantization == "int8" else 16) == vectors.size * 4
+
+    recalls = []
+    for query in vectors[rng.integers(0, 2000, 20)] + 0.2 * rng.normal(size=(20, 64)):
+        expected = exact.query(vector=query, top_k=10, namespace="products", filter={"price": {"$lt": 1500}}).matches
+        actual = quantized.query(vector=query, top_k=10, namespace="products", filter={"price": {"$lt": 1500}}).matches
+        assert all(m.metadata is None and int(m.id) < 1500 for m in actual)
+        expected_scores = {m.id: m.score for m in expected}
+        assert all(abs(m.score - expected_scores[m.id]) < 1e-5 for m in actual if m.id in expected_scores)
+        recalls.append(len({m.id for m in actual} & set(expected_scores)) / 10)
+    assert np.mean(recalls) >= 0.95
+
+def test_new_version_is_swapped_in_without_reopening(tmp_path, client, memory_index):
+    root = str(tmp_path)
+    first = publish_index(memory_index, root)
+    local = LocalIndex(root, refresh_interval=0)
+    search = HybridSearch(index=local, openai_client=client)
+    assert search.get_product("laptop-1")["price"] == 1800
+
+    updated = load_index(root)
+    updated.update(id="laptop-1", set_metadata={"price": 1500}, namespace="products")
+    second = publish_index(updated, root, keep=1)
+
+    assert current_version(root) == second
+    assert search.get_product("laptop-1")["price"] == 1500
+    assert local.version == second
+    # Older versions beyond `keep` are removed
+    assert not os.path.exists(os.path.join(root, first))
+
+def test_local_index_serves_as_fallback(tmp_path, memory_index):
+    class Down:
+        def query(self, **kwargs):
+            raise ConnectionError("primary down")
+
+    publish_index(memory_index, str(tmp_path))
+    index = ResilientIndex(Down(), fallback_index=LocalIndex(str(tmp_path)), hedge_budget=0)
+    results = index.query(vector=[1.0] * 64, top_k=2, namespace="products")
+    assert len(results.matches) == 2
+
+def test_missing_index_raises(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        LocalIndex(str(tmp_path))
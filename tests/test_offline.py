@@ -0,0 +1,164 @@
+import pytest
+from app.core.ingestion import IngestionPipeline
+from app.core.lexical import BM25Index
+from app.core.offline import InMemoryIndex, OfflineOpenAI, matches_filter
+from app.core.search import HybridSearch
+
+PRODUCTS = [
+    {"id": "laptop-1", "name": "ASUS Gaming Laptop", "description": "Gaming laptop with NVIDIA RTX 3070 graphics",
+     "brand": "ASUS", "category": "laptops", "features": ["NVIDIA RTX 3070", "Up to 8 hours"], "price": 1800},
+    {"id": "laptop-2", "name": "Dell Business Laptop", "description": "Lightweight business laptop for the office",
+     "brand": "Dell", "category": "laptops", "features": ["Fingerprint Reader", "Up to 20 hours"], "price": 1100},
+    {"id": "phone-1", "name": "Samsung Galaxy Phone", "description": "Smartphone with great night mode camera",
+     "brand": "Samsung", "category": "smartphones", "features": ["5G", "5000mAh Battery"], "price": 900},
+    {"id": "audio-1", "name": "Sony Wireless Headphones", "description": "Noise cancelling headphones for the gym",
+     "brand": "Sony", "category": "audio", "features": ["LDAC", "Sweat resistant"], "price": 300},
+]
+
+@pytest.fixture
+def offline_search():
+    client = OfflineOpenAI(dimensions=256)
+    index = InMemoryIndex()
+    IngestionPipeline(client, index, namespace="products").run(PRODUCTS)
+    return HybridSearch(index=index, openai_client=client)
+
+def test_hashing_embeddings_are_deterministic():
+    client = OfflineOpenAI(dimensions=64)
+    first = client.embeddings.create(model="m", input="gaming laptop").data[0].embedding
+    second = client.embeddings.create(model="m", input=["gaming laptop"]).data[0].embedding
+    assert len(first) == 64
+    assert first == second
+
+def test_offline_chat_completion_latency():
+    import time
+    client = OfflineOpenAI(chat_latency=0.05)
+    start = time.perf_counter()
+    response = client.chat.completions.create(model="gpt-3.5-turbo", messages=[{"role": "user", "content": "hi"}])
+    assert time.perf_counter() - start >= 0.05
+    assert "hi" in response.choices[0].message.content
+
+def test_metadata_filters():
+    product = {"id": "p", "category": "laptops", "price": 1000, "features": ["5G", "LDAC"]}
+    assert matches_filter(product, {"category": {"$eq": "laptops"}, "price": {"$gte": 500, "$lte": 1500}})
+    assert not matches_filter(product, {"id": {"$ne": "p"}})
+    assert matches_filter(product, {"features": {"$in": ["LDAC"]}})
+    assert matches_filter(product, {"$or": [{"price": {"$lt": 10}}, {"category": "laptops"}]})
+
+def test_search_offline(offline_search):
+    results = offline_search.search("gaming laptop rtx", category="laptops", max_price=2000, top_k=2)
+    assert results[0]["id"] == "laptop-1"
+    assert all(r["metadata"]["category"] == "laptops" for r in results)
+
+    results = offline_search.search("laptop", min_price=1200, top_k=5)
+    assert [r["id"] for r in results] == ["laptop-1"]
+
+def test_recommend_similar_offline(offline_search):
+    assert offline_search.get_product("phone-1")["brand"] == "Samsung"
+    similar = offline_search.recommend_similar("laptop-1", top_k=2)
+    assert len(similar) == 2
+    assert "laptop-1" not in [r["id"] for r in similar]
+
+def test_field_projection(offline_search):
+    """Test that fields trims metadata after re-ranking without changing the index copy"""
+    results = offline_search.search("gaming laptop rtx", category="laptops", top_k=2, fields=("name", "price", "missing"))
+    assert results[0]["id"] == "laptop-1"
+    assert all(set(r["metadata"]) == {"name", "price"} for r in results)
+    assert "description" in offline_search.get_product("laptop-1")
+
+    similar = offline_search.recommend_similar("laptop-1", top_k=2, fields=("name",))
+    assert all(list(r["metadata"]) == ["name"] for r in similar)
+
+def test_inferred_filters(offline_search):
+    """Test that category and price read from the query filter results unless explicitly overridden"""
+    results = offline_search.search("laptop under $1500", top_k=5, infer_filters=True)
+    assert [r["id"] for r in results] == ["laptop-2"]
+
+    # Explicit filters win over inferred ones
+    results = offline_search.search("laptop under $1500", max_price=2000, top_k=5, infer_filters=True)
+    assert {r["id"] for r in results} == {"laptop-1", "laptop-2"}
+
+    # Filters that exclude everything fall back to the plain query
+    results = offline_search.search("headphones under $10", top_k=5, infer_filters=True)
+    assert results
+
+    # Inference is opt-in
+    results = offline_search.search("laptop under $1500", top_k=5)
+    assert len(results) > 1
+
+    # Brands come from the lexical index's catalog
+    search = HybridSearch(
+        index=offline_search.index,
+        openai_client=offline_search.openai_client,
+        lexical_index=BM25Index.from_products(PRODUCTS)
+    )
+    assert [r["id"] for r in search.search("dell laptop", top_k=5, infer_filters=True)] == ["laptop-2"]
+
+def test_category_sharding_matches_single_namespace(offline_search):
+    """Test that sharded search routes by category and fans out otherwise, with the same results"""
+    client = OfflineOpenAI(dimensions=256)
+    index = InMemoryIndex()
+    pipeline = IngestionPipeline(client, index, namespace="products", shard_by_category=True)
+    pipeline.run(PRODUCTS)
+    assert index.describe_index_stats()["namespaces"]["products-laptops"]["vector_count"] == 2
+    sharded = HybridSearch(index=index, openai_client=client, sharded=True)
+
+    for kwargs in ({"category": "laptops", "max_price": 2000}, {}):
+        expected = offline_search.search("gaming laptop rtx", top_k=3, **kwargs)
+        actual = sharded.search("gaming laptop rtx", top_k=3, **kwargs)
+        assert [r["id"] for r in actual] == [r["id"] for r in expected]
+    assert [r["id"] for r in sharded.recommend_similar("laptop-1", top_k=2)] == \
+        [r["id"] for r in offline_search.recommend_similar("laptop-1", top_k=2)]
+
+    # A product moved to another category leaves its old shard
+    moved = dict(PRODUCTS[3], category="smartphones")
+    pipeline.run([moved])
+    assert index.fetch(ids=["audio-1"], namespace="products-audio").vectors == {}
+    assert sharded.get_product("audio-1")["category"] == "smartphones"
+
+def test_sharded_lookups_fetch_from_the_product_shard():
+    """Test that a product is fetched from its category's shard, falling back to all shards once it moves"""
+    client = OfflineOpenAI(dimensions=256)
+    index = InMemoryIndex()
+    pipeline = IngestionPipeline(client, index, namespace="products", shard_by_category=True)
+    pipeline.run(PRODUCTS)
+    sharded = HybridSearch(index=index, openai_client=client, lexical_index=BM25Index.from_products(PRODUCTS), sharded=True)
+    fetched = []
+    fetch = index.fetch
+    index.fetch = lambda ids, namespace="": fetched.append(namespace) or fetch(ids=ids, namespace=namespace)
+
+    assert sharded.get_product("laptop-1")["name"] == "ASUS Gaming Laptop"
+    assert fetched == ["products-laptops"]
+
+    # The lexical index still has the old category until it is rebuilt
+    pipeline.run([dict(PRODUCTS[3], category="smartphones")])
+    fetched.clear()
+    assert sharded.get_product("audio-1")["category"] == "smartphones"
+    assert fetched[0] == "products-audio"
+    assert sorted(fetched[1:]) == sorted(sharded.shards.values())
+
+def test_search_stage_metrics(offline_search):
+    """Test that search stages are timed and rendered in Prometheus format"""
+    from app.core.metrics import SEARCH_STAGE_SECONDS, registry
+
+    offline_search.search("gaming laptop", top_k=3)
+    assert sum(SEARCH_STAGE_SECONDS.labels("embed").counts) >= 1
+    assert sum(SEARCH_STAGE_SECONDS.labels("rerank").counts) >= 1
+
+    rendered = registry.render()
+    assert "# TYPE search_stage_duration_seconds histogram" in rendered
+    assert 'search_stage_duration_seconds_bucket{stage="vector_query",le="+Inf"}' in rendered
+
+def test_metrics_disabled_is_noop():
+    """Test that stage timers are shared no-ops when metrics are disabled"""
+    from app.core import metrics
+
+    enabled = metrics.registry.enabled
+    metrics.registry.enabled = False
+    try:
+        assert metrics.time_stage("embed") is metrics.time_stage("rerank")
+        before = sum(metrics.SEARCH_STAGE_SECONDS.labels("noop").counts)
+        with metrics.time_stage("noop"):
+            pass
+        assert sum(metrics.SEARCH_STAGE_SECONDS.labels("noop").counts) == before
+    finally:
+        metrics.registry.enabled = enabled
@@ -1,21 +1,26 @@
 import pytest
-import time
-from app.core.search import HybridSearch
-from app.core.config import get_settings
+from concurrent.futures import ThreadPoolExecutor
+from scripts.benchmark import build_environment, compare, run_benchmark, run_suite
+
+# These run against the offline stand-ins so they measure our own code paths.
+# Limits are generous on purpose; use scripts/benchmark.py with a stored
+# baseline to catch smaller regressions.
+
+@pytest.fixture(scope="module")
+def env():
+    return build_environment(num_products=300, dimensions=256)
 
 @pytest.fixture
-def search():
-    return HybridSearch()
+def search(env):
+    return env["search"]
 
 def test_search_response_time(search):
-    """Test that search response time is within acceptable limits"""
-    start_time = time.time()
-    results = search.search("gaming laptop", top_k=10)
-    end_time = time.time()
-    
-    # Response time should be under 1 second
-    assert end_time - start_time < 1.0
-    assert len(results) <= 10
+    """Test that search latency percentiles are within acceptable limits"""
+    summary = run_benchmark(lambda i: search.search("gaming laptop", top_k=10), iterations=50)
+
+    assert summary["count"] == 50
+    assert summary["p95_ms"] < 250
+    assert len(search.search("gaming laptop", top_k=10)) <= 10
 
 def test_concurrent_searches(search):
     """Test performance with multiple concurrent searches"""
@@ -25,54 +30,47 @@ def test_concurrent_searches(search):
         "wireless headphones",
         "tablet for drawing"
     ]
-    
-    start_time = time.time()
-    results = []
-    for query in queries:
-        results.append(search.search(query, top_k=5))
-    end_time = time.time()
-    
-    # All searches should complete within 2 seconds
-    assert end_time - start_time < 2.0
-    assert all(len(r) <= 5 for r in results)
+
+    with ThreadPoolExecutor(max_workers=len(queries)) as pool:
+        results = list(pool.map(lambda q: search.search(q, top_k=5), queries))
+    assert all(0 < len(r) <= 5 for r in results)
+
+    summary = run_benchmark(lambda i: search.search(queries[i % len(queries)], top_k=5), iterations=80, concurrency=8)
+    assert summary["concurrency"] == 8
+    assert summary["p99_ms"] < 1000
 
 def test_large_result_set(search):
     """Test performance with large result sets"""
-    start_time = time.time()
-    results = search.search("laptop", top_k=50)
-    end_time = time.time()
-    
-    # Should handle large result sets efficiently
-    assert end_time - start_time < 1.5
-    assert len(results) <= 50
+    summary = run_benchmark(lambda i: search.search("laptop", top_k=50), iterations=30)
+
+    assert summary["p95_ms"] < 500
+    assert len(search.search("laptop", top_k=50)) <= 50
 
 def test_filtered_search_performance(search):
     """Test performance of filtered searches"""
-    start_time = time.time()
-    results = search.search(
-        "laptop",
-        category="laptops",
-        min_price=500,
-        max_price=2000,
-        top_k=20
+    summary = run_benchmark(
+        lambda i: search.search("laptop", category="laptops", min_price=500, max_price=2000, top_k=20),
+        iterations=30
     )
-    end_time = time.time()
-    
-    # Filtered searches should be efficient
-    assert end_time - start_time < 1.0
+    assert summary["p95_ms"] < 250
+
+    results = search.search("laptop", category="laptops", min_price=500, max_price=2000, top_k=20)
     assert len(results) <= 20
-    assert all(500 <= r["price"] <= 2000 for r in results)
+    assert all(500 <= r["metadata"]["price"] <= 2000 for r in results)
 
 def test_similar_products_performance(search):
     """Test performance of similar products recommendation"""
-    # First get a product ID
-    results = search.search("laptop", top_k=1)
-    product_id = results[0]["id"]
-    
-    start_time = time.time()
-    similar = search.recommend_similar(product_id, top_k=10)
-    end_time = time.time()
-    
-    # Similar products should be found quickly
-    assert end_time - start_time < 1.0
-    assert len(similar) <= 10 
\ No newline at end of file
+    product_id = search.search("laptop", top_k=1)[0]["id"]
+
+    summary = run_benchmark(lambda i: search.recommend_similar(product_id, top_k=10), iterations=30)
+    assert summary["p95_ms"] < 250
+    assert len(search.recommend_similar(product_id, top_k=10)) <= 10
+
+def test_benchmark_report_and_baseline_comparison(env):
+    """Test that suite results can be compared against a stored baseline"""
+    results = run_suite(env, iterations=10, only=["feature_extraction", "rerank"])
+    assert set(results) == {"feature_extraction", "rerank"}
+
+    slower = {name: dict(r, p95_ms=r["p95_ms"] * 10, ops_per_sec=r["ops_per_sec"] / 10) for name, r in results.items()}
+    assert compare(results, results, threshold=0.2) == []
+    assert len(compare(slower, results, threshold=0.2)) == 4
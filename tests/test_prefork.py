@@ -0,0 +1,19 @@
+import gc
+import os
+import sys
+import pytest
+from app.prefork import memory_usage, preload
+
+def test_preload_imports_and_freezes_heap():
+    try:
+        settings = preload("app.core.config:settings", ["json"])
+        assert settings.PREFORK_WORKERS >= 1
+        assert gc.get_freeze_count() > 0
+        assert gc.isenabled()
+    finally:
+        gc.unfreeze()
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="reads /proc")
+def test_memory_usage_reports_own_process():
+    usage = memory_usage(os.getpid())
+    assert usage["rss"] >= usage["pss"] > 0
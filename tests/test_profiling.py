@@ -0,0 +1,111 @@
+import asyncio
+import time
+import httpx
+from fastapi import FastAPI
+from app.core.profiling import ProfileStore, ProfilingMiddleware, SamplingProfiler, folded
+
+def busy_loop(seconds):
+    end = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < end:
+        total += 1
+    return total
+
+def test_sampling_profiler_separates_wall_and_cpu():
+    """Test that sleeping shows up in wall samples but not CPU samples"""
+    with SamplingProfiler(interval=0.002) as profiler:
+        busy_loop(0.1)
+        time.sleep(0.1)
+
+    profile = profiler.to_dict()
+    assert profile["samples"] > 10
+    assert any("busy_loop" in stack for stack in profile["wall"])
+    assert any("busy_loop" in stack for stack in profile["cpu"])
+    assert sum(profile["cpu"].values()) < sum(profile["wall"].values())
+    assert folded({"a;b": 3}) == "a;b 3\n"
+
+def test_profile_store_evicts_oldest():
+    store = ProfileStore(max_size=2)
+    for profile_id in ("a", "b", "c"):
+        store.add(profile_id, {"id": profile_id, "wall": {}, "cpu": {}})
+    assert store.get("a") is None
+    assert [p["id"] for p in store.list()] == ["c", "b"]
+
+def test_profiling_middleware_stores_profile_by_request_id():
+    """Test that sampled requests are profiled and retrievable by request ID"""
+    app = FastAPI()
+
+    @app.get("/slow")
+    async def slow():
+        busy_loop(0.05)
+        return {"ok": True}
+
+    store = ProfileStore()
+    profiled = ProfilingMiddleware(app, sample_rate=1.0, interval=0.002, store=store)
+    unprofiled = ProfilingMiddleware(app, sample_rate=0.0, store=ProfileStore())
+
+    async def call(asgi_app):
+        transport = httpx.ASGITransport(app=asgi_app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            return await client.get("/slow", headers={"X-Request-ID": "req-1"})
+
+    response = asyncio.run(call(profiled))
+    assert response.headers["x-profile-id"] == "req-1"
+    profile = store.get("req-1")
+    assert profile["status"] == 200 and profile["path"] == "/slow"
+    assert any("busy_loop" in stack for stack in profile["wall"])
+
+    response = asyncio.run(call(unprofiled))
+    assert "x-profile-id" not in response.headers
+
+def test_admin_key_check(monkeypatch):
+    from app.core.config import settings
+    from app.core.security import is_admin_key
+
+    monkeypatch.setattr(settings, "ADMIN_API_KEY", "")
+    assert not is_admin_key("") and not is_admin_key(None)
+    monkeypatch.setattr(settings, "ADMIN_API_KEY", "s3cret")
+    assert is_admin_key("s3cret")
+    assert not is_admin_key("s3cre") and not is_admin_key("")
+    assert ProfilingMiddleware(None)._requested({b"x-profile": b"1", b"x-admin-key": b"s3cret"})
+
+def other_request_work(seconds):
+    return busy_loop(seconds)
+
+def worker_call(seconds):
+    return busy_loop(seconds)
+
+def test_profile_covers_worker_threads_but_not_other_requests(monkeypatch):
+    """Test that executor work is sampled and concurrent requests on the loop are left out"""
+    from concurrent.futures import ThreadPoolExecutor
+    from app.core.config import settings
+    from app.core.profiling import submit_attached
+
+    monkeypatch.setattr(settings, "ADMIN_API_KEY", "s3cret")
+    executor = ThreadPoolExecutor(max_workers=2)
+    app = FastAPI()
+
+    @app.get("/profiled")
+    async def profiled():
+        await asyncio.sleep(0.05)
+        submit_attached(executor, worker_call, 0.05).result()
+        return {"ok": True}
+
+    @app.get("/other")
+    async def other():
+        other_request_work(0.04)
+        return {"ok": True}
+
+    store = ProfileStore()
+    middleware = ProfilingMiddleware(app, sample_rate=0.0, interval=0.002, store=store)
+
+    async def call():
+        transport = httpx.ASGITransport(app=middleware)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            headers = {"X-Request-ID": "req-2", "X-Profile": "1", "X-Admin-Key": "s3cret"}
+            return await asyncio.gather(client.get("/profiled", headers=headers), client.get("/other"))
+
+    asyncio.run(call())
+    profile = store.get("req-2")
+    assert any("worker_call" in stack for stack in profile["wall"])
+    assert not any("other_request_work" in stack for stack in profile["wall"])
@@ -0,0 +1,52 @@
+import pytest
+from app.core.query_parser import QueryParser
+
+FEATURE_MAPPING = {
+    "laptops": {"gaming": ["gaming", "rtx"], "battery": ["battery"]},
+    "tablets": {"art": ["stylus"], "entertainment": ["gaming"], "battery": ["battery"]},
+}
+
+@pytest.fixture
+def parser():
+    return QueryParser(FEATURE_MAPPING, brands=["ASUS", "Dell", "Sony", None])
+
+@pytest.mark.parametrize("query,category,min_price,max_price,text", [
+    ("gaming laptop under $1500", "laptops", None, 1500, "gaming laptop"),
+    ("laptop between 1,000 and 1.5k", "laptops", 1000, 1500, "laptop"),
+    ("headphones around $200", "audio", 170, 230, "headphones"),
+    ("phone over 500 dollars", "smartphones", 500, None, "phone"),
+    ("tablet $300-$600", "tablets", 300, 600, "tablet"),
+    # Implied by a feature keyword only one category uses
+    ("rtx 3070 machine", "laptops", None, None, "rtx 3070 machine"),
+    # Shared keywords and several product types leave the category open
+    ("gaming device", None, None, None, "gaming device"),
+    ("laptop or tablet", None, None, None, "laptop or tablet"),
+    # Numbers with units are specs, not prices
+    ("laptop with up to 20 hours battery", "laptops", None, None, "laptop with up to 20 hours battery"),
+    ("tablet under 11 inches", "tablets", None, None, "tablet under 11 inches"),
+    # Bare max/min need a currency or a four-digit amount, since they are also model names
+    ("iphone pro max 256", "smartphones", None, None, "iphone pro max 256"),
+    ("ipad mini 64", "tablets", None, None, "ipad mini 64"),
+    ("phone max $500", "smartphones", None, 500, "phone"),
+    ("laptop max 1500", "laptops", None, 1500, "laptop"),
+    ("headphones min 100 usd", "audio", 100, None, "headphones"),
+])
+def test_parse_category_and_price(parser, query, category, min_price, max_price, text):
+    parsed = parser.parse(query)
+    assert parsed.category == category
+    assert parsed.min_price == pytest.approx(min_price) if min_price is not None else parsed.min_price is None
+    assert parsed.max_price == pytest.approx(max_price) if max_price is not None else parsed.max_price is None
+    assert parsed.text == text
+
+def test_parse_brands(parser):
+    parsed = parser.parse("Sony or dell headphones")
+    assert parsed.brands == ["Sony", "Dell"]
+    # Whole words only
+    assert not parser.parse("asusual things")
+
+def test_parse_is_fast(parser):
+    import time
+    start = time.perf_counter()
+    for _ in range(1000):
+        parser.parse("asus gaming laptop under $1500 with long battery")
+    assert (time.perf_counter() - start) / 1000 < 0.001
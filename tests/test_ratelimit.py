@@ -0,0 +1,146 @@
+import asyncio
+import httpx
+from fastapi import FastAPI
+from app.core.ratelimit import AdmissionController, RateLimiter, RateLimitMiddleware
+
+def test_token_bucket_burst_and_refill():
+    """Test that a client can burst, is then limited, and refills over time"""
+    limiter = RateLimiter(per_minute=60, burst=3)
+
+    assert [limiter.acquire("a", now=0.0)[0] for _ in range(3)] == [True, True, True]
+    allowed, retry_after = limiter.acquire("a", now=0.0)
+    assert not allowed and abs(retry_after - 1.0) < 1e-9
+
+    # Other clients have their own bucket
+    assert limiter.acquire("b", now=0.0)[0]
+    # One token per second at 60/minute
+    assert limiter.acquire("a", now=1.0)[0]
+    assert not limiter.acquire("a", now=1.5)[0]
+
+def test_rate_limiter_evicts_idle_clients():
+    limiter = RateLimiter(per_minute=60, burst=1, max_clients=2)
+    for key in ("a", "b", "c"):
+        limiter.acquire(key, now=0.0)
+    assert len(limiter._buckets) == 2
+
+def test_admission_sheds_expensive_requests_only():
+    """Test that expensive requests beyond the cap get 503 while cheap ones keep serving"""
+    app = FastAPI()
+    release = asyncio.Event()
+
+    @app.post("/api/agent/qa")
+    async def agent_qa():
+        await release.wait()
+        return {"ok": True}
+
+    @app.post("/api/search")
+    async def search():
+        return {"ok": True}
+
+    limited = RateLimitMiddleware(
+        app,
+        limiter=RateLimiter(per_minute=6000, burst=100),
+        admission=AdmissionController(max_in_flight=1, paths=["/api/agent/qa"]),
+        enabled=True
+    )
+
+    async def run():
+        transport = httpx.ASGITransport(app=limited)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            first = asyncio.ensure_future(client.post("/api/agent/qa"))
+            await asyncio.sleep(0.05)
+            shed = await client.post("/api/agent/qa")
+            cheap = await client.post("/api/search")
+            release.set()
+            return await first, shed, cheap
+
+    first, shed, cheap = asyncio.run(run())
+    assert first.status_code == 200
+    assert shed.status_code == 503 and shed.headers["retry-after"] == "1"
+    assert cheap.status_code == 200
+
+def test_rate_limit_returns_429_with_retry_after():
+    app = FastAPI()
+
+    @app.get("/api/similar/x")
+    async def similar():
+        return []
+
+    limited = RateLimitMiddleware(
+        app,
+        limiter=RateLimiter(per_minute=6, burst=1),
+        admission=AdmissionController(max_in_flight=1, paths=[]),
+        enabled=True
+    )
+
+    async def run():
+        transport = httpx.ASGITransport(app=limited)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            return [await client.get("/api/similar/x") for _ in range(2)] + [await client.get("/health")]
+
+    ok, limited_response, health = asyncio.run(run())
+    assert ok.status_code == 200
+    assert limited_response.status_code == 429
+    assert limited_response.headers["retry-after"] == "10"
+    # Exempt paths reach the app (which has no /health here) instead of being limited
+    assert health.status_code == 404
+
+def test_admin_paths_have_their_own_strict_limit():
+    app = FastAPI()
+
+    @app.post("/admin/warmup")
+    async def warmup():
+        return {}
+
+    @app.get("/api/similar/x")
+    async def similar():
+        return []
+
+    limited = RateLimitMiddleware(
+        app,
+        limiter=RateLimiter(per_minute=60, burst=5),
+        admin_limiter=RateLimiter(per_minute=6, burst=1),
+        enabled=True
+    )
+
+    async def run():
+        transport = httpx.ASGITransport(app=limited)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            admin = [await client.post("/admin/warmup", headers={"X-Admin-Key": f"guess-{i}"}) for i in range(2)]
+            return admin + [await client.get("/api/similar/x")]
+
+    first, second, api = asyncio.run(run())
+    assert first.status_code == 200
+    assert second.status_code == 429 and second.headers["retry-after"] == "10"
+    assert api.status_code == 200
+
+def test_rejections_carry_cors_headers_when_cors_wraps_the_limiter():
+    """Test that browsers can read 429s and that preflights don't spend tokens, as main.py layers them"""
+    from starlette.middleware.cors import CORSMiddleware
+
+    app = FastAPI()
+
+    @app.get("/api/similar/x")
+    async def similar():
+        return []
+
+    limited = CORSMiddleware(
+        RateLimitMiddleware(app, limiter=RateLimiter(per_minute=6, burst=1), enabled=True),
+        allow_origins=["*"],
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["Retry-After"]
+    )
+
+    async def run():
+        transport = httpx.ASGITransport(app=limited)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            origin = {"Origin": "https://shop.example"}
+            preflight = await client.options("/api/similar/x", headers={**origin, "Access-Control-Request-Method": "GET"})
+            return preflight, [await client.get("/api/similar/x", headers=origin) for _ in range(2)]
+
+    preflight, (ok, rejected) = asyncio.run(run())
+    assert preflight.status_code == 200 and ok.status_code == 200
+    assert rejected.status_code == 429
+    assert rejected.headers["access-control-allow-origin"] == "*"
+    assert "retry-after" in rejected.headers["access-control-expose-headers"].lower()
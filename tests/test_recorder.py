@@ -0,0 +1,97 @@
+import asyncio
+import gzip
+import glob
+import httpx
+from fastapi import FastAPI
+from pydantic import BaseModel
+from app.core.config import settings
+from app.core.metrics import record_cache_lookup, time_stage
+from app.core.recorder import RecorderMiddleware
+from scripts.replay import capture_files, compare_p95, load_capture, replay, schedule
+
+class Query(BaseModel):
+    query: str
+
+def build_app():
+    app = FastAPI()
+
+    @app.post("/search")
+    def search(request: Query):
+        # Sync endpoints run in the threadpool with a copy of the request context
+        with time_stage("embedding"):
+            record_cache_lookup("embedding", request.query == "cached")
+        return {"query": request.query}
+
+    @app.get("/products/{product_id}")
+    async def product(product_id: str):
+        return {"id": product_id}
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    return app
+
+async def send_requests(asgi_app):
+    transport = httpx.ASGITransport(app=asgi_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+        await client.post("/search", json={"query": "laptop"}, headers={"X-API-Key": "secret"})
+        await client.post("/search", json={"query": "cached"})
+        await client.get("/products/laptop-1?fields=name", headers={"Accept-Encoding": "gzip"})
+        await client.get("/health")
+        await client.post("/search", content=b"x" * 100, headers={"Content-Type": "application/json"})
+
+def test_recorder_captures_request_shape_stages_and_cache(tmp_path):
+    """Test that captured requests carry timing and cache outcomes but no credentials"""
+    recorder = RecorderMiddleware(build_app(), enabled=True, directory=str(tmp_path), max_body_bytes=64)
+    asyncio.run(send_requests(recorder))
+    recorder.writer().close()
+
+    raw = open(glob.glob(str(tmp_path / "requests-*.jsonl"))[0], encoding="utf-8").read()
+    assert "secret" not in raw and "/health" not in raw
+
+    records = load_capture(capture_files(str(tmp_path)))
+    assert len(records) == 3
+    miss, hit, product = records
+    assert miss["route"] == "/search" and miss["body"] == {"query": "laptop"} and miss["status"] == 200
+    assert miss["cache"] == {"embedding.miss": 1} and "embedding" in miss["stages"]
+    assert hit["cache"] == {"embedding.hit": 1}
+    assert product["route"] == "/products/{product_id}" and product["query"] == "fields=name"
+    assert product["headers"]["accept-encoding"] == "gzip" and product["bytes"] > 0
+
+def test_recorder_rotates_into_gzip_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "RECORDER_MAX_BYTES", 300)
+    recorder = RecorderMiddleware(build_app(), enabled=True, directory=str(tmp_path))
+    for _ in range(3):
+        asyncio.run(send_requests(recorder))
+    recorder.writer().close()
+
+    rotated = glob.glob(str(tmp_path / "requests-*.jsonl.*.gz"))
+    assert rotated
+    with gzip.open(rotated[0], "rt", encoding="utf-8") as f:
+        assert f.readline().startswith("{")
+    records = load_capture(capture_files(str(tmp_path)))
+    assert [r["ts"] for r in records] == sorted(r["ts"] for r in records)
+
+def test_replay_reissues_capture_with_scaled_timing(tmp_path):
+    recorder = RecorderMiddleware(build_app(), enabled=True, directory=str(tmp_path))
+    asyncio.run(send_requests(recorder))
+    recorder.writer().close()
+    records = load_capture(capture_files(str(tmp_path)))
+
+    records[1]["ts"] = records[0]["ts"] + 0.2
+    assert abs(schedule(records[:2], speed=2)[1] - 0.1) < 1e-6
+    assert schedule(records[:2], speed=0) == [0.0, 0.0]
+
+    async def run():
+        transport = httpx.ASGITransport(app=build_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            return await replay(client, records, speed=0, concurrency=2, headers={})
+
+    report = asyncio.run(run())
+    assert report["POST /search"]["count"] == 2
+    assert report["GET /products/{product_id}"]["statuses"] == {"200": 1}
+    assert report["total"]["error_rate"] == 0
+
+    comparison = compare_p95({"GET /x": {"p95_ms": 12.0}}, {"GET /x": {"p95_ms": 10.0}, "GET /y": {"p95_ms": 1.0}})
+    assert list(comparison) == ["GET /x"] and abs(comparison["GET /x"]["change"] - 0.2) < 1e-9
@@ -0,0 +1,80 @@
+import threading
+import time
+from types import SimpleNamespace
+import pytest
+from app.core.resilience import CircuitBreaker, HedgeBudget, ResilientIndex, track_fallbacks
+from app.core.upstream import UpstreamUnavailable
+
+class FlakyIndex:
+    """Index stand-in whose calls follow a script of delays and failures"""
+
+    def __init__(self, delays=None, fail=False):
+        self.delays = list(delays or [])
+        self.fail = fail
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def query(self, **kwargs):
+        with self._lock:
+            self.calls += 1
+            delay = self.delays.pop(0) if self.delays else 0.0
+        time.sleep(delay)
+        if self.fail:
+            raise ConnectionError("index unavailable")
+        return SimpleNamespace(matches=[SimpleNamespace(id="p1", score=0.9, metadata={})], delay=delay)
+
+def test_hedge_answers_when_primary_is_slow():
+    """Test that a hedge is sent after the hedge delay and its answer wins"""
+    primary = FlakyIndex(delays=[1.0, 0.0])
+    index = ResilientIndex(primary, hedge_delay=0.02, hedge_budget=1.0)
+
+    start = time.monotonic()
+    result = index.query(vector=[0.1, 0.2], top_k=1)
+    assert time.monotonic() - start < 0.5
+    assert result.delay == 0.0
+    assert primary.calls == 2
+
+def test_hedge_budget_bounds_extra_load():
+    budget = HedgeBudget(ratio=0.1, burst=1.0)
+    hedges = 0
+    for _ in range(100):
+        budget.earn()
+        hedges += budget.spend()
+    assert 9 <= hedges <= 10
+
+def test_breaker_serves_cache_while_open_and_recovers():
+    """Test that sustained errors open the breaker, cached results are served, and a probe closes it"""
+    primary = FlakyIndex()
+    breaker = CircuitBreaker(window=10, min_calls=4, error_rate=0.5, open_seconds=0.05)
+    index = ResilientIndex(primary, hedge_delay=1.0, hedge_budget=0.0, breaker=breaker)
+
+    cached = index.query(vector=[1.0], top_k=1)
+    primary.fail = True
+    for _ in range(3):
+        with pytest.raises(ConnectionError):
+            index.query(vector=[2.0], top_k=1)
+    # This failure trips the breaker; the cached answer for the same query is served
+    assert index.query(vector=[1.0], top_k=1) is cached
+    assert breaker.state == CircuitBreaker.OPEN
+
+    calls = primary.calls
+    assert index.query(vector=[1.0], top_k=1) is cached
+    assert primary.calls == calls
+    with pytest.raises(UpstreamUnavailable):
+        index.query(vector=[3.0], top_k=1)
+
+    primary.fail = False
+    time.sleep(0.06)
+    index.query(vector=[3.0], top_k=1)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_breaker_uses_fallback_index():
+    fallback = FlakyIndex()
+    breaker = CircuitBreaker(min_calls=1, error_rate=0.5)
+    index = ResilientIndex(FlakyIndex(fail=True), fallback_index=fallback, hedge_budget=0.0, breaker=breaker)
+
+    with track_fallbacks() as fallbacks:
+        assert index.query(vector=[1.0], top_k=1).matches[0].id == "p1"
+    assert breaker.state == CircuitBreaker.OPEN
+    assert fallback.calls == 1
+    assert fallbacks == ["index"]
@@ -0,0 +1,46 @@
+import json
+import time
+from app.core import serialization
+from app.core.serialization import FragmentCache, encode_products
+
+RESULTS = [
+    {"id": "laptop-1", "score": 0.91, "metadata": {"name": "Dell XPS 13", "price": 999.0, "features": ["Wi-Fi 6"], "description": "Ultrabook – 13\""}},
+    {"id": "laptop-2", "score": 0.5, "metadata": {"name": "HP Spectre", "price": 1299, "features": []}},
+]
+
+def test_encode_products_matches_response_model_shape():
+    """Test that fast-path bytes decode to the same payload as List[ProductResponse]"""
+    encoded = encode_products(RESULTS, cache=FragmentCache())
+    assert json.loads(encoded) == [{"id": r["id"], "score": r["score"], "metadata": r["metadata"]} for r in RESULTS]
+
+def test_stdlib_fallback_without_orjson(monkeypatch):
+    monkeypatch.setattr(serialization, "orjson", None)
+    assert json.loads(encode_products(RESULTS, cache=FragmentCache(max_size=0))) == json.loads(encode_products(RESULTS, cache=FragmentCache()))
+
+def test_fragment_cache_reuses_and_expires_fragments():
+    cache = FragmentCache(ttl=0.05)
+    encode_products(RESULTS, cache=cache, version="v1")
+    encode_products(RESULTS, cache=cache, version="v1")
+    assert (cache.hits, cache.misses) == (2, 2)
+
+    changed = [dict(RESULTS[0], metadata=dict(RESULTS[0]["metadata"], price=899.0))]
+    time.sleep(0.06)
+    assert json.loads(encode_products(changed, cache=cache, version="v1"))[0]["metadata"]["price"] == 899.0
+
+def test_fragments_are_keyed_by_catalog_version():
+    """Test that a new catalog version re-encodes, and no version bypasses the cache"""
+    cache = FragmentCache()
+    old = [{"id": "p1", "score": 1.0, "metadata": {"name": "Dell XPS 13", "price": 10}}]
+    new = [{"id": "p1", "score": 1.0, "metadata": {"name": "Dell XPS 13", "price": 99}}]
+    assert json.loads(encode_products(old, cache=cache, version="v1"))[0]["metadata"]["price"] == 10
+    assert json.loads(encode_products(new, cache=cache, version="v2"))[0]["metadata"]["price"] == 99
+    assert json.loads(encode_products(new, cache=cache))[0]["metadata"]["price"] == 99
+    assert (cache.hits, cache.misses) == (0, 2)
+
+def test_projected_fragments_are_cached_separately():
+    cache = FragmentCache()
+    encode_products(RESULTS, cache=cache, version="v1")
+    projected = [dict(r, metadata={"name": r["metadata"]["name"]}) for r in RESULTS]
+    decoded = json.loads(encode_products(projected, cache=cache, fields=("name",), version="v1"))
+    assert decoded[0]["metadata"] == {"name": "Dell XPS 13"}
+    assert cache.misses == 4
@@ -0,0 +1,52 @@
+import asyncio
+import pytest
+from app.core import tracing
+from app.core.tracing import span, traced
+
+def test_tracing_disabled_is_noop():
+    """Test that spans and traced functions are pass-through when tracing is off"""
+    assert tracing._tracer is None
+
+    @traced()
+    def add(a, b):
+        return a + b
+
+    @traced()
+    async def double(x):
+        return x * 2
+
+    with span("noop", top_k=5) as current:
+        current.set_attribute("hits", 1)
+    assert add(1, 2) == 3
+    assert asyncio.run(double(4)) == 8
+
+@pytest.fixture
+def spans():
+    sdk_trace = pytest.importorskip("opentelemetry.sdk.trace")
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+    exporter = InMemorySpanExporter()
+    provider = sdk_trace.TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    tracing.setup_tracing(tracer_provider=provider)
+    yield exporter
+    tracing._tracer = None
+
+def test_search_spans(spans):
+    """Test that a search produces embedding, vector query and lexical spans under one trace"""
+    from scripts.benchmark import build_environment
+
+    search = build_environment(num_products=50, dimensions=64)["search"]
+    spans.clear()
+    search.search("gaming laptop", category="laptops", top_k=3)
+
+    by_name = {s.name: s for s in spans.get_finished_spans()}
+    root = by_name["HybridSearch.search"]
+    assert root.attributes["top_k"] == 3
+    assert root.attributes["category"] == "laptops"
+    assert by_name["openai.embeddings.create"].attributes["gen_ai.usage.input_tokens"] > 0
+    assert by_name["vector_index.query"].attributes["top_k"] == 6
+    for name in ("openai.embeddings.create", "vector_index.query", "lexical.search", "HybridSearch.rerank"):
+        assert by_name[name].context.trace_id == root.context.trace_id
+        assert by_name[name].parent.span_id == root.context.span_id
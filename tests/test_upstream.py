@@ -0,0 +1,129 @@
+import time
+import httpx
+import openai
+import pytest
+from app.core.upstream import (
+    AdaptiveConcurrencyLimit,
+    ModelGovernor,
+    TokenBudget,
+    IMAGE_TOKENS,
+    UpstreamUnavailable,
+    estimate_request_tokens,
+    request_deadline,
+)
+
+def rate_limit_error(retry_after="0", code=None):
+    response = httpx.Response(429, headers={"retry-after": retry_after}, request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+    return openai.RateLimitError("Rate limit reached", response=response, body={"code": code} if code else None)
+
+@pytest.fixture
+def model_governor():
+    governor = ModelGovernor("gpt-test")
+    governor.base_delay = 0.001
+    governor.max_delay = 0.01
+    return governor
+
+def test_aimd_limit_grows_on_success_and_halves_on_throttle():
+    limit = AdaptiveConcurrencyLimit(initial=4, maximum=8, latency_target=1.0, decrease_interval=60)
+
+    for _ in range(4):
+        assert limit.acquire(timeout=0)
+        limit.release(latency=0.01)
+    assert 4.9 < limit.limit < 5.0
+
+    limit.acquire(timeout=0)
+    limit.release(throttled=True)
+    halved = limit.limit
+    assert halved < 2.5
+    # A second throttle within the decrease interval doesn't compound
+    limit.acquire(timeout=0)
+    limit.release(throttled=True)
+    assert limit.limit == halved
+
+def test_concurrency_limit_times_out_when_full():
+    limit = AdaptiveConcurrencyLimit(initial=1)
+    assert limit.acquire(timeout=0)
+    assert not limit.acquire(timeout=0.01)
+
+def test_token_budget_reports_wait():
+    budget = TokenBudget(tokens_per_minute=600)
+    assert budget.reserve(600) == 0.0
+    assert budget.reserve(10) == pytest.approx(1.0, abs=0.05)
+    budget.refund(100)
+    assert budget.reserve(10) == 0.0
+
+def test_governor_retries_throttled_calls(model_governor):
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise rate_limit_error()
+        return "ok"
+
+    assert model_governor.call(flaky) == "ok"
+    assert len(calls) == 3
+    assert model_governor.concurrency.in_flight == 0
+    assert model_governor.concurrency.limit < 8
+
+def test_governor_does_not_retry_exhausted_quota(model_governor):
+    calls = []
+
+    def no_quota():
+        calls.append(1)
+        raise rate_limit_error(code="insufficient_quota")
+
+    with pytest.raises(openai.RateLimitError):
+        model_governor.call(no_quota)
+    assert len(calls) == 1
+
+def test_governor_fails_fast_past_deadline(model_governor):
+    """Test that a Retry-After beyond the request deadline fails immediately"""
+    def throttled():
+        raise rate_limit_error(retry_after="5")
+
+    start = time.monotonic()
+    with request_deadline(0.5), pytest.raises(UpstreamUnavailable):
+        model_governor.call(throttled)
+    assert time.monotonic() - start < 0.5
+
+def test_token_estimate_counts_images_at_a_fixed_cost():
+    """Test that a base64 photo doesn't count as hundreds of thousands of tokens"""
+    photo = "data:image/jpeg;base64," + "A" * 2_000_000
+    estimate = estimate_request_tokens({
+        "messages": [{"role": "user", "content": [
+            {"type": "text", "text": "What is this product?"},
+            {"type": "image_url", "image_url": {"url": photo}},
+        ]}],
+        "max_tokens": 300,
+    })
+    assert IMAGE_TOKENS + 300 < estimate < IMAGE_TOKENS + 320
+    assert estimate_request_tokens({"input": ["a" * 40, "b" * 40]}) == 22
+
+def test_async_calls_retry_and_are_cancelled_at_the_deadline(model_governor):
+    """Test that awaited calls are retried on 429 and stopped, not abandoned, at the deadline"""
+    import asyncio
+
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise rate_limit_error()
+        return "ok"
+
+    async def slow():
+        try:
+            await asyncio.sleep(5)
+        finally:
+            attempts.append("cancelled")
+
+    async def run():
+        assert await model_governor.acall(flaky) == "ok"
+        with request_deadline(0.05):
+            with pytest.raises(UpstreamUnavailable):
+                await model_governor.acall(slow)
+
+    asyncio.run(run())
+    assert attempts == [1, 1, "cancelled"]
+    assert model_governor.concurrency.in_flight == 0
@@ -0,0 +1,85 @@
+import pytest
+from app.core.ingestion import IngestionPipeline
+from app.core.offline import InMemoryIndex, OfflineOpenAI
+from app.core.query_log import QueryLog, anonymize_query
+from app.core.search import HybridSearch
+from app.core.warmup import WarmupState, warm_up
+
+PRODUCTS = [
+    {"id": "laptop-1", "name": "ASUS Gaming Laptop", "description": "Gaming laptop with NVIDIA RTX 3070 graphics",
+     "brand": "ASUS", "category": "laptops", "features": ["NVIDIA RTX 3070", "Up to 8 hours"], "price": 1800},
+    {"id": "audio-1", "name": "Sony Wireless Headphones", "description": "Noise cancelling headphones for the gym",
+     "brand": "Sony", "category": "audio", "features": ["LDAC", "Sweat resistant"], "price": 300},
+]
+
+class CountingClient(OfflineOpenAI):
+    def __init__(self):
+        super().__init__(dimensions=64)
+        self.calls = 0
+        self.inputs = []
+        create = self.embeddings.create
+
+        def counted(**kwargs):
+            self.calls += 1
+            self.inputs.append(kwargs["input"])
+            return create(**kwargs)
+
+        self.embeddings.create = counted
+
+@pytest.fixture
+def search():
+    client = CountingClient()
+    index = InMemoryIndex()
+    IngestionPipeline(client, index, namespace="products").run(PRODUCTS)
+    client.calls, client.inputs = 0, []
+    return HybridSearch(index=index, openai_client=client, lexical_index=None)
+
+def test_anonymize_query():
+    assert anonymize_query("  Gaming   LAPTOP ") == "gaming laptop"
+    assert anonymize_query("order 123-456-7890 status") is None
+    assert anonymize_query("jane.doe@example.com headphones") is None
+    assert anonymize_query("x" * 500) is None
+    assert anonymize_query("rtx 3070 laptop") == "rtx 3070 laptop"
+
+def test_query_log_merges_counts_across_workers(tmp_path):
+    path = str(tmp_path / "queries.json")
+    first, second = QueryLog(path), QueryLog(path)
+    for _ in range(3):
+        first.record("Gaming Laptop")
+    first.record("headphones", "audio")
+    second.record("gaming  laptop")
+    assert not second.record("call me at 555 123 4567")
+    first.flush()
+    second.flush()
+    assert QueryLog(path).top(5) == [("gaming laptop", None, 4), ("headphones", "audio", 1)]
+
+    # Only the most frequent entries are kept
+    capped = QueryLog(path, max_entries=1)
+    capped.record("tablet")
+    capped.flush()
+    assert QueryLog(path).top(5) == [("gaming laptop", None, 4)]
+
+def test_embedding_cache_shares_normalized_queries(search):
+    search.search("Gaming Laptop", top_k=1, infer_filters=False)
+    search.search("gaming   laptop", top_k=1, infer_filters=False)
+    assert search.openai_client.calls == 1
+    assert len(search.embedding_cache) == 1
+    # Only the cache key is normalized, not the text sent for embedding
+    assert search.openai_client.inputs == ["Gaming Laptop"]
+
+def test_warm_up_fills_caches_before_ready(search):
+    state = WarmupState()
+    assert not state.ready
+    status = warm_up(search, [("gaming laptop", None, 5), ("headphones", "audio", 2)], concurrency=2, state=state)
+    assert state.ready
+    assert status["state"] == "complete" and status["done"] == 2 and status["errors"] == 0
+
+    calls = search.openai_client.calls
+    search.search("gaming laptop", top_k=5)
+    assert search.openai_client.calls == calls
+
+def test_warm_up_times_out_but_reports_ready(search):
+    state = WarmupState()
+    status = warm_up(search, [("gaming laptop", None, 1)] * 3, timeout=0, state=state)
+    assert state.ready
+    assert status["state"] == "timed_out" and status["done"] == 0